@@ -152,7 +152,7 @@ class DialogSelectSubject:
         self.SubjectScrollbarX['command'] = self.SubjectListbox.xview
         self.SubjectScrollbarY['command'] = self.SubjectListbox.yview
 
-        self.SubjectListbox.bind( '<<ListboxSelect>>', self.callback )
+        self.SubjectListbox.bind( '<<ListboxSelect>>', self.OnSelect )
 
         for c in range( column, column + nColumns - 1 ):
             self.top.columnconfigure(c, weight=1)
@@ -181,7 +181,7 @@ class DialogSelectSubject:
 
                 label = self.ftGraph.GetLabel( individual )
 
-                labels.append( label )
+                labels.append( ( label, idIndi ) )
 
         return labels
 
@@ -190,13 +190,29 @@ class DialogSelectSubject:
 
         self.SubjectListbox.delete( 0, END )
 
+        # Each row maps straight onto the ID passed to the callback, the
+        # extra labels are passed back as they are
+
+        labels = []
+        self.ids = []
+
         if ( not self.prependExtraLabels is None ):
-            labels = self.prependExtraLabels + sorted( self.labels )
-        else:
-            labels = sorted( self.labels )
+            labels = labels + self.prependExtraLabels
+            self.ids = self.ids + self.prependExtraLabels
+
+        for label, idIndi in sorted( self.labels ):
+            labels.append( label )
+            self.ids.append( idIndi )
+
+        self.SubjectListbox.insert( END, *labels )
+
+
+    def OnSelect( self, val ):
+
+        idx = val.widget.curselection()
 
-        for label in labels:
-            self.SubjectListbox.insert( END, label )
+        if ( len( idx ) > 0 ):
+            self.callback( self.ids[ int( idx[0] ) ] )
 
 
     def OnOK( self ):
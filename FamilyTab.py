@@ -40,7 +40,7 @@ class FamilyTab:
 
     def __init__( self, master, parent, ftGraph,
                   idIndividual, idFamily, familyColumn,
-                  fnOnSubjectListboxSelect, fnGetNewIndividual,
+                  fnGetNewIndividual,
                   fnUpdateSelectedSubject, fnChangeSubject ):
 
         
@@ -50,7 +50,6 @@ class FamilyTab:
         self.idIndividual = idIndividual
         self.idFamily = idFamily
         self.familyColumn = familyColumn
-        self.OnSubjectListboxSelect = fnOnSubjectListboxSelect
         self.GetNewIndividual = fnGetNewIndividual
         self.UpdateSelectedSubject = fnUpdateSelectedSubject
         self.ChangeSubject = fnChangeSubject
@@ -345,7 +344,7 @@ class FamilyTab:
         self.ChildrenScrollbarY['command'] = self.ChildrenListbox.yview
 
         self.ChildrenListbox.bind( '<<ListboxSelect>>',
-                                   self.OnSubjectListboxSelect )
+                                   self.OnChildrenListboxSelect )
 
         #for c in range( column, column + nColumns - 1 ):
         #    self.columnconfigure(c, weight=1)
@@ -391,29 +390,29 @@ class FamilyTab:
                                       'Please set the gender of this subject before adding a spouse.' )
             return
 
-        # Create a new spouse?
-
         if ( self.idSelectedSpouse is None ):
 
             return
 
-        elif ( self.idSelectedSpouse == '***  New Individual ***' ):
+        # Adding the spouse is one change
 
-            self.idSelectedSpouse = self.GetNewIndividual()
+        with self.ftGraph.Batch():
 
-        else:
+            # Create a new spouse?
 
-            self.idSelectedSpouse = re.search( 'I\d\d\d$', self.idSelectedSpouse ).group( 0 )
+            if ( self.idSelectedSpouse == '***  New Individual ***' ):
 
-        # Set the spouse
+                self.idSelectedSpouse = self.GetNewIndividual()
 
-        if ( sex == 'M' ):
-            self.ftGraph.SetSex( self.idSelectedSpouse, 'F' )
-        elif ( sex == 'F' ):
-            self.ftGraph.SetSex( self.idSelectedSpouse, 'M' )
+            # Set the spouse
+
+            if ( sex == 'M' ):
+                self.ftGraph.SetSex( self.idSelectedSpouse, 'F' )
+            elif ( sex == 'F' ):
+                self.ftGraph.SetSex( self.idSelectedSpouse, 'M' )
 
-        self.ftGraph.SetSpouse( self.idIndividual, self.idSelectedSpouse,  self.idFamily )
-        self.ftGraph.SetSpouse( self.idSelectedSpouse, self.idIndividual,  self.idFamily )
+            self.ftGraph.SetSpouse( self.idIndividual, self.idSelectedSpouse,  self.idFamily )
+            self.ftGraph.SetSpouse( self.idSelectedSpouse, self.idIndividual,  self.idFamily )
 
         self.UpdateSelectedSubject()
 
@@ -423,19 +422,16 @@ class FamilyTab:
     # OnSelectedSpouse
     # --------------------------------------------------------------------
 
-    def OnSelectedSpouse(self, val):
+    def OnSelectedSpouse(self, idSelected):
 
-        # If val is None then this means there were no individuals to
+        # If idSelected is None then this means there were no individuals to
         # choose from so a new one should be created
 
-        if ( val is None ):
+        if ( idSelected is None ):
             self.idSelectedSpouse = '***  New Individual ***'
 
         else:
-            sender = val.widget
-            idx = sender.curselection()
-
-            self.idSelectedSpouse = sender.get(idx)
+            self.idSelectedSpouse = idSelected
 
 
     # --------------------------------------------------------------------
@@ -499,35 +495,35 @@ class FamilyTab:
                                          [ '***  New Individual ***' ],
                                          None, [ self.idIndividual ] + idsChildren )
 
-        # Create a new child?
-
         if ( self.idSelectedChild is None ):
 
             return
 
-        elif ( self.idSelectedChild == '***  New Individual ***' ):
+        # Adding the child is one change
 
-            self.idSelectedChild = self.GetNewIndividual()
+        with self.ftGraph.Batch():
 
-            if ( sex == 'M' ):
-                surname = theIndividual.findtext('NAME/surname')
-            else:
-                spouse, idFamilySpouse, dateMarriage, dateDivorced = \
-                        self.ftGraph.GetSpouse( theIndividual, self.idFamily )
-
-                if ( spouse is not None ):
-                    surname = spouse.findtext('NAME/surname')
-    
-        else:
+            # Create a new child?
+
+            if ( self.idSelectedChild == '***  New Individual ***' ):
+
+                self.idSelectedChild = self.GetNewIndividual()
 
-            self.idSelectedChild = re.search( 'I\d\d\d$', self.idSelectedChild ).group( 0 )
+                if ( sex == 'M' ):
+                    surname = theIndividual.findtext('NAME/surname')
+                else:
+                    spouse, idFamilySpouse, dateMarriage, dateDivorced = \
+                            self.ftGraph.GetSpouse( theIndividual, self.idFamily )
 
-        # Set the child
+                    if ( spouse is not None ):
+                        surname = spouse.findtext('NAME/surname')
+        
+            # Set the child
 
-        self.ftGraph.SetChild( self.idIndividual, self.idSelectedChild, self.idFamily )
+            self.ftGraph.SetChild( self.idIndividual, self.idSelectedChild, self.idFamily )
 
-        if ( ( not surname is None ) and ( len( surname ) > 0 ) ):
-            self.ftGraph.SetLastName( self.idSelectedChild, surname )
+            if ( ( not surname is None ) and ( len( surname ) > 0 ) ):
+                self.ftGraph.SetLastName( self.idSelectedChild, surname )
 
         self.UpdateSelectedSubject()
 
@@ -537,19 +533,16 @@ class FamilyTab:
     # OnSelectedChild
     # --------------------------------------------------------------------
 
-    def OnSelectedChild(self, val):
+    def OnSelectedChild(self, idSelected):
 
-        # If val is None then this means there were non individuals to
+        # If idSelected is None then this means there were non individuals to
         # choose from so a new one should be created
 
-        if ( val is None ):
+        if ( idSelected is None ):
             self.idSelectedChild = '***  New Individual ***'
 
         else:
-            sender = val.widget
-            idx = sender.curselection()
-
-            self.idSelectedChild = sender.get(idx)
+            self.idSelectedChild = idSelected
 
 
     # --------------------------------------------------------------------
@@ -587,15 +580,11 @@ class FamilyTab:
     # OnSelectedRemoveChild
     # --------------------------------------------------------------------
 
-    def OnSelectedRemoveChild(self, val):
-
-        if ( not val is None ):
+    def OnSelectedRemoveChild(self, idSelected):
 
-            sender = val.widget
-            idx = sender.curselection()
-            selected = sender.get(idx)
+        if ( not idSelected is None ):
 
-            self.idSelectedChild = re.search( 'I\d\d\d$', selected ).group( 0 )
+            self.idSelectedChild = idSelected
 
 
     # --------------------------------------------------------------------
@@ -658,7 +647,6 @@ class FamilyTab:
         theIndividual = self.ftGraph.GetIndividual( self.idIndividual )
 
         labels = []
-        theLabel  = None
 
         children = self.ftGraph.GetChildren( theIndividual, self.idFamily )
 
@@ -671,12 +659,27 @@ class FamilyTab:
             if ( not forename is None ):
                 label = forename + ' ' + label
 
-            labels.append( label )
+            labels.append( ( label, child.attrib['id'] ) )
 
         labels = sorted( labels )
 
-        for label in labels:
-            self.ChildrenListbox.insert( END, label )
+        # The IDs of the children in listbox row order
+
+        self.childrenListboxIDs = [ idChild for label, idChild in labels ]
+
+        self.ChildrenListbox.insert( END, *[ label for label, idChild in labels ] )
+
+
+    # --------------------------------------------------------------------
+    # OnChildrenListboxSelect
+    # --------------------------------------------------------------------
+
+    def OnChildrenListboxSelect(self, val):
+
+        idx = val.widget.curselection()
+
+        if ( len( idx ) > 0 ):
+            self.ChangeSubject( self.childrenListboxIDs[ int( idx[0] ) ] )
 
 
     # --------------------------------------------------------------------
@@ -23,6 +23,7 @@ import pydot
 import xml.etree.ElementTree as ET
 
 from FamilyTreeXML import FamilyTreeXML
+from FamilyTreeSQLite import FamilyTreeSQLite
 
 
 # ========================================================================
@@ -40,7 +41,9 @@ class FamilyTreeGraph( FamilyTreeXML ):
                   xmlFamilyTree,
                   id=None,
                   ancestors=False,
-                  descendents=False ):
+                  descendents=False,
+                  generationsUp=None,
+                  generationsDown=None ):
 
         super( FamilyTreeGraph, self ).__init__( xmlFamilyTree )
 
@@ -48,9 +51,26 @@ class FamilyTreeGraph( FamilyTreeXML ):
         self.ancestors = ancestors
         self.descendents = descendents
 
+        # The number of generations of ancestors and descendents to plot,
+        # all of them if None
+
+        self.generationsUp = generationsUp
+        self.generationsDown = generationsDown
+
         self.nodes = {}
         self.theIndividual = None
 
+        # What has been plotted so far, and what each Plot* method
+        # returned, so that nothing is plotted twice in one graph
+
+        self.plotted = {}
+
+        # When set, the graph is written to this file as DOT as it's
+        # plotted rather than built with pydot
+
+        self.fileDOT = None
+        self.dotWriter = None
+
 
     # --------------------------------------------------------------------
     #  SetIndividual
@@ -61,84 +81,190 @@ class FamilyTreeGraph( FamilyTreeXML ):
         self.idIndividual = idIndividual
 
 
+    # --------------------------------------------------------------------
+    #  SetDotFile
+    # --------------------------------------------------------------------
+
+    def SetDotFile( self, fileDOT ):
+
+        self.fileDOT = fileDOT
+
+
     # --------------------------------------------------------------------
     #  InitialiseNodes
     # --------------------------------------------------------------------
 
     def InitialiseNodes( self ):
 
-        # Make the nodes
-
-        nIndividuals = 0
+        # The nodes are made by GetNode as the plot reaches each
+        # individual, so only the subject is looked up here
 
         self.nodes = {}
+        self.plotted = {}
         self.theIndividual = None
 
-        individuals = self.GetIndividuals()
+        if ( self.idIndividual ):
 
-        for individual in individuals:
+            self.theIndividual = self.GetIndividualWithID( self.idIndividual )
 
-            idIndi = individual.attrib['id']
-            name = self.GetNameAndID( individual )
-            sex = individual.findtext('SEX')
+            if ( self.theIndividual is None ):
 
-            birthDate = self.ConvertDateTupleToLabel( self.GetDate( individual.find('BIRTH') ) )
-            deathDate = self.ConvertDateTupleToLabel( self.GetDate( individual.find('DEATH') ) )
+                raise Exception( 'ERROR: Cannot find individual with id: {:s}'.format( self.idIndividual ) )
 
-            families = individual.findall('FAMILY_SPOUSE')
 
-            labelsMarried = []
-            labelMarried = None
-            
-            for family in families:
+    # --------------------------------------------------------------------
+    #  GetNode
+    # --------------------------------------------------------------------
 
-                dateMarriage = self.ConvertDateTupleToLabel( self.GetDateMarried( individual,
-                                                                                  family.text ) )
-                dateDivorced = self.ConvertDateTupleToLabel( self.GetDateDivorced( individual,
-                                                                                  family.text ) )
+    def GetNode( self, idIndi ):
 
-                if ( ( not dateMarriage is None ) and ( len( dateMarriage ) > 0 ) and
-                     ( not dateDivorced is None ) and ( len( dateDivorced ) > 0 ) ):
-                    labelMarried = 'm.' + dateMarriage + ', div.' + dateDivorced
+        # The individual's node, made the first time they are plotted
 
-                elif ( ( not dateMarriage is None ) and ( len( dateMarriage ) > 0 ) ):
-                    labelMarried = 'm.' + dateMarriage
+        if ( idIndi in self.nodes ):
+            return self.nodes[ idIndi ]
+
+        label, shape = self.GetNodeAttributes( idIndi )
+
+        self.nodes[ idIndi ] = pydot.Node( name=label, shape=shape )
+
+        return self.nodes[ idIndi ]
+
+
+    # --------------------------------------------------------------------
+    #  GetNodeAttributes
+    # --------------------------------------------------------------------
+
+    def GetNodeAttributes( self, idIndi ):
+
+        individual = self.GetIndividualWithID( idIndi )
+
+        name = self.GetNameAndID( individual )
+        sex = individual.findtext('SEX')
+
+        birthDate = self.ConvertDateTupleToLabel( self.GetBirthDate( individual ) )
+        deathDate = self.ConvertDateTupleToLabel( self.GetDeathDate( individual ) )
+
+        label = name
+
+        if ( ( not birthDate is None ) and ( len( birthDate ) > 0 ) ):
+            label = label + '\nb. {:s}'.format( birthDate )
+
+        if ( ( not deathDate is None ) and ( len( deathDate ) > 0 ) ):
+            label = label + '\nd. {:s}'.format( deathDate )
+
+        if ( sex == 'M' ):
+            return ( label, 'box' )
+        else:
+            return ( label, 'ellipse' )
+
+
+    # --------------------------------------------------------------------
+    #  CreateGraph
+    # --------------------------------------------------------------------
+
+    def CreateGraph( self ):
+
+        if ( self.fileDOT is None ):
+
+            self.dotWriter = None
+
+            return pydot.Dot(graph_type='digraph', strict=True)
+
+        self.dotWriter = DotWriter( self.fileDOT )
+
+        return self.dotWriter
+
+
+    # --------------------------------------------------------------------
+    #  FinishGraph
+    # --------------------------------------------------------------------
 
-                elif ( ( not dateDivorced is None ) and ( len( dateDivorced ) > 0 ) ):
-                    labelMarried = 'div.' + dateDivorced
+    def FinishGraph( self ):
 
-                if ( not labelMarried is None ):
-                    labelsMarried.append( labelMarried )
+        if ( not self.dotWriter is None ):
+            self.dotWriter.Close()
 
-            label = name
 
-            if ( ( not birthDate is None ) and ( len( birthDate ) > 0 ) ):
-                label = label + '\nb. {:s}'.format( birthDate )
+    # --------------------------------------------------------------------
+    #  PlotNode
+    # --------------------------------------------------------------------
 
-            #if ( len( labelsMarried ) > 0 ):
-            #    label = label + '\n' + '\n'.join( labelsMarried )
+    def PlotNode( self, idIndi ):
 
-            if ( ( not deathDate is None ) and ( len( deathDate ) > 0 ) ):
-                label = label + '\nd. {:s}'.format( deathDate )
+        if ( ( 'PlotNode', idIndi ) in self.plotted ):
+            return
 
-            #print idIndi, "Sex: {:s} '{:s}'".format( sex, label ), '\n'
+        self.plotted[ ( 'PlotNode', idIndi ) ] = True
 
-            if ( sex == 'M' ):
-                self.nodes[ idIndi ] = pydot.Node( name=label, shape='box')
-            else:
-                self.nodes[ idIndi ] = pydot.Node( name=label, shape='ellipse' )
+        if ( self.dotWriter is None ):
+            self.graph.add_node( self.GetNode( idIndi ) )
 
-            if ( self.idIndividual and ( self.idIndividual == idIndi ) ):
-                self.theIndividual = individual
+        elif ( not idIndi in self.nodes ):
 
-            nIndividuals = nIndividuals + 1
+            label, shape = self.GetNodeAttributes( idIndi )
 
-        print '\nNumber of individuals:', nIndividuals, '\n'
+            self.nodes[ idIndi ] = label
 
+            self.dotWriter.WriteNode( idIndi, label=label, shape=shape )
 
-        if ( ( not self.idIndividual is None ) and ( self.theIndividual is None ) ):
 
-            raise Exception( 'ERROR: Cannot find individual with id: {:s}'.format( idIndi ) )
+    # --------------------------------------------------------------------
+    #  PlotEdge
+    # --------------------------------------------------------------------
+
+    def PlotEdge( self, idFrom, idTo, **attributes ):
+
+        # An edge already plotted is only plotted again to add attributes
+        # to it, which a strict graph merges
+
+        key = ( 'PlotEdge', idFrom, idTo )
+
+        plotted = self.plotted.get( key )
+
+        if ( ( not plotted is None ) and ( set( attributes.items() ) <= plotted ) ):
+            return
+
+        self.plotted[ key ] = ( plotted or set() ) | set( attributes.items() )
+
+        if ( self.dotWriter is None ):
+            self.graph.add_edge( pydot.Edge( self.GetNode( idFrom ), self.GetNode( idTo ),
+                                             **attributes ) )
+
+        else:
+            self.PlotNode( idFrom )
+            self.PlotNode( idTo )
+
+            self.dotWriter.WriteEdge( idFrom, idTo, **attributes )
+
+
+    # --------------------------------------------------------------------
+    #  PlotCouple
+    # --------------------------------------------------------------------
+
+    def PlotCouple( self, idIndi1, idIndi2 ):
+
+        key = ( 'PlotCouple', frozenset( [ idIndi1, idIndi2 ] ) )
+
+        if ( key in self.plotted ):
+            return
+
+        self.plotted[ key ] = True
+
+        if ( self.dotWriter is None ):
+
+            #couple = pydot.Subgraph(rank='same')
+            couple = pydot.Subgraph()
+
+            couple.add_node( self.GetNode( idIndi1 ) )
+            couple.add_node( self.GetNode( idIndi2 ) )
+
+            self.graph.add_subgraph( couple )
+
+        else:
+            self.PlotNode( idIndi1 )
+            self.PlotNode( idIndi2 )
+
+            self.dotWriter.WriteSubgraph( [ idIndi1, idIndi2 ] )
 
 
     # --------------------------------------------------------------------
@@ -151,7 +277,7 @@ class FamilyTreeGraph( FamilyTreeXML ):
         # Plot ancestors and descendents for a specific individual
         # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-        if ( not self.theIndividual is None ):
+        if ( self.idIndividual ):
 
              self.graph = self.PlotSubTree()
 
@@ -164,6 +290,8 @@ class FamilyTreeGraph( FamilyTreeXML ):
             self.graph = self.PlotEntireTree()
 
 
+        print '\nNumber of individuals:', len( self.nodes ), '\n'
+
         return self.graph
 
     # ----------------------------------------------------------------------
@@ -175,17 +303,18 @@ class FamilyTreeGraph( FamilyTreeXML ):
         self.InitialiseNodes()
 
         try:
-            self.graph = pydot.Dot(graph_type='digraph', strict=True)
+            self.graph = self.CreateGraph()
 
             if ( self.descendents ):
-                self.PlotDescendents( self.theIndividual )
+                self.PlotDescendents( self.theIndividual, self.generationsDown )
 
             if ( self.ancestors ):
-                self.PlotAncestors( self.theIndividual )
+                self.PlotAncestors( self.theIndividual, maxGenerations=self.generationsUp )
 
             if ( ( not self.ancestors ) and ( not self.descendents ) ):
                 self.PlotIndividual( self.theIndividual, True, True, True, True )
 
+            self.FinishGraph()
 
         except:
             print "ERROR: ", sys.exc_info()[0]
@@ -197,14 +326,15 @@ class FamilyTreeGraph( FamilyTreeXML ):
 
 
     # ----------------------------------------------------------------------
-    def PlotAncestorsTree( self ):
+    def PlotAncestorsTree( self, generationsUp=None ):
 
         self.InitialiseNodes()
 
         try:
-            self.graph = pydot.Dot(graph_type='digraph', strict=True)
+            self.graph = self.CreateGraph()
 
-            self.PlotAncestors( self.theIndividual )
+            self.PlotAncestors( self.theIndividual, maxGenerations=generationsUp )
+            self.FinishGraph()
 
         except:
             print "ERROR: ", sys.exc_info()[0]
@@ -216,14 +346,15 @@ class FamilyTreeGraph( FamilyTreeXML ):
 
 
     # ----------------------------------------------------------------------
-    def PlotDescendentsTree( self ):
+    def PlotDescendentsTree( self, generationsDown=None ):
 
         self.InitialiseNodes()
 
         try:
-            self.graph = pydot.Dot(graph_type='digraph', strict=True)
+            self.graph = self.CreateGraph()
 
-            self.PlotDescendents( self.theIndividual )
+            self.PlotDescendents( self.theIndividual, generationsDown )
+            self.FinishGraph()
 
         except:
             print "ERROR: ", sys.exc_info()[0]
@@ -235,15 +366,16 @@ class FamilyTreeGraph( FamilyTreeXML ):
 
 
     # ----------------------------------------------------------------------
-    def PlotSubjectTree( self ):
+    def PlotSubjectTree( self, generationsUp=None, generationsDown=None ):
 
         self.InitialiseNodes()
 
         try:
-            self.graph = pydot.Dot(graph_type='digraph', strict=True)
+            self.graph = self.CreateGraph()
 
-            self.PlotAncestors( self.theIndividual, True, True, False, True, True )
-            self.PlotDescendents( self.theIndividual )
+            self.PlotAncestors( self.theIndividual, True, True, False, True, True, generationsUp )
+            self.PlotDescendents( self.theIndividual, generationsDown )
+            self.FinishGraph()
 
         except:
             print "ERROR: ", sys.exc_info()[0]
@@ -261,7 +393,7 @@ class FamilyTreeGraph( FamilyTreeXML ):
 
         try:
 
-            self.graph = pydot.Dot(graph_type='digraph', strict=True)
+            self.graph = self.CreateGraph()
 
             flgPlotSpouse   = True
             flgPlotParents  = True
@@ -275,6 +407,7 @@ class FamilyTreeGraph( FamilyTreeXML ):
                                  flgPlotChildren,
                                  flgPlotSiblings,
                                  flgPlotWife )
+            self.FinishGraph()
 
         except:
             print "ERROR: ", sys.exc_info()[0]
@@ -291,17 +424,18 @@ class FamilyTreeGraph( FamilyTreeXML ):
         self.InitialiseNodes()
 
         try:
-            self.graph = pydot.Dot(graph_type='digraph', strict=True)
+            self.graph = self.CreateGraph()
 
             if ( self.descendents ):
-                self.PlotDescendents( self.theIndividual )
+                self.PlotDescendents( self.theIndividual, self.generationsDown )
 
             if ( self.ancestors ):
-                self.PlotAncestors( self.theIndividual )
+                self.PlotAncestors( self.theIndividual, maxGenerations=self.generationsUp )
 
             if ( ( not self.ancestors ) and ( not self.descendents ) ):
                 self.PlotIndividual( self.theIndividual, True, True, True, True )
 
+            self.FinishGraph()
 
         except:
             print "ERROR: ", sys.exc_info()[0]
@@ -318,11 +452,12 @@ class FamilyTreeGraph( FamilyTreeXML ):
         self.InitialiseNodes()
 
         try:
-            self.graph = pydot.Dot(graph_type='digraph', strict=True)
+            self.graph = self.CreateGraph()
 
             for individual in self.GetIndividuals():
 
                 self.PlotIndividual( individual, True, True, False, False, True  )
+            self.FinishGraph()
 
         except:
             print "ERROR: ", sys.exc_info()[0]
@@ -344,6 +479,11 @@ class FamilyTreeGraph( FamilyTreeXML ):
         id = individual.attrib['id']
         sex = individual.findtext('SEX')
 
+        if ( ( 'PlotSpouse', id ) in self.plotted ):
+            return self.plotted[ ( 'PlotSpouse', id ) ]
+
+        self.plotted[ ( 'PlotSpouse', id ) ] = spouses
+
         spouseTuple = self.GetSpouses( individual )
 
         for spouseTuple in spouses:
@@ -367,21 +507,13 @@ class FamilyTreeGraph( FamilyTreeXML ):
                     labelMarried = 'd' + dateDivorced
 
 
-                #couple = pydot.Subgraph(rank='same')
-                couple = pydot.Subgraph()
-
-                couple.add_node( self.nodes[ id ] )
-                couple.add_node( self.nodes[ spouse.attrib['id'] ] )
-
-                self.graph.add_subgraph( couple )
+                self.PlotCouple( id, spouse.attrib['id'] )
 
                 if ( sex == 'M' ):
 
-                    edge = pydot.Edge( self.nodes[ id ], self.nodes[ spouse.attrib['id'] ],
-                                       dir='both', arrowhead='dot', arrowtail='dot', penwidth='3',
-                                       label=labelMarried )
-
-                    self.graph.add_edge( edge )
+                    self.PlotEdge( id, spouse.attrib['id'],
+                                   dir='both', arrowhead='dot', arrowtail='dot', penwidth='3',
+                                   label=labelMarried )
 
                 spouses.append( spouse )
 
@@ -396,8 +528,13 @@ class FamilyTreeGraph( FamilyTreeXML ):
         id = individual.attrib['id']
         sex = individual.findtext('SEX')
 
+        if ( ( 'PlotWife', id ) in self.plotted ):
+            return self.plotted[ ( 'PlotWife', id ) ]
+
         wives = []
 
+        self.plotted[ ( 'PlotWife', id ) ] = wives
+
         wifeTuples = self.GetWives( individual )
 
         for wifeTuple in wifeTuples:
@@ -421,22 +558,14 @@ class FamilyTreeGraph( FamilyTreeXML ):
                 elif ( ( not dateDivorce is None ) and ( len( dateDivorce ) > 0 ) ):
                     labelMarried = 'div.' + dateDivorce
 
-                #couple = pydot.Subgraph(rank='same')
-                couple = pydot.Subgraph()
-
-                couple.add_node( self.nodes[ id ] )
-                couple.add_node( self.nodes[ wife.attrib['id'] ] )
-
-                self.graph.add_subgraph( couple )
+                self.PlotCouple( id, wife.attrib['id'] )
 
                 if ( labelMarried is None ):
-                    edge = pydot.Edge( self.nodes[ id ], self.nodes[ wife.attrib['id'] ],
-                                       dir='both', arrowhead='dot', arrowtail='dot', penwidth='2' )
+                    self.PlotEdge( id, wife.attrib['id'],
+                                   dir='both', arrowhead='dot', arrowtail='dot', penwidth='2' )
                 else:
-                    edge = pydot.Edge( self.nodes[ id ], self.nodes[ wife.attrib['id'] ],
-                                       dir='both', arrowhead='dot', arrowtail='dot', penwidth='2', label=labelMarried )
-
-                self.graph.add_edge( edge )
+                    self.PlotEdge( id, wife.attrib['id'],
+                                   dir='both', arrowhead='dot', arrowtail='dot', penwidth='2', label=labelMarried )
 
                 wives.append( wife )
 
@@ -454,6 +583,11 @@ class FamilyTreeGraph( FamilyTreeXML ):
         id = individual.attrib['id']
         sex = individual.findtext('SEX')
 
+        if ( ( 'PlotChildren', id ) in self.plotted ):
+            return self.plotted[ ( 'PlotChildren', id ) ]
+
+        self.plotted[ ( 'PlotChildren', id ) ] = None
+
         if ( sex == 'M' ):
             for wife in self.PlotWife( individual ):
 
@@ -466,11 +600,12 @@ class FamilyTreeGraph( FamilyTreeXML ):
 
         for child in children:
 
-            self.graph.add_node( self.nodes[ id ] )
-            self.graph.add_node( self.nodes[ child.attrib['id'] ] )
+            self.PlotNode( id )
+            self.PlotNode( child.attrib['id'] )
+
+            self.PlotEdge( id, child.attrib['id'] )
 
-            edge = pydot.Edge( self.nodes[ id ], self.nodes[ child.attrib['id'] ] )
-            self.graph.add_edge( edge )
+        self.plotted[ ( 'PlotChildren', id ) ] = children
 
         return children
 
@@ -482,8 +617,13 @@ class FamilyTreeGraph( FamilyTreeXML ):
 
         id = individual.attrib['id']
 
+        if ( ( 'PlotSiblings', id ) in self.plotted ):
+            return self.plotted[ ( 'PlotSiblings', id ) ]
+
         siblings, idFamilySibling = self.GetSiblings( individual )
 
+        self.plotted[ ( 'PlotSiblings', id ) ] = siblings
+
         for sibling in siblings:
 
             self.PlotIndividual( sibling, False )
@@ -498,38 +638,33 @@ class FamilyTreeGraph( FamilyTreeXML ):
 
         id = individual.attrib['id']
 
-        mother, father, idFamilyChild = self.GetParents( individual )
+        if ( ( 'PlotParents', id ) in self.plotted ):
+            return self.plotted[ ( 'PlotParents', id ) ]
 
-        if ( ( not mother is None ) and ( not father is None ) ):
+        mother, father, idFamilyChild = self.GetParents( individual )
 
-            #parents = pydot.Subgraph(rank='same')
-            parents = pydot.Subgraph()
+        self.plotted[ ( 'PlotParents', id ) ] = ( mother, father )
 
-            parents.add_node( self.nodes[ mother.attrib['id'] ] )
-            parents.add_node( self.nodes[ father.attrib['id'] ] )
+        if ( ( not mother is None ) and ( not father is None ) ):
 
-            self.graph.add_subgraph( parents )
+            self.PlotCouple( mother.attrib['id'], father.attrib['id'] )
 
-            edge = pydot.Edge( self.nodes[ mother.attrib['id'] ], self.nodes[ id ] )
-            self.graph.add_edge( edge )
+            self.PlotEdge( mother.attrib['id'], id )
 
-            edge = pydot.Edge( self.nodes[ father.attrib['id'] ], self.nodes[ mother.attrib['id'] ],
-                               dir='both', arrowhead='dot', arrowtail='dot', penwidth='2' )
-            self.graph.add_edge( edge )
+            self.PlotEdge( father.attrib['id'], mother.attrib['id'],
+                           dir='both', arrowhead='dot', arrowtail='dot', penwidth='2' )
 
         elif ( not mother is None ):
 
-            self.graph.add_node( self.nodes[ mother.attrib['id'] ] )
+            self.PlotNode( mother.attrib['id'] )
 
-            edge = pydot.Edge( self.nodes[ mother.attrib['id'] ], self.nodes[ id ] )
-            self.graph.add_edge( edge )
+            self.PlotEdge( mother.attrib['id'], id )
 
         elif ( not father is None ):
 
-            self.graph.add_node( self.nodes[ father.attrib['id'] ] )
+            self.PlotNode( father.attrib['id'] )
 
-            edge = pydot.Edge( self.nodes[ father.attrib['id'] ], self.nodes[ id ] )
-            self.graph.add_edge( edge )
+            self.PlotEdge( father.attrib['id'], id )
 
         return ( mother, father )
 
@@ -545,10 +680,9 @@ class FamilyTreeGraph( FamilyTreeXML ):
 
         if ( not mother is None ):
 
-            self.graph.add_node( self.nodes[ mother.attrib['id'] ] )
+            self.PlotNode( mother.attrib['id'] )
 
-            edge = pydot.Edge( self.nodes[ mother.attrib['id'] ], self.nodes[ id ] )
-            self.graph.add_edge( edge )
+            self.PlotEdge( mother.attrib['id'], id )
 
         return mother
 
@@ -566,8 +700,14 @@ class FamilyTreeGraph( FamilyTreeXML ):
             return ( mother, father )
 
         id = individual.attrib['id']
-        name = self.GetNameAndID( individual )
-        sex = individual.findtext('SEX')
+
+        key = ( 'PlotIndividual', id, flgPlotSpouse, flgPlotParents,
+                flgPlotChildren, flgPlotSiblings, flgPlotWife )
+
+        if ( key in self.plotted ):
+            return self.plotted[ key ]
+
+        self.plotted[ key ] = ( mother, father )
 
         # Spouse
 
@@ -580,7 +720,7 @@ class FamilyTreeGraph( FamilyTreeXML ):
                 self.PlotSpouse( spouse )
 
         #if ( spouse is None ):
-        #    self.graph.add_node( self.nodes[ id ] )
+        #    self.PlotNode( id )
 
         # Parents
 
@@ -612,6 +752,8 @@ class FamilyTreeGraph( FamilyTreeXML ):
         if ( flgPlotSiblings ):
             self.PlotSiblings( individual )
 
+        self.plotted[ key ] = ( mother, father )
+
         return ( mother, father )
     # ----------------------------------------------------------------------
 
@@ -622,46 +764,173 @@ class FamilyTreeGraph( FamilyTreeXML ):
                        flgPlotParents=True,
                        flgPlotChildren=False,
                        flgPlotSiblings=False,
-                       flgPlotWife=False):
+                       flgPlotWife=False,
+                       maxGenerations=None ):
 
-        if ( not individual is None ):
+        if ( individual is None ):
+            return
 
-            mother, father = self.PlotIndividual( individual,
-                                                  flgPlotSpouse,
-                                                  flgPlotParents,
-                                                  flgPlotChildren,
-                                                  flgPlotSiblings,
-                                                  flgPlotWife )
+        # Without the parents there is nothing to link the next generation to
 
-            if ( not mother is None ):
-                self.PlotAncestors( mother,
-                                    flgPlotSpouse,
-                                    flgPlotParents,
-                                    flgPlotChildren,
-                                    flgPlotSiblings,
-                                    flgPlotWife )
+        if ( not flgPlotParents ):
+            maxGenerations = 0
 
-            if ( not father is None ):
-                self.PlotAncestors( father,
-                                    flgPlotSpouse,
-                                    flgPlotParents,
-                                    flgPlotChildren,
-                                    flgPlotSiblings,
-                                    flgPlotWife )
+        for idAncestor, depth in self.IterateAncestors( individual.attrib['id'], maxGenerations ):
 
-    # ----------------------------------------------------------------------
+            # The parents and siblings of the last generation plotted would
+            # be a generation further up
+
+            flgLastGeneration = ( ( not maxGenerations is None ) and ( depth == maxGenerations ) )
 
+            self.PlotIndividual( self.GetIndividualWithID( idAncestor ),
+                                 flgPlotSpouse,
+                                 flgPlotParents and ( not flgLastGeneration ),
+                                 flgPlotChildren,
+                                 flgPlotSiblings and ( not flgLastGeneration ),
+                                 flgPlotWife )
 
     # ----------------------------------------------------------------------
-    def PlotDescendents( self, individual ):
 
-        if ( not individual is None ):
 
-            self.PlotChildren( individual )
+    # ----------------------------------------------------------------------
+    def PlotDescendents( self, individual, maxGenerations=None ):
+
+        if ( individual is None ):
+            return
 
-            children = self.GetChildren( individual )
+        for idDescendent, depth in self.IterateDescendents( individual.attrib['id'], maxGenerations ):
 
-            for child in children:
-                self.PlotDescendents( child )
+            if ( ( maxGenerations is None ) or ( depth < maxGenerations ) ):
+                self.PlotChildren( self.GetIndividualWithID( idDescendent ) )
 
     # ----------------------------------------------------------------------
+
+
+# ========================================================================
+# Class to write a graph as DOT as it's plotted
+# ========================================================================
+
+class DotWriter:
+
+    # Nodes are identified by individual ID and written once, by the
+    # caller, edges and subgraphs are de-duplicated here, so the output is
+    # the same as a strict pydot graph without holding the graph in memory
+
+    def __init__( self, fileDOT ):
+
+        self.fileDOT = fileDOT
+
+        self.edges = {}
+        self.subgraphs = set()
+
+        self.fileDOT.write( 'strict digraph G {\n' )
+
+
+    # --------------------------------------------------------------------
+    #  Quote
+    # --------------------------------------------------------------------
+
+    def Quote( self, text ):
+
+        text = text.replace( '\\', '\\\\' ).replace( '"', '\\"' ).replace( '\n', '\\n' )
+
+        if ( isinstance( text, unicode ) ):
+            text = text.encode( 'utf-8' )
+
+        return '"' + text + '"'
+
+
+    # --------------------------------------------------------------------
+    #  GetAttributes
+    # --------------------------------------------------------------------
+
+    def GetAttributes( self, attributes ):
+
+        attributes = [ '{:s}={:s}'.format( name, self.Quote( value ) )
+                       for name, value in sorted( attributes.items() )
+                       if ( not value is None ) ]
+
+        if ( len( attributes ) == 0 ):
+            return ''
+
+        return ' [' + ', '.join( attributes ) + ']'
+
+
+    # --------------------------------------------------------------------
+    #  WriteNode
+    # --------------------------------------------------------------------
+
+    def WriteNode( self, idNode, **attributes ):
+
+        self.fileDOT.write( self.Quote( idNode ) + self.GetAttributes( attributes ) + ';\n' )
+
+
+    # --------------------------------------------------------------------
+    #  WriteEdge
+    # --------------------------------------------------------------------
+
+    def WriteEdge( self, idFrom, idTo, **attributes ):
+
+        # An edge is written again only to add attributes to it, which
+        # graphviz merges into the first
+
+        written = self.edges.get( ( idFrom, idTo ) )
+
+        if ( ( not written is None ) and ( set( attributes.items() ) <= written ) ):
+            return
+
+        self.edges[ ( idFrom, idTo ) ] = ( written or set() ) | set( attributes.items() )
+
+        self.fileDOT.write( self.Quote( idFrom ) + ' -> ' + self.Quote( idTo ) +
+                            self.GetAttributes( attributes ) + ';\n' )
+
+
+    # --------------------------------------------------------------------
+    #  WriteSubgraph
+    # --------------------------------------------------------------------
+
+    def WriteSubgraph( self, idNodes ):
+
+        if ( frozenset( idNodes ) in self.subgraphs ):
+            return
+
+        self.subgraphs.add( frozenset( idNodes ) )
+
+        self.fileDOT.write( '{ ' + ' '.join( [ self.Quote( idNode ) + ';' for idNode in idNodes ] ) + ' }\n' )
+
+
+    # --------------------------------------------------------------------
+    #  Close
+    # --------------------------------------------------------------------
+
+    def Close( self ):
+
+        self.fileDOT.write( '}\n' )
+        self.fileDOT.flush()
+
+
+# ========================================================================
+# Class to build family tree graphs of a tree kept in an SQLite database
+# ========================================================================
+
+class FamilyTreeGraphSQLite( FamilyTreeGraph, FamilyTreeSQLite ):
+
+
+    # --------------------------------------------------------------------
+    #  __init__
+    # --------------------------------------------------------------------
+
+    def __init__( self,
+                  fileDatabase,
+                  id=None,
+                  ancestors=False,
+                  descendents=False,
+                  generationsUp=None,
+                  generationsDown=None,
+                  moduleET=None ):
+
+        if ( not moduleET is None ):
+            self.moduleET = moduleET
+
+        super( FamilyTreeGraphSQLite, self ).__init__( fileDatabase, id, ancestors, descendents,
+                                                     generationsUp, generationsDown )
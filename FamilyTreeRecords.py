@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+#   FamilyTree
+#   Copyright (C) 2015 Elstree Caldwell
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+# Records without attributes all share this one, so it must not be changed
+
+NO_ATTRIBUTES = {}
+
+
+# ========================================================================
+# A compact, read only stand in for an XML element. Only the parts of
+# the ElementTree API that FamilyTreeXML reads with are provided: tag,
+# attrib, text and tail, iterating over the children, and find, findtext
+# and findall with simple tag/tag paths.
+# ========================================================================
+
+class FamilyTreeRecord( object ):
+
+    __slots__ = ( 'tag', 'attrib', 'text', 'tail', 'children' )
+
+
+    # --------------------------------------------------------------------
+    #  __init__
+    # --------------------------------------------------------------------
+
+    def __init__( self, tag, attrib=None, text=None, tail=None, children=() ):
+
+        self.tag = tag
+        self.attrib = attrib or NO_ATTRIBUTES
+        self.text = text
+        self.tail = tail
+        self.children = children
+
+
+    # ----------------------------------------------------------------------
+    def get( self, key, default=None ):
+
+        return self.attrib.get( key, default )
+
+
+    # ----------------------------------------------------------------------
+    def __len__( self ):
+
+        return len( self.children )
+
+
+    # ----------------------------------------------------------------------
+    def __iter__( self ):
+
+        return iter( self.children )
+
+
+    # ----------------------------------------------------------------------
+    def __getitem__( self, index ):
+
+        return self.children[ index ]
+
+
+    # ----------------------------------------------------------------------
+    def append( self, record ):
+
+        # Only the root of a tree, whose children are a list, can grow
+
+        self.children.append( record )
+
+
+    # ----------------------------------------------------------------------
+    def remove( self, record ):
+
+        self.children.remove( record )
+
+
+    # ----------------------------------------------------------------------
+    def findall( self, path ):
+
+        records = [ self ]
+
+        for tag in path.split( '/' ):
+            records = [ child for record in records for child in record.children
+                        if child.tag == tag ]
+
+        return records
+
+
+    # ----------------------------------------------------------------------
+    def find( self, path ):
+
+        if ( '/' in path ):
+
+            records = self.findall( path )
+
+            if ( len( records ) == 0 ):
+                return None
+
+            return records[0]
+
+        for child in self.children:
+
+            if ( child.tag == path ):
+                return child
+
+        return None
+
+
+    # ----------------------------------------------------------------------
+    def findtext( self, path, default=None ):
+
+        record = self.find( path )
+
+        if ( record is None ):
+            return default
+
+        return record.text or ''
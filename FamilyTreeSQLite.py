@@ -0,0 +1,821 @@
+#!/usr/bin/env python
+
+#   FamilyTree
+#   Copyright (C) 2015 Elstree Caldwell
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import sqlite3
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+from FamilyTreeXML import FamilyTreeXML
+
+
+# The first bytes of every SQLite database file
+
+SQLITE_MAGIC = 'SQLite format 3\x00'
+
+# The number of individuals, and of families, kept parsed once they have
+# been looked up, besides those changed since the last commit
+
+RECORD_CACHE_SIZE = 1000
+
+
+# ------------------------------------------------------------------------
+def IsDatabaseFile( filename ):
+
+    if ( not os.path.isfile( filename ) ):
+        return False
+
+    with open( filename, 'rb' ) as fileIn:
+        return ( fileIn.read( len( SQLITE_MAGIC ) ) == SQLITE_MAGIC )
+
+
+# ========================================================================
+# The individuals or families in a database, looked up by ID like the
+# dictionaries FamilyTreeXML indexes them with. Elements are parsed from
+# the database when they are asked for and the most recently used are
+# kept. Those a change may have altered are kept until Commit() writes
+# them back.
+# ========================================================================
+
+class FamilyTreeSQLiteRecords( object ):
+
+
+    # --------------------------------------------------------------------
+    #  __init__
+    # --------------------------------------------------------------------
+
+    def __init__( self, ftSQLite, table, cacheSize=RECORD_CACHE_SIZE ):
+
+        self.ftSQLite = ftSQLite
+        self.table = table
+        self.cacheSize = cacheSize
+
+        self.elements = OrderedDict()
+        self.dirty = {}
+
+
+    # ----------------------------------------------------------------------
+    def __contains__( self, idRecord ):
+
+        if ( ( idRecord in self.dirty ) or ( idRecord in self.elements ) ):
+            return True
+
+        return ( self.ftSQLite.db.execute( 'SELECT 1 FROM {:s} WHERE id = ?'.format( self.table ),
+                                           ( idRecord, ) ).fetchone() is not None )
+
+
+    # ----------------------------------------------------------------------
+    def get( self, idRecord, default=None ):
+
+        element = self.dirty.get( idRecord )
+
+        if ( not element is None ):
+            return element
+
+        element = self.elements.pop( idRecord, None )
+
+        if ( element is None ):
+
+            row = self.ftSQLite.db.execute( 'SELECT xml FROM {:s} WHERE id = ?'.format( self.table ),
+                                            ( idRecord, ) ).fetchone()
+
+            if ( row is None ):
+                return default
+
+            element = self.ftSQLite.moduleET.fromstring( row[0] )
+
+        self.Keep( idRecord, element )
+
+        return element
+
+
+    # ----------------------------------------------------------------------
+    def Keep( self, idRecord, element ):
+
+        # Keep an element as the most recently used, dropping the least
+        # recently used, and what was worked out from them, beyond the
+        # size of the cache
+
+        self.elements[ idRecord ] = element
+
+        while ( len( self.elements ) > self.cacheSize ):
+
+            idDropped, eDropped = self.elements.popitem( last=False )
+
+            derived = self.ftSQLite.derivedByID.get( idDropped )
+
+            if ( ( not derived is None ) and ( derived[0] is eDropped ) ):
+                del self.ftSQLite.derivedByID[ idDropped ]
+
+
+    # ----------------------------------------------------------------------
+    def MarkDirty( self, element ):
+
+        # Keep an element a change may alter until Commit() writes it
+
+        idRecord = element.attrib['id']
+
+        self.elements.pop( idRecord, None )
+        self.dirty[ idRecord ] = element
+
+
+    # ----------------------------------------------------------------------
+    def WriteDirty( self ):
+
+        # Write back the elements changes may have altered, after which
+        # they are kept like any other
+
+        for idRecord, element in self.dirty.items():
+
+            self.ftSQLite.WriteRecord( element )
+            self.Keep( idRecord, element )
+
+        self.dirty = {}
+
+
+    # ----------------------------------------------------------------------
+    def __getitem__( self, idRecord ):
+
+        element = self.get( idRecord )
+
+        if ( element is None ):
+            raise KeyError( idRecord )
+
+        return element
+
+
+    # ----------------------------------------------------------------------
+    def __setitem__( self, idRecord, element ):
+
+        self.dirty.pop( idRecord, None )
+        self.elements.pop( idRecord, None )
+
+        self.ftSQLite.WriteRecord( element )
+        self.Keep( idRecord, element )
+
+
+    # ----------------------------------------------------------------------
+    def pop( self, idRecord, default=None ):
+
+        element = self.get( idRecord, default )
+
+        self.dirty.pop( idRecord, None )
+        self.elements.pop( idRecord, None )
+
+        self.ftSQLite.db.execute( 'DELETE FROM {:s} WHERE id = ?'.format( self.table ), ( idRecord, ) )
+        self.ftSQLite.db.execute( 'DELETE FROM events WHERE record = ?', ( idRecord, ) )
+
+        return element
+
+
+    # ----------------------------------------------------------------------
+    def IsKept( self, element ):
+
+        idRecord = element.attrib['id']
+
+        return ( ( self.dirty.get( idRecord ) is element ) or
+                 ( self.elements.get( idRecord ) is element ) )
+
+
+    # ----------------------------------------------------------------------
+    def GetFirst( self ):
+
+        row = self.ftSQLite.db.execute( 'SELECT id FROM {:s} ORDER BY rowid LIMIT 1'
+                                        .format( self.table ) ).fetchone()
+
+        if ( row is None ):
+            return None
+
+        return self.get( row[0] )
+
+
+    # ----------------------------------------------------------------------
+    def keys( self ):
+
+        return [ row[0] for row in
+                 self.ftSQLite.db.execute( 'SELECT id FROM {:s} ORDER BY rowid'.format( self.table ) ) ]
+
+
+    # ----------------------------------------------------------------------
+    def __iter__( self ):
+
+        return iter( self.keys() )
+
+
+    # ----------------------------------------------------------------------
+    def __len__( self ):
+
+        return self.ftSQLite.db.execute( 'SELECT COUNT(*) FROM {:s}'.format( self.table ) ).fetchone()[0]
+
+
+    # ----------------------------------------------------------------------
+    def IterElements( self ):
+
+        # Every element in tree order. Those not already in use are
+        # parsed for the caller but not kept, so walking the whole
+        # database doesn't load it into memory. They are for reading
+        # only: a change made to one is lost, so look the record up by
+        # ID to change it.
+
+        for idRecord, xml in self.ftSQLite.db.execute( 'SELECT id, xml FROM {:s} ORDER BY rowid'
+                                                       .format( self.table ) ):
+
+            element = self.dirty.get( idRecord )
+
+            if ( element is None ):
+                element = self.elements.get( idRecord )
+
+            if ( element is None ):
+                element = self.ftSQLite.moduleET.fromstring( xml )
+
+            yield element
+
+
+# ========================================================================
+# A list of the individuals or families in a database which, like the
+# list findall() returns, can be iterated over more than once
+# ========================================================================
+
+class FamilyTreeSQLiteElements( object ):
+
+
+    # --------------------------------------------------------------------
+    #  __init__
+    # --------------------------------------------------------------------
+
+    def __init__( self, records ):
+
+        self.records = records
+
+
+    # ----------------------------------------------------------------------
+    def __iter__( self ):
+
+        return self.records.IterElements()
+
+
+    # ----------------------------------------------------------------------
+    def __len__( self ):
+
+        return len( self.records )
+
+
+# ========================================================================
+# Stands in for the root element of the tree. Individuals and families
+# are stored in the database, as FamilyTreeXML indexes them, so adding
+# or removing them here does nothing; any other element, such as the
+# HEADER, is held in memory and saved by Commit(), as are the tag and
+# attributes of the root itself.
+# ========================================================================
+
+class FamilyTreeSQLiteRoot( object ):
+
+
+    # --------------------------------------------------------------------
+    #  __init__
+    # --------------------------------------------------------------------
+
+    def __init__( self, ftSQLite, elements, tag='FamilyTree', attrib=None ):
+
+        self.ftSQLite = ftSQLite
+        self.tag = tag
+        self.attrib = dict( attrib or {} )
+        self.text = None
+        self.tail = None
+        self.elements = elements
+
+
+    # ----------------------------------------------------------------------
+    def makeelement( self, tag, attrib ):
+
+        return self.ftSQLite.moduleET.Element( tag, attrib )
+
+
+    # ----------------------------------------------------------------------
+    def append( self, element ):
+
+        if ( not element.tag in ( 'INDIVIDUAL', 'FAMILY' ) ):
+            self.elements.append( element )
+
+
+    # ----------------------------------------------------------------------
+    def remove( self, element ):
+
+        if ( not element.tag in ( 'INDIVIDUAL', 'FAMILY' ) ):
+            self.elements.remove( element )
+
+
+    # ----------------------------------------------------------------------
+    def findall( self, path ):
+
+        if ( path == 'INDIVIDUAL' ):
+            return FamilyTreeSQLiteElements( self.ftSQLite.individualsByID )
+
+        if ( path == 'FAMILY' ):
+            return FamilyTreeSQLiteElements( self.ftSQLite.familiesByID )
+
+        return [ element for element in self.elements if element.tag == path ]
+
+
+    # ----------------------------------------------------------------------
+    def find( self, path ):
+
+        if ( path == 'INDIVIDUAL' ):
+            return self.ftSQLite.individualsByID.GetFirst()
+
+        if ( path == 'FAMILY' ):
+            return self.ftSQLite.familiesByID.GetFirst()
+
+        for element in self.findall( path ):
+            return element
+
+        return None
+
+
+    # ----------------------------------------------------------------------
+    def __iter__( self ):
+
+        for element in self.elements:
+            yield element
+
+        for element in self.findall( 'INDIVIDUAL' ):
+            yield element
+
+        for element in self.findall( 'FAMILY' ):
+            yield element
+
+
+# ========================================================================
+# Class to keep a family tree in an SQLite database
+#
+# Each individual and family is stored as its XML along with indexed
+# columns for its name, sex and parents, tables of the relationships
+# between them and of their dated events. FamilyTreeXML's relationship
+# index is answered from those tables, so only the records actually
+# used are ever parsed.
+# ========================================================================
+
+class FamilyTreeSQLite( FamilyTreeXML ):
+
+    # The ElementTree implementation the elements are made with, lxml's
+    # for instance in the editor
+
+    moduleET = ET
+
+
+    # --------------------------------------------------------------------
+    #  __init__
+    # --------------------------------------------------------------------
+
+    def __init__( self,
+                  fileDatabase,
+                  flgDebug=False,
+                  moduleET=None ):
+
+        self.fileDatabase = fileDatabase
+
+        if ( not moduleET is None ):
+            self.moduleET = moduleET
+
+        self.db = sqlite3.connect( fileDatabase )
+        self.db.text_factory = str
+
+        self.CreateTables()
+
+        elements = [ self.moduleET.fromstring( row[0] ) for row in
+                     self.db.execute( 'SELECT xml FROM elements ORDER BY position' ) ]
+
+        root = FamilyTreeSQLiteRoot( self, elements )
+
+        row = self.db.execute( 'SELECT xml FROM root' ).fetchone()
+
+        if ( not row is None ):
+
+            eRoot = self.moduleET.fromstring( row[0] )
+
+            root.tag = eRoot.tag
+            root.attrib = dict( eRoot.attrib )
+
+        super( FamilyTreeSQLite, self ).__init__( root, flgDebug )
+
+
+    # ----------------------------------------------------------------------
+    def CreateTables( self ):
+
+        self.db.executescript( '''
+            CREATE TABLE IF NOT EXISTS individuals (
+                id TEXT PRIMARY KEY, surname TEXT, forename TEXT, sex TEXT, xml TEXT NOT NULL );
+
+            CREATE TABLE IF NOT EXISTS families (
+                id TEXT PRIMARY KEY, husband TEXT, wife TEXT, xml TEXT NOT NULL );
+
+            CREATE TABLE IF NOT EXISTS memberships (
+                individual TEXT NOT NULL, family TEXT NOT NULL, role TEXT NOT NULL,
+                position INTEGER NOT NULL );
+
+            CREATE TABLE IF NOT EXISTS children (
+                family TEXT NOT NULL, child TEXT NOT NULL, position INTEGER NOT NULL );
+
+            CREATE TABLE IF NOT EXISTS events (
+                record TEXT NOT NULL, event TEXT NOT NULL,
+                day TEXT, month TEXT, year TEXT, place TEXT );
+
+            CREATE TABLE IF NOT EXISTS elements (
+                position INTEGER PRIMARY KEY, xml TEXT NOT NULL );
+
+            CREATE TABLE IF NOT EXISTS root (
+                xml TEXT NOT NULL );
+
+            CREATE INDEX IF NOT EXISTS individuals_name ON individuals ( surname, forename );
+            CREATE INDEX IF NOT EXISTS families_husband ON families ( husband );
+            CREATE INDEX IF NOT EXISTS families_wife ON families ( wife );
+            CREATE INDEX IF NOT EXISTS memberships_individual ON memberships ( individual, role, position );
+            CREATE INDEX IF NOT EXISTS memberships_family ON memberships ( family );
+            CREATE INDEX IF NOT EXISTS children_family ON children ( family, position );
+            CREATE INDEX IF NOT EXISTS children_child ON children ( child );
+            CREATE INDEX IF NOT EXISTS events_record ON events ( record );
+            CREATE INDEX IF NOT EXISTS events_year ON events ( event, year );
+            ''' )
+
+
+    # ----------------------------------------------------------------------
+    def IndexTree( self ):
+
+        # The database is the index, all that is needed here are the
+        # views of it and the IDs available for new records
+
+        self.individualsByID = FamilyTreeSQLiteRecords( self, 'individuals' )
+        self.familiesByID = FamilyTreeSQLiteRecords( self, 'families' )
+
+        self.derivedByID = {}
+
+        self.ClearRecordIndexes()
+
+        self.idHighWater = { 'I': 0, 'F': 0 }
+        self.idsFree     = { 'I': [], 'F': [] }
+
+        for idIndi in self.individualsByID.keys():
+            self.ReserveID( 'I', idIndi )
+
+        for idFamily in self.familiesByID.keys():
+            self.ReserveID( 'F', idFamily )
+
+
+    # ----------------------------------------------------------------------
+    def WriteRecord( self, element ):
+
+        # Store an individual or family element with its indexed columns
+        # and events
+
+        idRecord = element.attrib['id']
+
+        tail = element.tail
+        element.tail = None
+        xml = self.moduleET.tostring( element )
+        element.tail = tail
+
+        if ( element.tag == 'INDIVIDUAL' ):
+
+            if ( self.db.execute( 'UPDATE individuals SET surname = ?, forename = ?, sex = ?, xml = ? '
+                                  'WHERE id = ?',
+                                  ( element.findtext('NAME/surname'), element.findtext('NAME/forename'),
+                                    element.findtext('SEX'), xml, idRecord ) ).rowcount == 0 ):
+
+                self.db.execute( 'INSERT INTO individuals ( id, surname, forename, sex, xml ) '
+                                 'VALUES ( ?, ?, ?, ?, ? )',
+                                 ( idRecord, element.findtext('NAME/surname'),
+                                   element.findtext('NAME/forename'), element.findtext('SEX'), xml ) )
+        else:
+
+            if ( self.db.execute( 'UPDATE families SET xml = ? WHERE id = ?',
+                                  ( xml, idRecord ) ).rowcount == 0 ):
+
+                self.db.execute( 'INSERT INTO families ( id, husband, wife, xml ) VALUES ( ?, ?, ?, ? )',
+                                 ( idRecord, element.findtext('HUSBAND'), element.findtext('WIFE'), xml ) )
+
+        self.db.execute( 'DELETE FROM events WHERE record = ?', ( idRecord, ) )
+
+        for eEvent in element:
+
+            if ( ( not eEvent.find('DATE') is None ) or ( not eEvent.find('PLACE') is None ) ):
+
+                self.db.execute( 'INSERT INTO events ( record, event, day, month, year, place ) '
+                                 'VALUES ( ?, ?, ?, ?, ?, ? )',
+                                 ( idRecord, eEvent.tag,
+                                   eEvent.findtext('DATE/day'), eEvent.findtext('DATE/month'),
+                                   eEvent.findtext('DATE/year'), eEvent.findtext('PLACE') ) )
+
+
+    # ----------------------------------------------------------------------
+    def IndexIndividualRelations( self, individual ):
+
+        idIndi = individual.attrib['id']
+
+        self.db.execute( 'DELETE FROM memberships WHERE individual = ?', ( idIndi, ) )
+
+        for role in ( 'FAMILY_CHILD', 'FAMILY_SPOUSE' ):
+
+            for position, eFamily in enumerate( individual.findall( role ) ):
+
+                self.db.execute( 'INSERT INTO memberships ( individual, family, role, position ) '
+                                 'VALUES ( ?, ?, ?, ? )',
+                                 ( idIndi, eFamily.text or '', role, position ) )
+
+
+    # ----------------------------------------------------------------------
+    def UnindexFamilyReferences( self, idIndi ):
+
+        self.db.execute( 'DELETE FROM memberships WHERE individual = ?', ( idIndi, ) )
+
+
+    # ----------------------------------------------------------------------
+    def IndexFamilyRelations( self, family ):
+
+        idFamily = family.attrib['id']
+
+        self.db.execute( 'UPDATE families SET husband = ?, wife = ? WHERE id = ?',
+                         ( family.findtext('HUSBAND'), family.findtext('WIFE'), idFamily ) )
+
+        self.db.execute( 'DELETE FROM children WHERE family = ?', ( idFamily, ) )
+
+        for position, eChild in enumerate( family.findall('CHILD') ):
+
+            self.db.execute( 'INSERT INTO children ( family, child, position ) VALUES ( ?, ?, ? )',
+                             ( idFamily, eChild.text or '', position ) )
+
+
+    # ----------------------------------------------------------------------
+    def UnindexIndividual( self, individual ):
+
+        idIndi = individual.attrib['id']
+
+        self.individualsByID.pop( idIndi, None )
+        self.UnindexFamilyReferences( idIndi )
+
+        self.ReleaseID( 'I', idIndi )
+
+
+    # ----------------------------------------------------------------------
+    def UnindexFamily( self, family ):
+
+        idFamily = family.attrib['id']
+
+        self.familiesByID.pop( idFamily, None )
+        self.db.execute( 'DELETE FROM children WHERE family = ?', ( idFamily, ) )
+
+        self.ReleaseID( 'F', idFamily )
+
+
+    # ----------------------------------------------------------------------
+    def MarkChanged( self, element, flgCreated=False ):
+
+        # Only the records a change may alter are written back by Commit()
+
+        super( FamilyTreeSQLite, self ).MarkChanged( element, flgCreated )
+
+        if ( ( self.recordsChanged is None ) or ( element is None ) ):
+            return
+
+        if ( element.tag == 'INDIVIDUAL' ):
+            self.individualsByID.MarkDirty( element )
+        else:
+            self.familiesByID.MarkDirty( element )
+
+
+    # ----------------------------------------------------------------------
+    def IsIndividualKept( self, individual ):
+
+        # Individuals read while walking the database aren't kept, see
+        # FamilyTreeSQLiteRecords.IterElements()
+
+        return self.individualsByID.IsKept( individual )
+
+
+    # ----------------------------------------------------------------------
+    def GetFamiliesAsChild( self, idIndividual ):
+
+        return [ row[0] for row in
+                 self.db.execute( 'SELECT family FROM memberships WHERE individual = ? AND role = ? '
+                                  'ORDER BY position', ( idIndividual, 'FAMILY_CHILD' ) ) ]
+
+
+    # ----------------------------------------------------------------------
+    def GetFamiliesAsSpouse( self, idIndividual ):
+
+        return [ row[0] for row in
+                 self.db.execute( 'SELECT family FROM memberships WHERE individual = ? AND role = ? '
+                                  'ORDER BY position', ( idIndividual, 'FAMILY_SPOUSE' ) ) ]
+
+
+    # ----------------------------------------------------------------------
+    def GetHusbandID( self, idFamily ):
+
+        row = self.db.execute( 'SELECT husband FROM families WHERE id = ?', ( idFamily, ) ).fetchone()
+
+        if ( row is None ):
+            return None
+
+        return row[0]
+
+
+    # ----------------------------------------------------------------------
+    def GetWifeID( self, idFamily ):
+
+        row = self.db.execute( 'SELECT wife FROM families WHERE id = ?', ( idFamily, ) ).fetchone()
+
+        if ( row is None ):
+            return None
+
+        return row[0]
+
+
+    # ----------------------------------------------------------------------
+    def GetChildIDs( self, idFamily ):
+
+        return [ row[0] for row in
+                 self.db.execute( 'SELECT child FROM children WHERE family = ? ORDER BY position',
+                                  ( idFamily, ) ) ]
+
+
+    # ----------------------------------------------------------------------
+    def GetFamilyReferences( self, idFamily ):
+
+        return set( row[0] for row in
+                    self.db.execute( 'SELECT individual FROM memberships WHERE family = ?',
+                                     ( idFamily, ) ) )
+
+
+    # ----------------------------------------------------------------------
+    def GetAdjacentIndividualID( self, individual ):
+
+        # The individual before this one in the database or, failing
+        # that, the one after
+
+        idIndi = individual.attrib['id']
+
+        row = self.db.execute( 'SELECT id FROM individuals WHERE rowid < '
+                               '( SELECT rowid FROM individuals WHERE id = ? ) '
+                               'ORDER BY rowid DESC LIMIT 1', ( idIndi, ) ).fetchone()
+
+        if ( row is None ):
+            row = self.db.execute( 'SELECT id FROM individuals WHERE rowid > '
+                                   '( SELECT rowid FROM individuals WHERE id = ? ) '
+                                   'ORDER BY rowid LIMIT 1', ( idIndi, ) ).fetchone()
+
+        if ( row is None ):
+            return None
+
+        return row[0]
+
+
+    # ----------------------------------------------------------------------
+    def Commit( self ):
+
+        # Write back every element a change may have altered and commit
+        # the lot
+
+        for records in ( self.individualsByID, self.familiesByID ):
+            records.WriteDirty()
+
+        self.db.execute( 'DELETE FROM elements' )
+
+        for position, element in enumerate( self.ftXML.elements ):
+
+            self.db.execute( 'INSERT INTO elements ( position, xml ) VALUES ( ?, ? )',
+                             ( position, self.moduleET.tostring( element ) ) )
+
+        self.db.execute( 'DELETE FROM root' )
+        self.db.execute( 'INSERT INTO root ( xml ) VALUES ( ? )',
+                         ( self.moduleET.tostring( self.moduleET.Element( self.ftXML.tag,
+                                                                          self.ftXML.attrib ) ), ) )
+
+        self.db.commit()
+
+
+    # ----------------------------------------------------------------------
+    def Close( self ):
+
+        self.db.close()
+
+
+    # ----------------------------------------------------------------------
+    def ImportXML( self, source ):
+
+        # Add the records of an XML family tree, streaming it so that the
+        # file never has to be held in memory. A file with changes saved
+        # to its journal is read with them, in full, first.
+
+        fnIterParse = self.moduleET.iterparse
+
+        if ( isinstance( source, basestring ) ):
+
+            journal = self.ReadJournal( source )
+
+            if ( ( not journal is None ) and ( len( journal[0] ) > 0 ) ):
+
+                ftJournalled = FamilyTreeXML( None )
+                ftJournalled.ReadFile( source, None, False, self.moduleET.iterparse, self.moduleET.Element )
+
+                source = ftJournalled.ftXML
+                fnIterParse = ftJournalled.IterParseTree
+
+        depth = 0
+
+        for event, element in fnIterParse( source, events=( 'start', 'end' ) ):
+
+            if ( event == 'start' ):
+
+                if ( depth == 0 ):
+
+                    root = element
+
+                    self.ftXML.tag = root.tag
+                    self.ftXML.attrib = dict( root.attrib )
+
+                depth = depth + 1
+                continue
+
+            depth = depth - 1
+
+            if ( depth != 1 ):
+                continue
+
+            root.remove( element )
+
+            if ( element.tag == 'INDIVIDUAL' ):
+
+                if ( element.attrib['id'] in self.individualsByID ):
+                    raise Exception( 'ERROR: Found multiple individuals with the same ID: {:s}'.format
+                                     ( element.attrib['id'] ) )
+
+                self.WriteRecord( element )
+                self.IndexIndividualRelations( element )
+                self.ReserveID( 'I', element.attrib['id'] )
+
+            elif ( element.tag == 'FAMILY' ):
+
+                # As when the XML is read, only the first family with an ID
+                # is kept
+
+                if ( element.attrib['id'] in self.familiesByID ):
+                    print 'WARNING: Ignoring all but the first family with the ID: {:s}'.format(
+                        element.attrib['id'] )
+                    continue
+
+                self.WriteRecord( element )
+                self.IndexFamilyRelations( element )
+                self.ReserveID( 'F', element.attrib['id'] )
+
+            else:
+
+                element.tail = None
+                self.ftXML.append( element )
+
+        self.Commit()
+
+
+    # ----------------------------------------------------------------------
+    def ExportXML( self, filename ):
+
+        # Write the tree out as XML a record at a time, inside a root
+        # element like the one it was imported from. Records are written
+        # as ASCII, with character references, so are valid UTF-8.
+
+        eRoot = self.moduleET.Element( self.ftXML.tag, self.ftXML.attrib )
+        eRoot.text = '\n'
+
+        xmlRoot = self.moduleET.tostring( eRoot )
+        iText = xmlRoot.rindex( '\n' )
+
+        with open( filename, 'wb' ) as fileOut:
+
+            fileOut.write( "<?xml version='1.0' encoding='UTF-8'?>\n" )
+            fileOut.write( xmlRoot[ : iText + 1 ] )
+
+            for element in self.ftXML:
+
+                tail = element.tail
+                element.tail = None
+
+                fileOut.write( '  ' + self.moduleET.tostring( element ) + '\n' )
+
+                element.tail = tail
+
+            fileOut.write( xmlRoot[ iText + 1 : ] + '\n' )
@@ -18,10 +18,122 @@
 #   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 
+import os
 import sys
+import re
+import heapq
+import bisect
+import struct
+import marshal
+import hashlib
+import contextlib
+from collections import deque
 import xml.etree.ElementTree as ET
 from copy import deepcopy
 
+from FamilyTreeRecords import FamilyTreeRecord
+
+
+# Bump whenever the layout of the snapshot files changes
+
+SNAPSHOT_VERSION = 2
+
+# and of the journal files
+
+JOURNAL_VERSION = 2
+
+# The size, as a fraction of the XML file, a journal can grow to before
+# the tree should be saved in full again
+
+JOURNAL_COMPACT_FRACTION = 0.1
+
+# The number of changes that can be undone by default
+
+UNDO_HISTORY_DEPTH = 100
+
+# Months as the editor writes them
+
+MONTHS = [ 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+           'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec' ]
+
+# How precisely a date is known
+
+DATE_PRECISION_YEAR  = 1
+DATE_PRECISION_MONTH = 2
+DATE_PRECISION_DAY   = 3
+
+# The events whose dates are indexed and the records they are found in
+
+DATED_EVENTS = { 'BIRTH':    'INDIVIDUAL',
+                 'DEATH':    'INDIVIDUAL',
+                 'MARRIAGE': 'FAMILY',
+                 'DIVORCE':  'FAMILY' }
+
+# The longest anyone is taken to live, when finding who was alive in a year
+
+MAX_LIFESPAN = 120
+
+# The longest fragments of text indexed for searching. Longer search terms
+# are found from the fragments they contain.
+
+SEARCH_GRAM_LENGTH = 3
+
+# Letters that sound alike, after Soundex, for finding names however
+# they're spelt. Vowels separate letters that sound alike, 'h' and 'w'
+# are ignored.
+
+PHONETIC_CODES = dict( ( letter, str( code ) )
+                       for code, letters in enumerate( [ 'aeiouy', 'bfpv', 'cgjkqsxz',
+                                                         'dt', 'l', 'mn', 'r' ] )
+                       for letter in letters )
+
+PHONETIC_KEY_LENGTH = 4
+
+# The number of letters a name can differ by and still be found
+
+NAME_EDIT_DISTANCE = 1
+
+
+# ------------------------------------------------------------------------
+def Journalled( method ):
+
+    # Record each call of a method that changes the tree, keeping the
+    # records it alters as they were so that it can be undone. Calls the
+    # method makes itself are part of the outer call.
+
+    def JournalledMethod( self, *args, **kwargs ):
+
+        flgOuter = ( self.journalDepth == 0 )
+
+        if ( flgOuter ):
+            self.recordsChanged = {}
+
+        self.journalDepth = self.journalDepth + 1
+
+        try:
+            for arg in args:
+
+                if ( hasattr( arg, 'attrib' ) ):
+                    self.MarkChanged( arg )
+
+            result = method( self, *args, **kwargs )
+
+        finally:
+            self.journalDepth = self.journalDepth - 1
+
+            if ( flgOuter ):
+                recordsChanged = self.recordsChanged
+                self.recordsChanged = None
+
+        if ( flgOuter ):
+            self.RecordChange( method.__name__, args, kwargs, recordsChanged )
+
+        return result
+
+    JournalledMethod.__name__ = method.__name__
+
+    return JournalledMethod
+
 
 # ========================================================================
 # Class to access family tree XML
@@ -35,270 +147,2579 @@ class FamilyTreeXML( object ):
     # --------------------------------------------------------------------
 
     def __init__( self,
-                  xmlFamilyTree ):
+                  xmlFamilyTree,
+                  flgDebug=False ):
 
         self.ftXML = xmlFamilyTree
+        self.flgDebug = flgDebug
+        self.flgCompact = False
+
+        # The journal the tree's changes are recorded in, if any
+
+        self.fileJournal = None
+        self.fileJournalled = None
+        self.journalDepth = 0
+
+        # and the offset in it of the end of the changes that have been
+        # saved, those after it are yet to be
+
+        self.journalSavedOffset = None
+
+        # The file the tree was read from and the offset in its journal of
+        # the end of the changes saved to it, see ReadFile()
+
+        self.journalRead = None
+
+        # The records altered by the change being made, as they were, and
+        # those altered by each change that can be undone or redone
+
+        self.recordsChanged = None
+        self.flgBatch = False
+
+        self.undoHistory = deque( maxlen=UNDO_HISTORY_DEPTH )
+        self.redoHistory = deque( maxlen=UNDO_HISTORY_DEPTH )
+        self.historyMode = None
+
+        # and the number of changes made to it, the number of them that
+        # have been saved and the IDs of the records each unsaved change
+        # may have altered, by the number of the latest change
+
+        self.nChanges = 0
+        self.nChangesSaved = 0
+        self.idsDirty = {}
+
+        # Names, labels and dates worked out from each individual, by ID,
+        # and the labels of dates
+
+        self.derivedByID = {}
+        self.dateLabels = {}
+
+        # The indexes of dates, search text and names, made when they're
+        # first asked for
+
+        self.ClearRecordIndexes()
+
+        self.IndexTree()
 
 
     # ----------------------------------------------------------------------
-    def GetIndividual( self, idIndi ):
+    def SetCompact( self, flgCompact ):
 
-        individuals = self.GetIndividuals()
+        # Read trees into FamilyTreeRecords, which take a fraction of the
+        # memory of elements but can't be edited
 
-        if ( individuals is None ):
-            return None
+        self.flgCompact = flgCompact
 
-        elif ( idIndi is None ):
-            return self.ftXML.find( 'INDIVIDUAL' )
 
-        else:
-            for individual in individuals:
+    # ----------------------------------------------------------------------
+    def ClearRecordIndexes( self ):
 
-                if ( individual.attrib['id'] == idIndi ):
-                    return individual
+        # The sorted index of dates, made when it's first asked for, and
+        # the ( ordinal, precision ) of each record's dated events
 
-        return None
+        self.dateIndex = None
+        self.dateOrdinals = None
+
+        # and of the text searched for individuals
+
+        self.textIndex = None
+        self.textGrams = None
+        self.textByID = None
+
+        # and of the names searched for by how they sound
+
+        self.nameIndex = None
+        self.namePhonetic = None
+        self.nameDeletions = None
+        self.namesByID = None
+
+        # and each record as ConvertElementToTuple() has it, by tag and ID,
+        # made when the tree is first saved in full
+
+        self.tuplesByID = None
 
 
     # ----------------------------------------------------------------------
-    def GetIndividualID( self, individual ):
+    def IndexTree( self ):
 
-        return individual.attrib['id']
+        # Map each individual and family ID onto its element so that
+        # lookups don't have to scan the whole tree
+
+        self.individualsByID = {}
+        self.familiesByID = {}
+
+        self.derivedByID = {}
+
+        self.ClearRecordIndexes()
+
+        # and the relationships between them, by ID, so that parents,
+        # spouses and children can be found without resolving the XML
+
+        self.familiesAsChild  = {}
+        self.familiesAsSpouse = {}
+
+        self.familyHusbands = {}
+        self.familyWives    = {}
+        self.familyChildren = {}
+
+        # and, for each family ID, the individuals that refer to it
+
+        self.familyReferences = {}
+
+        # The highest numbered ID of each type and the ranges of unused
+        # numbers below it, ( first, last ), from which new IDs are allocated
+
+        self.idHighWater = { 'I': 0, 'F': 0 }
+        self.idsFree     = { 'I': [], 'F': [] }
+
+        if ( self.ftXML is None ):
+            return
+
+        for individual in self.ftXML.findall( 'INDIVIDUAL' ):
+            self.IndexIndividual( individual )
+
+        for family in self.ftXML.findall( 'FAMILY' ):
+            self.IndexFamily( family )
 
 
     # ----------------------------------------------------------------------
-    def GetIndividuals( self ):
+    def IndexIndividual( self, individual ):
 
-        return self.ftXML.findall( 'INDIVIDUAL' )
+        idIndi = individual.attrib['id']
+
+        if ( idIndi in self.individualsByID ):
+            raise Exception( 'ERROR: Found multiple individuals with the same ID: {:s}'.format ( idIndi ) )
+
+        self.individualsByID[ idIndi ] = individual
+
+        self.MarkChanged( individual, True )
+
+        self.IndexIndividualRelations( individual )
+
+        self.ReserveID( 'I', idIndi )
+
+        self.UpdateRecordIndexes( 'INDIVIDUAL', idIndi )
 
 
     # ----------------------------------------------------------------------
-    def GetFamilies( self ):
+    def IndexFamily( self, family ):
 
-        return self.ftXML.findall( 'FAMILY' )
+        idFamily = family.attrib['id']
+
+        # Families with the same ID have always been read, and the first
+        # of them used
+
+        if ( idFamily in self.familiesByID ):
+            print 'WARNING: Ignoring all but the first family with the ID: {:s}'.format( idFamily )
+            return
+
+        self.familiesByID[ idFamily ] = family
+
+        self.MarkChanged( family, True )
+
+        self.IndexFamilyRelations( family )
+
+        self.ReserveID( 'F', idFamily )
+
+        self.UpdateRecordIndexes( 'FAMILY', idFamily )
 
 
     # ----------------------------------------------------------------------
-    def GetForename(  self, individual ):
+    def IndexIndividualRelations( self, individual ):
 
-        return individual.findtext('NAME/forename')
+        idIndi = individual.attrib['id']
+
+        self.UnindexFamilyReferences( idIndi )
+
+        self.familiesAsChild[ idIndi ] = \
+            [ ( eFamily.text or '' ) for eFamily in individual.findall('FAMILY_CHILD') ]
+
+        self.familiesAsSpouse[ idIndi ] = \
+            [ ( eFamily.text or '' ) for eFamily in individual.findall('FAMILY_SPOUSE') ]
+
+        for idFamily in self.familiesAsChild[ idIndi ] + self.familiesAsSpouse[ idIndi ]:
+
+            if ( not idFamily in self.familyReferences ):
+                self.familyReferences[ idFamily ] = set()
+
+            self.familyReferences[ idFamily ].add( idIndi )
 
 
     # ----------------------------------------------------------------------
-    def GetSurname(  self, individual ):
+    def UnindexFamilyReferences( self, idIndi ):
 
-        return individual.findtext('NAME/surname')
+        for idFamily in self.GetFamiliesAsChild( idIndi ) + self.GetFamiliesAsSpouse( idIndi ):
+
+            references = self.familyReferences.get( idFamily )
+
+            if ( not references is None ):
+
+                references.discard( idIndi )
+
+                if ( len( references ) == 0 ):
+                    del self.familyReferences[ idFamily ]
 
 
     # ----------------------------------------------------------------------
-    def GetAlias(  self, individual ):
+    def IndexFamilyRelations( self, family ):
 
-        return individual.findtext('ALIAS')
+        idFamily = family.attrib['id']
+
+        self.familyHusbands[ idFamily ] = family.findtext('HUSBAND')
+        self.familyWives[ idFamily ]    = family.findtext('WIFE')
+
+        self.familyChildren[ idFamily ] = \
+            [ ( eChild.text or '' ) for eChild in family.findall('CHILD') ]
 
 
     # ----------------------------------------------------------------------
-    def GetName(  self, individual ):
+    def UpdateIndividualRelations( self, individual ):
 
-        forename = self.GetForename( individual ) or ''
-        surname  = self.GetSurname( individual ) or ''
+        # Only individuals still in the tree are re-indexed
 
-        alias = self.GetAlias( individual )
+        if ( ( not individual is None ) and
+             ( self.individualsByID.get( individual.attrib['id'] ) is individual ) ):
 
-        if ( ( alias is None ) or ( len( alias ) == 0 ) ):
-            return ' '.join( [ forename, surname ] )
-        else:
-            return ' '.join( [ forename, "'" + alias + "'", surname ] )
+            self.IndexIndividualRelations( individual )
 
 
     # ----------------------------------------------------------------------
-    def GetNameAndID(  self, individual ):
+    def UpdateFamilyRelations( self, family ):
+
+        # Only families still in the tree are re-indexed
+
+        if ( ( not family is None ) and
+             ( self.familiesByID.get( family.attrib['id'] ) is family ) ):
+
+            self.IndexFamilyRelations( family )
+
+
+    # ----------------------------------------------------------------------
+    def UnindexIndividual( self, individual ):
 
         idIndi = individual.attrib['id']
 
-        name = self.GetName( individual )
+        self.MarkChanged( individual )
+
+        self.individualsByID.pop( idIndi, None )
+        self.derivedByID.pop( idIndi, None )
+
+        self.UpdateRecordIndexes( 'INDIVIDUAL', idIndi )
+
+        self.UnindexFamilyReferences( idIndi )
+
+        self.familiesAsChild.pop( idIndi, None )
+        self.familiesAsSpouse.pop( idIndi, None )
+
+        self.ReleaseID( 'I', idIndi )
 
-        return ''.join( [ idIndi + '\n', name ] )
 
     # ----------------------------------------------------------------------
-    def GetLabel(self, individual):
+    def UnindexFamily( self, family ):
 
-        label = individual.attrib['id']
+        idFamily = family.attrib['id']
 
-        forename = self.GetForename( individual )
-        surname  = self.GetSurname( individual )
+        self.MarkChanged( family )
 
-        if ( ( not forename is None ) and ( len( forename ) != 0 ) ):
-            label = forename + ' ' + label
+        self.familiesByID.pop( idFamily, None )
 
-        if ( ( not surname is None ) and ( len( surname ) != 0 ) ):
+        self.UpdateRecordIndexes( 'FAMILY', idFamily )
 
-            if ( ( not forename is None ) and ( len( forename ) != 0 ) ):
-                label = surname + ', ' + label
+        self.familyHusbands.pop( idFamily, None )
+        self.familyWives.pop( idFamily, None )
+        self.familyChildren.pop( idFamily, None )
+
+        self.ReleaseID( 'F', idFamily )
+
+
+    # ----------------------------------------------------------------------
+    def ReadStream( self, source, idsRetained=None, flgIndexOnly=False, fnIterParse=ET.iterparse,
+                    fileSnapshot=None ):
+
+        # Read an XML family tree file, indexing each record as soon as
+        # the parser has finished it instead of parsing the whole file
+        # and then walking it again.
+        #
+        # With flgIndexOnly only the relationship index is wanted: each
+        # record is cut back to its ID once indexed and dropped from the
+        # tree. Given idsRetained, a set of ( tag, id ) tuples, records
+        # not in it are discarded without being indexed. Either way peak
+        # memory no longer grows with the size of the file.
+        #
+        # If a snapshot file is given each top level element is written to
+        # it before it can be discarded. With SetCompact( True ) the records
+        # kept are FamilyTreeRecords rather than elements.
+
+        depth = 0
+        root = None
+
+        for event, element in fnIterParse( source, events=( 'start', 'end' ) ):
+
+            if ( event == 'start' ):
+
+                # The parser may already have added records to the root,
+                # so start from empty indexes and let each record's end
+                # event index it
+
+                if ( depth == 0 ):
+                    self.ftXML = None
+                    self.IndexTree()
+
+                    root = element
+
+                    if ( self.flgCompact ):
+                        self.ftXML = FamilyTreeRecord( root.tag, dict( root.attrib ), children=[] )
+                    else:
+                        self.ftXML = root
+
+                depth = depth + 1
+                continue
+
+            depth = depth - 1
+
+            if ( depth != 1 ):
+                continue
+
+            if ( not fileSnapshot is None ):
+                self.WriteSnapshotRecord( fileSnapshot, element )
+
+            flgRecord = ( element.tag in ( 'INDIVIDUAL', 'FAMILY' ) )
+
+            if ( flgRecord ):
+
+                idElement = element.attrib['id']
+
+                if ( ( not idsRetained is None ) and ( not ( element.tag, idElement ) in idsRetained ) ):
+                    element.clear()
+                    root.remove( element )
+                    continue
+
+            # Elements that are kept are swapped for compact records
+
+            if ( self.flgCompact and not ( flgRecord and flgIndexOnly ) ):
+
+                record = self.ConvertElementToRecord( element )
+
+                element.clear()
+                root.remove( element )
+
+                element = record
+                self.ftXML.append( element )
+
+            if ( not flgRecord ):
+                continue
+
+            if ( element.tag == 'INDIVIDUAL' ):
+                self.IndexIndividual( element )
             else:
-                label = surname + ' ' + label
+                self.IndexFamily( element )
 
-        return label
+            if ( flgIndexOnly ):
+                element.clear()
+                element.set( 'id', idElement )
+                root.remove( element )
+
+        return self.ftXML
 
 
     # ----------------------------------------------------------------------
-    def GetNameAsSingleString(self, individual):
+    def ReadFile( self, filename, idsRetained=None, flgIndexOnly=False, fnIterParse=ET.iterparse,
+                  fnElement=ET.Element, fnParse=None ):
 
-        label = ''
+        # Read a family tree file along with the changes saved to its
+        # journal since it was last written in full, so that every reader
+        # sees the tree as it was last saved
 
-        idIndividual = individual.attrib['id']
+        journal = self.ReadJournal( filename )
 
-        forename = self.GetForename( individual ).title()
-        surname  = self.GetSurname( individual ).title()
-        alias  = self.GetAlias( individual )
+        if ( journal is None ):
+            self.journalRead = ( filename, None )
+        else:
+            self.journalRead = ( filename, journal[1] )
 
-        if ( ( not surname is None ) and ( len( surname ) != 0 ) ):
+        if ( ( journal is None ) or ( len( journal[0] ) == 0 ) ):
+            return self.ReadFileWritten( filename, idsRetained, flgIndexOnly, fnIterParse, fnElement, fnParse )
 
-            label = surname
+        # The changes can only be made to the whole tree, as elements, so
+        # it is read that way and then cut back to what was asked for
 
-        if ( ( not forename is None ) and ( len( forename ) != 0 ) ):
+        flgCompact = self.flgCompact
+        self.flgCompact = False
 
-            label = label + forename
+        try:
+            self.ReadFileWritten( filename, None, False, fnIterParse, fnElement, fnParse )
 
-        if ( ( not alias is None ) and ( len( alias ) != 0 ) ):
+        finally:
+            self.flgCompact = flgCompact
 
-            label = label + alias
+        self.ReplayJournal( journal[0] )
 
-        if ( len( label ) == 0 ):
+        if ( ( self.flgCompact ) or ( not idsRetained is None ) or ( flgIndexOnly ) ):
+            self.ReadStream( self.ftXML, idsRetained, flgIndexOnly, self.IterParseTree )
 
-            label = idIndividual
+        return self.ftXML
+
+
+    # ----------------------------------------------------------------------
+    def IterParseTree( self, root, events=( 'start', 'end' ) ):
 
-        return label.replace( ' ', '' )
+        # The events iterparse would give parsing a tree that is already
+        # in memory, so that ReadStream() can cut it back
+
+        yield ( 'start', root )
+
+        for element in list( root ):
+
+            if ( isinstance( element.tag, basestring ) ):
+
+                yield ( 'start', element )
+                yield ( 'end', element )
+
+        yield ( 'end', root )
 
 
     # ----------------------------------------------------------------------
-    def GetFamily( self, individual, idFamilySpouse=None ):
+    def ReadFileWritten( self, filename, idsRetained=None, flgIndexOnly=False, fnIterParse=ET.iterparse,
+                         fnElement=ET.Element, fnParse=None ):
 
-        if ( not individual is None ):
-            
-            if ( idFamilySpouse is None ):
-                idFamily = individual.findtext('FAMILY_SPOUSE')
-                        
-                if ( not idFamily is None ):
+        # Read a family tree, as it was written, from its snapshot if that
+        # is up to date, otherwise stream the XML, writing a fresh snapshot
+        # beside it
 
-                    for family in self.GetFamilyWithID( idFamily ):
-                        return family
+        if ( self.ReadSnapshot( filename, idsRetained, flgIndexOnly, fnElement, fnParse ) ):
+            return self.ftXML
 
-            else:
-                families = individual.findall('FAMILY_SPOUSE')
-                for family in families:
-                    if ( family.text == idFamilySpouse ):
-                        return family
+        # Only part of the tree is kept, so it can't be snapshotted
+
+        if ( not idsRetained is None ):
+            return self.ReadStream( filename, idsRetained, flgIndexOnly, fnIterParse )
+
+        fileSnapshot = self.CreateSnapshot( filename )
+
+        try:
+            self.ReadStream( filename, None, flgIndexOnly, fnIterParse, fileSnapshot )
+
+        except:
+            exception = sys.exc_info()
+
+            if ( not fileSnapshot is None ):
+                self.DiscardSnapshot( fileSnapshot )
+
+            raise exception[0], exception[1], exception[2]
+
+        if ( not fileSnapshot is None ):
+            self.CloseSnapshot( filename, fileSnapshot )
+
+        return self.ftXML
 
-        return None
 
     # ----------------------------------------------------------------------
+    def GetSnapshotFilename( self, filename ):
+
+        return filename + '.snapshot'
 
 
     # ----------------------------------------------------------------------
-    def GetFamilyWithID( self, idFamily ):
+    def GetFileSignature( self, filename ):
+
+        # Size, modification time and SHA-1 of a file, hashed a block at
+        # a time so large trees aren't read into memory
+
+        status = os.stat( filename )
 
-        foundFamilies = []
+        sha1 = hashlib.sha1()
 
-        for family in self.GetFamilies():
+        with open( filename, 'rb' ) as fileIn:
 
-            if ( family.attrib['id'] == idFamily ):
-                foundFamilies.append( family )
+            for block in iter( lambda: fileIn.read( 1 << 20 ), b'' ):
+                sha1.update( block )
+
+        return ( status.st_size, status.st_mtime, sha1.hexdigest() )
 
-        return foundFamilies
 
     # ----------------------------------------------------------------------
+    def IsSignatureCurrent( self, filename, signature ):
+
+        # Size and time rule most changes out before the file is hashed
+
+        status = os.stat( filename )
+
+        return ( ( signature[0] == status.st_size ) and ( signature[1] == status.st_mtime ) and
+                 ( signature == self.GetFileSignature( filename ) ) )
 
 
     # ----------------------------------------------------------------------
-    def GetIndividualWithID( self, id ):
+    def ConvertElementToTuple( self, element ):
 
-        foundIndividuals = []
+        # Nested ( tag, attrib, text, tail, children ) tuples that marshal
+        # can store. Whitespace only text is dropped, as it is when the
+        # editor parses with remove_blank_text, so that either parser
+        # reads the same tree back.
 
-        for individual in self.GetIndividuals():
-            if ( individual.attrib['id'] == id ):
-                foundIndividuals.append( individual )
+        text = element.text
+        tail = element.tail
 
-        if ( len( foundIndividuals ) > 1 ):
-            raise Exception( 'ERROR: Found multiple individuals with the same ID: {:s}'.format ( id ) )
+        if ( ( not text is None ) and ( len( text.strip() ) == 0 ) ):
+            text = None
+
+        if ( ( not tail is None ) and ( len( tail.strip() ) == 0 ) ):
+            tail = None
+
+        attrib = None
+
+        if ( len( element.attrib ) > 0 ):
+            attrib = dict( element.attrib )
+
+        children = tuple( self.ConvertElementToTuple( child ) for child in element
+                          if isinstance( child.tag, basestring ) )
+
+        return ( element.tag, attrib, text, tail, children )
+
+
+    # ----------------------------------------------------------------------
+    def ConvertTupleToElement( self, record, fnElement=ET.Element ):
+
+        tag, attrib, text, tail, children = record
+
+        element = fnElement( tag, attrib or {} )
+
+        element.text = text
+        element.tail = tail
+
+        for child in children:
+            element.append( self.ConvertTupleToElement( child, fnElement ) )
+
+        return element
 
-        elif ( len( foundIndividuals ) == 1 ):
-            return foundIndividuals[0]
 
-        else:
-            return None
     # ----------------------------------------------------------------------
+    def InternText( self, text ):
+
+        # Tags and the same names, places and dates recur throughout a
+        # tree, so records share a single copy of each
+
+        if ( type( text ) is str ):
+            return intern( text )
+
+        return text
 
 
     # ----------------------------------------------------------------------
-    def GetChildWithID( self, idFamily, idIndividual ):
+    def ConvertTupleToRecord( self, record ):
 
-        children = []
+        tag, attrib, text, tail, children = record
 
-        for family in self.GetFamilyWithID( idFamily ):
+        if ( not attrib is None ):
+            attrib = dict( ( self.InternText( key ), value ) for key, value in attrib.iteritems() )
 
-            for child in family.findall( 'CHILD' ):
+        return FamilyTreeRecord( self.InternText( tag ), attrib,
+                                 self.InternText( text ), self.InternText( tail ),
+                                 tuple( self.ConvertTupleToRecord( child ) for child in children ) )
 
-                if ( idIndividual == child.text ):
 
-                    return child
+    # ----------------------------------------------------------------------
+    def ConvertElementToRecord( self, element ):
+
+        return self.ConvertTupleToRecord( self.ConvertElementToTuple( element ) )
+
+
+    # ----------------------------------------------------------------------
+    def ConvertTupleToTree( self, record, fnElement=ET.Element ):
+
+        # A record when reading compactly, otherwise an element
+
+        if ( self.flgCompact ):
+            return self.ConvertTupleToRecord( record )
+
+        return self.ConvertTupleToElement( record, fnElement )
+
+
+    # ----------------------------------------------------------------------
+    def ConvertRecordToElement( self, record, fnElement=ET.Element ):
+
+        # Back to an element, for instance to save a tree read compactly
+
+        element = fnElement( record.tag, dict( record.attrib ) )
+
+        element.text = record.text
+        element.tail = record.tail
+
+        for child in record:
+            element.append( self.ConvertRecordToElement( child, fnElement ) )
+
+        return element
+
+
+    # ----------------------------------------------------------------------
+    # A snapshot caches a parsed XML file and its relationship index. It
+    # is a sequence of marshalled objects: a header stamped with the XML
+    # file's signature, one tuple for each top level element ending with
+    # None, then the index, whose offset is given by the last 8 bytes so
+    # that it can be read without reading the records.
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def CreateSnapshot( self, filename ):
+
+        # Start writing a snapshot of an XML file into a temporary file,
+        # or return None if it can't be written. A snapshot is only a
+        # cache so failing to write one is not an error.
+
+        fileTemp = self.GetSnapshotFilename( filename ) + '.tmp'
+
+        try:
+            fileSnapshot = open( fileTemp, 'wb' )
+
+        except ( IOError, OSError ) as e:
+            print 'WARNING: Cannot write snapshot {:s}: {:s}'.format( fileTemp, str( e ) )
+            return None
+
+        try:
+            marshal.dump( { 'version':   SNAPSHOT_VERSION,
+                            'signature': self.GetFileSignature( filename ) }, fileSnapshot, 2 )
+
+        except ( IOError, OSError ) as e:
+            print 'WARNING: Cannot write snapshot {:s}: {:s}'.format( fileTemp, str( e ) )
+
+            self.DiscardSnapshot( fileSnapshot )
+            return None
+
+        return fileSnapshot
+
+
+    # ----------------------------------------------------------------------
+    def WriteSnapshotRecord( self, fileSnapshot, element ):
+
+        marshal.dump( self.ConvertElementToTuple( element ), fileSnapshot, 2 )
+
+
+    # ----------------------------------------------------------------------
+    def CloseSnapshot( self, filename, fileSnapshot ):
+
+        # Finish a snapshot with the root element and the index and move
+        # it into place
+
+        fileTemp = fileSnapshot.name
+
+        try:
+            marshal.dump( None, fileSnapshot, 2 )
+
+            offset = fileSnapshot.tell()
+
+            marshal.dump( ( ( self.ftXML.tag, dict( self.ftXML.attrib ) ),
+                            self.individualsByID.keys(),
+                            self.familiesByID.keys(),
+                            self.familiesAsChild,
+                            self.familiesAsSpouse,
+                            self.familyHusbands,
+                            self.familyWives,
+                            self.familyChildren,
+                            self.familyReferences,
+                            self.idHighWater,
+                            self.idsFree ), fileSnapshot, 2 )
+
+            fileSnapshot.write( struct.pack( '<Q', offset ) )
+            fileSnapshot.close()
+
+            os.rename( fileTemp, self.GetSnapshotFilename( filename ) )
+
+        except ( IOError, OSError, ValueError ) as e:
+            print 'WARNING: Cannot write snapshot {:s}: {:s}'.format( fileTemp, str( e ) )
+
+            self.DiscardSnapshot( fileSnapshot )
+
+
+    # ----------------------------------------------------------------------
+    def DiscardSnapshot( self, fileSnapshot ):
+
+        # Close and remove a snapshot that couldn't be finished
+
+        fileSnapshot.close()
+
+        try:
+            os.remove( fileSnapshot.name )
+
+        except OSError:
+            pass
+
+
+    # ----------------------------------------------------------------------
+    def OpenSnapshot( self, filename ):
+
+        # The snapshot of an XML file, open after its header, or None if
+        # there isn't one or the file has changed since it was written
+
+        fileSnapshot = self.GetSnapshotFilename( filename )
+
+        if ( not os.path.exists( fileSnapshot ) ):
+            return None
+
+        fileIn = open( fileSnapshot, 'rb' )
+
+        try:
+            header = marshal.load( fileIn )
+
+            if ( ( isinstance( header, dict ) ) and
+                 ( header.get( 'version' ) == SNAPSHOT_VERSION ) ):
+
+                if ( self.IsSignatureCurrent( filename, header[ 'signature' ] ) ):
+                    return fileIn
+
+        except ( EOFError, ValueError, TypeError, KeyError, IndexError ):
+            pass
+
+        fileIn.close()
+
+        return None
+
+
+    # ----------------------------------------------------------------------
+    def ReadSnapshot( self, filename, idsRetained=None, flgIndexOnly=False, fnElement=ET.Element,
+                      fnParse=None ):
+
+        # Rebuild the tree from an up to date snapshot, keeping records as
+        # ReadStream would. Returns False if the XML has to be read instead.
+        #
+        # When the whole tree is wanted and a parser such as lxml's, which
+        # is quicker than rebuilding the elements here, is given as
+        # fnParse then the XML is parsed with it and only the index is
+        # taken from the snapshot.
+
+        fileSnapshot = self.OpenSnapshot( filename )
+
+        if ( fileSnapshot is None ):
+            return False
+
+        try:
+            offsetRecords = fileSnapshot.tell()
+
+            fileSnapshot.seek( -8, os.SEEK_END )
+            fileSnapshot.seek( struct.unpack( '<Q', fileSnapshot.read( 8 ) )[0] )
+
+            ( ( tag, attrib ),
+              idsIndividuals,
+              idsFamilies,
+              familiesAsChild,
+              familiesAsSpouse,
+              familyHusbands,
+              familyWives,
+              familyChildren,
+              familyReferences,
+              idHighWater,
+              idsFree ) = marshal.load( fileSnapshot )
+
+            self.ftXML = None
+            self.IndexTree()
+
+            if ( self.flgCompact ):
+                self.ftXML = FamilyTreeRecord( tag, attrib, children=[] )
+            else:
+                self.ftXML = fnElement( tag, attrib )
+
+            # The index covers every record, so it is only used as it is
+            # when all of them are kept
+
+            if ( idsRetained is None ):
+
+                self.familiesAsChild  = familiesAsChild
+                self.familiesAsSpouse = familiesAsSpouse
+                self.familyHusbands   = familyHusbands
+                self.familyWives      = familyWives
+                self.familyChildren   = familyChildren
+                self.familyReferences = familyReferences
+                self.idHighWater      = idHighWater
+                self.idsFree          = idsFree
+
+            if ( flgIndexOnly and ( idsRetained is None ) ):
+
+                for idIndi in idsIndividuals:
+                    self.individualsByID[ idIndi ] = \
+                        self.ConvertTupleToTree( ( 'INDIVIDUAL', { 'id': idIndi }, None, None, () ), fnElement )
+
+                for idFamily in idsFamilies:
+                    self.familiesByID[ idFamily ] = \
+                        self.ConvertTupleToTree( ( 'FAMILY', { 'id': idFamily }, None, None, () ), fnElement )
+
+                return True
+
+            if ( ( not fnParse is None ) and ( idsRetained is None ) and ( not self.flgCompact ) ):
+
+                self.ftXML = fnParse( filename )
+
+                for element in self.ftXML:
+
+                    if ( element.tag == 'INDIVIDUAL' ):
+                        self.individualsByID[ element.attrib['id'] ] = element
+
+                    elif ( element.tag == 'FAMILY' ):
+                        self.familiesByID.setdefault( element.attrib['id'], element )
+
+                return True
+
+            fileSnapshot.seek( offsetRecords )
+
+            record = marshal.load( fileSnapshot )
+
+            while ( not record is None ):
+
+                self.ReadSnapshotRecord( record, idsRetained, flgIndexOnly, fnElement )
+
+                record = marshal.load( fileSnapshot )
+
+        finally:
+            fileSnapshot.close()
+
+        return True
+
+
+    # ----------------------------------------------------------------------
+    def ReadSnapshotRecord( self, record, idsRetained, flgIndexOnly, fnElement ):
+
+        tag, attrib = record[0], record[1]
+
+        if ( not tag in ( 'INDIVIDUAL', 'FAMILY' ) ):
+
+            if ( not flgIndexOnly ):
+                self.ftXML.append( self.ConvertTupleToTree( record, fnElement ) )
+
+            return
+
+        idElement = attrib[ 'id' ]
+
+        if ( ( not idsRetained is None ) and ( not ( tag, idElement ) in idsRetained ) ):
+            return
+
+        if ( flgIndexOnly ):
+            element = self.ConvertTupleToTree( ( tag, { 'id': idElement }, None, None, () ), fnElement )
+        else:
+            element = self.ConvertTupleToTree( record, fnElement )
+            self.ftXML.append( element )
+
+        if ( not idsRetained is None ):
+
+            if ( tag == 'INDIVIDUAL' ):
+                self.IndexIndividual( element )
+            else:
+                self.IndexFamily( element )
+
+        elif ( tag == 'INDIVIDUAL' ):
+            self.individualsByID[ idElement ] = element
+
+        else:
+            self.familiesByID.setdefault( idElement, element )
+
+
+    # ----------------------------------------------------------------------
+    def MarkChanged( self, element, flgCreated=False ):
+
+        # Every record a change looks up, as well as those it creates or
+        # deletes, may be altered by it, so keep each as it is first seen
+
+        if ( ( self.recordsChanged is None ) or ( element is None ) ):
+            return
+
+        idElement = element.attrib['id']
+
+        if ( not idElement in self.recordsChanged ):
+
+            if ( flgCreated ):
+                self.recordsChanged[ idElement ] = ( element.tag, None )
+            else:
+                self.recordsChanged[ idElement ] = ( element.tag, self.ConvertElementToTuple( element ) )
+
+
+    # ----------------------------------------------------------------------
+    def GetRecordState( self, tag, idElement ):
+
+        # A record as ConvertElementToTuple() has it, or None if there is
+        # no such record
+
+        if ( tag == 'INDIVIDUAL' ):
+            element = self.individualsByID.get( idElement )
+        else:
+            element = self.familiesByID.get( idElement )
+
+        if ( element is None ):
+            return None
+
+        return self.ConvertElementToTuple( element )
+
+
+    # ----------------------------------------------------------------------
+    def RecordChange( self, name, args, kwargs, recordsChanged ):
+
+        # Count, journal and keep the undo history of a change, unless it
+        # left every record as it was. Without a method name the change
+        # is journalled as the records it left.
+
+        records = []
+        recordsNow = []
+
+        for idElement, ( tag, state ) in recordsChanged.items():
+
+            stateNow = self.GetRecordState( tag, idElement )
+
+            if ( state != stateNow ):
+
+                records.append( ( tag, idElement, state ) )
+                recordsNow.append( ( tag, idElement, stateNow ) )
+
+        if ( len( records ) == 0 ):
+            return
+
+        if ( name is None ):
+            name, args, kwargs = 'RestoreRecords', ( recordsNow, ), {}
+
+        self.nChanges = self.nChanges + 1
+
+        for tag, idElement, state in records:
+
+            self.idsDirty[ idElement ] = self.nChanges
+            self.derivedByID.pop( idElement, None )
+
+            self.UpdateRecordIndexes( tag, idElement, True )
+
+        if ( not self.tuplesByID is None ):
+
+            for tag, idElement, stateNow in recordsNow:
+
+                if ( stateNow is None ):
+                    self.tuplesByID.pop( ( tag, idElement ), None )
+                else:
+                    self.tuplesByID[ ( tag, idElement ) ] = stateNow
+
+        if ( not self.fileJournal is None ):
+            self.WriteJournalEntry( name, args, kwargs )
+
+        if ( self.historyMode == 'undo' ):
+            self.redoHistory.append( records )
+
+        else:
+            self.undoHistory.append( records )
+
+            if ( self.historyMode is None ):
+                self.redoHistory.clear()
+
+
+    # ----------------------------------------------------------------------
+    @contextlib.contextmanager
+    def Batch( self ):
+
+        # Make the changes in a with block a single change, which is
+        # counted, journalled and undone as one. If the block raises an
+        # exception every record it altered is put back as it was.
+
+        if ( self.journalDepth > 0 ):
+            yield
+            return
+
+        self.journalDepth = 1
+        self.recordsChanged = {}
+        self.flgBatch = True
+
+        try:
+            yield
+
+        except:
+            exception = sys.exc_info()
+
+            recordsChanged = self.recordsChanged
+            self.recordsChanged = None
+
+            try:
+                for idElement, ( tag, state ) in recordsChanged.items():
+
+                    self.RestoreRecord( tag, idElement, state )
+                    self.derivedByID.pop( idElement, None )
+
+                    self.UpdateRecordIndexes( tag, idElement, True )
+
+            finally:
+                self.journalDepth = 0
+                self.flgBatch = False
+
+            raise exception[0], exception[1], exception[2]
+
+        recordsChanged = self.recordsChanged
+
+        self.journalDepth = 0
+        self.recordsChanged = None
+        self.flgBatch = False
+
+        self.RecordChange( None, None, None, recordsChanged )
+
+
+    # ----------------------------------------------------------------------
+    def IsBatching( self ):
+
+        return self.flgBatch
+
+
+    # ----------------------------------------------------------------------
+    @Journalled
+    def RestoreRecords( self, records ):
+
+        # Put each of a list of ( tag, ID, state ) records back as it was
+
+        for tag, idElement, state in records:
+            self.RestoreRecord( tag, idElement, state )
+
+
+    # ----------------------------------------------------------------------
+    def RestoreRecord( self, tag, idElement, state ):
+
+        if ( tag == 'INDIVIDUAL' ):
+            element = self.individualsByID.get( idElement )
+        else:
+            element = self.familiesByID.get( idElement )
+
+        self.MarkChanged( element )
+
+        # The record didn't exist
+
+        if ( state is None ):
+
+            if ( element is None ):
+                return
+
+            if ( tag == 'INDIVIDUAL' ):
+                self.ftXML.remove( element )
+                self.UnindexIndividual( element )
+            else:
+                self.RemoveFamilyElement( element )
+
+            return
+
+        # The record has since been deleted
+
+        if ( element is None ):
+
+            element = self.ConvertTupleToElement( state, self.ftXML.makeelement )
+            self.ftXML.append( element )
+
+            if ( tag == 'INDIVIDUAL' ):
+                self.IndexIndividual( element )
+            else:
+                self.IndexFamily( element )
+
+            return
+
+        # Refill the element rather than replace it, so that it keeps its
+        # place in the tree
+
+        tag, attrib, text, tail, children = state
+
+        tail = element.tail
+
+        element.clear()
+
+        for key, value in ( attrib or {} ).items():
+            element.set( key, value )
+
+        element.text = text
+        element.tail = tail
+
+        for child in children:
+            element.append( self.ConvertTupleToElement( child, element.makeelement ) )
+
+        if ( tag == 'INDIVIDUAL' ):
+            self.IndexIndividualRelations( element )
+        else:
+            self.IndexFamilyRelations( element )
+
+
+    # ----------------------------------------------------------------------
+    def Undo( self ):
+
+        # Undo the last change, returning False if there isn't one
+
+        if ( len( self.undoHistory ) == 0 ):
+            return False
+
+        self.historyMode = 'undo'
+
+        try:
+            self.RestoreRecords( self.undoHistory.pop() )
+        finally:
+            self.historyMode = None
+
+        return True
+
+
+    # ----------------------------------------------------------------------
+    def Redo( self ):
+
+        # Redo the last change undone, returning False if there isn't one
+
+        if ( len( self.redoHistory ) == 0 ):
+            return False
+
+        self.historyMode = 'redo'
+
+        try:
+            self.RestoreRecords( self.redoHistory.pop() )
+        finally:
+            self.historyMode = None
+
+        return True
+
+
+    # ----------------------------------------------------------------------
+    def SetUndoDepth( self, depth ):
+
+        # Keep at most depth changes to undo and redo
+
+        self.undoHistory = deque( self.undoHistory, depth )
+        self.redoHistory = deque( self.redoHistory, depth )
+
+
+    # ----------------------------------------------------------------------
+    def MarkSaved( self, nChanges=None ):
+
+        # Note that the first nChanges changes, by default all of them,
+        # have been saved
+
+        if ( nChanges is None ):
+            nChanges = self.nChanges
+
+        self.nChangesSaved = max( self.nChangesSaved, nChanges )
+
+        for idElement, nChange in self.idsDirty.items():
+
+            if ( nChange <= self.nChangesSaved ):
+                del self.idsDirty[ idElement ]
+
+
+    # ----------------------------------------------------------------------
+    def IsDirty( self ):
+
+        return ( self.nChanges > self.nChangesSaved )
+
+
+    # ----------------------------------------------------------------------
+    def GetDirtyIDs( self ):
+
+        return set( self.idsDirty )
+
+
+    # ----------------------------------------------------------------------
+    def GetTreeTuples( self ):
+
+        # The tree as ( ( tag, attrib ), [ tuple of each top level element ] ),
+        # which doesn't change as the tree does and so can be written out
+        # on another thread. The records are converted the first time and
+        # then as each change is recorded, so after that only the likes of
+        # the HEADER are converted again.
+
+        if ( self.tuplesByID is None ):
+            self.tuplesByID = {}
+
+        records = []
+
+        for element in self.ftXML:
+
+            if ( not isinstance( element.tag, basestring ) ):
+                continue
+
+            if ( not element.tag in ( 'INDIVIDUAL', 'FAMILY' ) ):
+                records.append( self.ConvertElementToTuple( element ) )
+                continue
+
+            key = ( element.tag, element.attrib['id'] )
+
+            if ( not key in self.tuplesByID ):
+                self.tuplesByID[ key ] = self.ConvertElementToTuple( element )
+
+            records.append( self.tuplesByID[ key ] )
+
+        return ( ( self.ftXML.tag, dict( self.ftXML.attrib ) ), records )
+
+
+    # ----------------------------------------------------------------------
+    def GetJournalFilename( self, filename ):
+
+        return filename + '.journal'
+
+
+    # ----------------------------------------------------------------------
+    def GetPendingJournalFilename( self, filename ):
+
+        return filename + '.journal.pending'
+
+
+    # ----------------------------------------------------------------------
+    # A journal records the changes made to a tree since it was last saved
+    # in full. It is a sequence of marshalled objects: a header stamped
+    # with the signature of the file the tree was saved to, then
+    # ( name, args, kwargs ) for each change. Saving the tree to that file
+    # again only adds ( None, (), {} ), which marks the changes before it
+    # as saved; any after the last mark were never saved and are dropped.
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def CreateJournal( self, filename ):
+
+        # Start journalling changes to the tree as saved in filename, which
+        # must be up to date, discarding any earlier journal
+
+        self.CloseJournal()
+
+        fileJournal = open( self.GetJournalFilename( filename ), 'wb' )
+
+        marshal.dump( { 'version':   JOURNAL_VERSION,
+                        'signature': self.GetFileSignature( filename ) }, fileJournal, 2 )
+
+        self.fileJournal = fileJournal
+        self.fileJournalled = filename
+
+        self.FlushJournal()
+
+        self.journalSavedOffset = fileJournal.tell()
+
+
+    # ----------------------------------------------------------------------
+    def SaveJournal( self ):
+
+        # Save the tree to the journalled file by marking the changes
+        # journalled so far as saved
+
+        if ( self.fileJournal is None ):
+            return
+
+        if ( self.fileJournal.tell() != self.journalSavedOffset ):
+            marshal.dump( ( None, (), {} ), self.fileJournal, 2 )
+
+        self.FlushJournal()
+
+        self.journalSavedOffset = self.fileJournal.tell()
+
+
+    # ----------------------------------------------------------------------
+    def MoveJournal( self, filename, offset, fileSaved=None, signature=None ):
+
+        # Start journalling changes to filename, which has just been saved
+        # with the tree as it was when the current journal was offset
+        # long, carrying over the changes made since.
+        #
+        # A tree saved to another file, fileSaved, whose signature may
+        # already be known, is moved into place here. Its journal is
+        # written beforehand, pending beside the current one, so that
+        # whichever of the two files is found after a crash there is a
+        # journal for it; see RecoverJournal().
+
+        changes = ''
+        offsetSaved = 0
+
+        if ( ( not self.fileJournal is None ) and ( not offset is None ) ):
+
+            self.FlushJournal()
+
+            with open( self.fileJournal.name, 'rb' ) as fileIn:
+
+                fileIn.seek( offset )
+                changes = fileIn.read()
+
+            # Changes carried over may have been saved to the journal
+            # while the file was written
+
+            offsetSaved = max( 0, self.journalSavedOffset - offset )
+
+        if ( fileSaved is None ):
+            fileSaved = filename
+
+        if ( signature is None ):
+            signature = self.GetFileSignature( fileSaved )
+
+        filePending = self.GetPendingJournalFilename( filename )
+
+        with open( filePending, 'wb' ) as fileOut:
+
+            marshal.dump( { 'version':   JOURNAL_VERSION,
+                            'signature': signature }, fileOut, 2 )
+
+            offsetSaved = offsetSaved + fileOut.tell()
+
+            fileOut.write( changes )
+
+            fileOut.flush()
+            os.fsync( fileOut.fileno() )
+
+        if ( fileSaved != filename ):
+            os.rename( fileSaved, filename )
+
+        # Saved to another file, the changes since the last save aren't
+        # part of the file journalled until now
+
+        if ( ( self.fileJournal is None ) or ( self.IsJournalling( filename ) ) ):
+            self.CloseJournal()
+        else:
+            self.DiscardJournal()
+
+        os.rename( filePending, self.GetJournalFilename( filename ) )
+
+        self.fileJournal = open( self.GetJournalFilename( filename ), 'r+b' )
+        self.fileJournal.seek( 0, os.SEEK_END )
+
+        self.fileJournalled = filename
+        self.journalSavedOffset = offsetSaved
+
+
+    # ----------------------------------------------------------------------
+    def RecoverJournal( self, filename ):
+
+        # A save that stopped after moving the new file into place, but
+        # before its journal, leaves that journal pending. It replaces the
+        # current journal if it is for filename as it is now, otherwise it
+        # is from a save that never finished and is dropped.
+
+        filePending = self.GetPendingJournalFilename( filename )
+
+        if ( not os.path.exists( filePending ) ):
+            return
+
+        with open( filePending, 'rb' ) as fileIn:
+
+            try:
+                header = marshal.load( fileIn )
+
+            except ( EOFError, ValueError, TypeError ):
+                header = None
+
+        if ( ( isinstance( header, dict ) ) and
+             ( header.get( 'version' ) == JOURNAL_VERSION ) and
+             ( self.IsSignatureCurrent( filename, header[ 'signature' ] ) ) ):
+
+            os.rename( filePending, self.GetJournalFilename( filename ) )
+
+        else:
+            os.remove( filePending )
+
+
+    # ----------------------------------------------------------------------
+    def GetJournalOffset( self ):
+
+        if ( self.fileJournal is None ):
+            return None
+
+        return self.fileJournal.tell()
+
+
+    # ----------------------------------------------------------------------
+    def OpenJournal( self, filename ):
+
+        # Carry on journalling changes to the tree just read from filename
+        # by ReadFile(), which has made the changes saved to its journal.
+        # Changes that were never saved are dropped.
+
+        if ( ( self.journalRead is None ) or ( self.journalRead[0] != filename ) ):
+            raise Exception( 'ERROR: The tree was not read from: {:s}'.format( filename ) )
+
+        offset = self.journalRead[1]
+
+        self.CloseJournal()
+
+        if ( offset is None ):
+            self.CreateJournal( filename )
+            return
+
+        # Drop the changes made after the last save, including one that
+        # was only partly written when the editor stopped
+
+        fileJournal = open( self.GetJournalFilename( filename ), 'r+b' )
+
+        fileJournal.seek( offset )
+        fileJournal.truncate()
+
+        self.fileJournal = fileJournal
+        self.fileJournalled = filename
+        self.journalSavedOffset = offset
+
+
+    # ----------------------------------------------------------------------
+    def ReadJournal( self, filename ):
+
+        # The changes saved to the journal of filename, as
+        # ( [ ( name, args, kwargs ) ], offset of the end of the last ),
+        # or None if there is no journal for the file as it is
+
+        self.RecoverJournal( filename )
+
+        fileJournal = self.GetJournalFilename( filename )
+
+        if ( not os.path.exists( fileJournal ) ):
+            return None
+
+        with open( fileJournal, 'rb' ) as fileIn:
+
+            try:
+                header = marshal.load( fileIn )
+
+            except ( EOFError, ValueError, TypeError ):
+                return None
+
+            if ( ( not isinstance( header, dict ) ) or
+                 ( header.get( 'version' ) != JOURNAL_VERSION ) or
+                 ( not self.IsSignatureCurrent( filename, header[ 'signature' ] ) ) ):
+
+                print 'WARNING: Ignoring journal {:s} as {:s} has changed since it was written'.format(
+                    fileJournal, filename )
+                return None
+
+            offset = fileIn.tell()
+
+            changesSaved = []
+            changes = []
+
+            while ( True ):
+
+                try:
+                    name, args, kwargs = marshal.load( fileIn )
+
+                except ( EOFError, ValueError, TypeError ):
+                    break
+
+                if ( not name is None ):
+                    changes.append( ( name, args, kwargs ) )
+                    continue
+
+                # The changes up to here were saved
+
+                changesSaved.extend( changes )
+                changes = []
+
+                offset = fileIn.tell()
+
+        return ( changesSaved, offset )
+
+
+    # ----------------------------------------------------------------------
+    def ReplayJournal( self, changes ):
+
+        # Make the changes ReadJournal() found to the tree. They are part
+        # of the tree as it was saved so they aren't unsaved or undone.
+
+        for name, args, kwargs in changes:
+
+            args = [ self.ConvertJournalArgument( arg ) for arg in args ]
+
+            getattr( self, name )( *args, **kwargs )
+
+        self.MarkSaved()
+
+        self.undoHistory.clear()
+        self.redoHistory.clear()
+
+
+    # ----------------------------------------------------------------------
+    def WriteJournalEntry( self, name, args, kwargs ):
+
+        # Elements are journalled as their tags and IDs
+
+        args = tuple( ( arg.tag, arg.attrib['id'] ) if ( hasattr( arg, 'attrib' ) ) else arg
+                      for arg in args )
+
+        marshal.dump( ( name, args, kwargs ), self.fileJournal, 2 )
+
+
+    # ----------------------------------------------------------------------
+    def ConvertJournalArgument( self, arg ):
+
+        if ( not isinstance( arg, tuple ) ):
+            return arg
+
+        tag, idElement = arg
+
+        if ( tag == 'INDIVIDUAL' ):
+            return self.GetIndividualWithID( idElement )
+
+        return self.familiesByID.get( idElement )
+
+
+    # ----------------------------------------------------------------------
+    def FlushJournal( self ):
+
+        # Make sure the journalled changes are on disk
+
+        if ( not self.fileJournal is None ):
+
+            self.fileJournal.flush()
+            os.fsync( self.fileJournal.fileno() )
+
+
+    # ----------------------------------------------------------------------
+    def CloseJournal( self ):
+
+        if ( not self.fileJournal is None ):
+
+            self.FlushJournal()
+            self.fileJournal.close()
+
+        self.fileJournal = None
+        self.fileJournalled = None
+        self.journalSavedOffset = None
+
+
+    # ----------------------------------------------------------------------
+    def DiscardJournal( self ):
+
+        # Stop journalling, throwing away the changes journalled since the
+        # tree was last saved, for instance when the editor quits without
+        # saving them
+
+        if ( not self.fileJournal is None ):
+
+            self.fileJournal.seek( self.journalSavedOffset )
+            self.fileJournal.truncate()
+
+        self.CloseJournal()
+
+
+    # ----------------------------------------------------------------------
+    def IsJournalling( self, filename ):
+
+        return ( ( not self.fileJournal is None ) and
+                 ( os.path.abspath( filename ) == os.path.abspath( self.fileJournalled ) ) )
+
+
+    # ----------------------------------------------------------------------
+    def IsJournalDueCompaction( self ):
+
+        # Once the journal is a sizeable fraction of the XML it is quicker
+        # to read the XML saved in full
+
+        if ( self.fileJournal is None ):
+            return False
+
+        return ( self.fileJournal.tell() > JOURNAL_COMPACT_FRACTION * os.path.getsize( self.fileJournalled ) )
+
+
+    # ----------------------------------------------------------------------
+    def GetIDNumber( self, prefix, idElement ):
+
+        match = re.match( prefix + r'(\d+)$', idElement )
+
+        if ( match is None ):
+            return None
+
+        return int( match.group( 1 ) )
+
+
+    # ----------------------------------------------------------------------
+    def ReserveID( self, prefix, idElement ):
+
+        number = self.GetIDNumber( prefix, idElement )
+
+        if ( number is None ):
+            return
+
+        highWater = self.idHighWater[ prefix ]
+
+        # Any numbers skipped over become free, as one range so a sparse ID
+        # costs no more than any other. Numbers that turn out to be in use
+        # are discarded when they are allocated.
+
+        if ( number > highWater ):
+
+            if ( number > highWater + 1 ):
+                heapq.heappush( self.idsFree[ prefix ], ( highWater + 1, number - 1 ) )
+
+            self.idHighWater[ prefix ] = number
+
+
+    # ----------------------------------------------------------------------
+    def ReleaseID( self, prefix, idElement ):
+
+        number = self.GetIDNumber( prefix, idElement )
+
+        if ( ( not number is None ) and ( number <= self.idHighWater[ prefix ] ) ):
+            heapq.heappush( self.idsFree[ prefix ], ( number, number ) )
+
+
+    # ----------------------------------------------------------------------
+    def AllocateID( self, prefix, idsInUse ):
+
+        # Reuse the lowest free number, otherwise extend the high water mark
+
+        idsFree = self.idsFree[ prefix ]
+
+        while ( len( idsFree ) > 0 ):
+
+            first, last = heapq.heappop( idsFree )
+
+            # Merge the ranges that overlap or adjoin it, such as the
+            # numbers of records deleted one after another, into one
+
+            while ( ( len( idsFree ) > 0 ) and ( idsFree[0][0] <= last + 1 ) ):
+                last = max( last, heapq.heappop( idsFree )[1] )
+
+            if ( first < last ):
+                heapq.heappush( idsFree, ( first + 1, last ) )
+
+            idElement = '{:s}{:03d}'.format( prefix, first )
+
+            if ( not idElement in idsInUse ):
+                return idElement
+
+        idElement = None
+
+        while ( ( idElement is None ) or ( idElement in idsInUse ) ):
+
+            self.idHighWater[ prefix ] = self.idHighWater[ prefix ] + 1
+            idElement = '{:s}{:03d}'.format( prefix, self.idHighWater[ prefix ] )
+
+        return idElement
+
+
+    # ----------------------------------------------------------------------
+    def GetFamiliesAsChild( self, idIndividual ):
+
+        return self.familiesAsChild.get( idIndividual, [] )
+
+
+    # ----------------------------------------------------------------------
+    def GetFamiliesAsSpouse( self, idIndividual ):
+
+        return self.familiesAsSpouse.get( idIndividual, [] )
+
+
+    # ----------------------------------------------------------------------
+    def GetHusbandID( self, idFamily ):
+
+        return self.familyHusbands.get( idFamily )
+
+
+    # ----------------------------------------------------------------------
+    def GetWifeID( self, idFamily ):
+
+        return self.familyWives.get( idFamily )
+
+
+    # ----------------------------------------------------------------------
+    def GetChildIDs( self, idFamily ):
+
+        return self.familyChildren.get( idFamily, [] )
+
+
+    # ----------------------------------------------------------------------
+    def GetFamilyReferences( self, idFamily ):
+
+        return self.familyReferences.get( idFamily, set() )
+
+
+    # ----------------------------------------------------------------------
+    def GetFirstID( self, ids ):
+
+        if ( len( ids ) == 0 ):
+            return None
+
+        return ids[0]
+
+
+    # ----------------------------------------------------------------------
+    def RemoveFamilyElement( self, family ):
+
+        self.ftXML.remove( family )
+        self.UnindexFamily( family )
+
+
+    # ----------------------------------------------------------------------
+    def RemoveFamilyIfEmpty( self, family ):
+
+        # If the family has no spouses or children then delete it
+
+        idFamily = family.attrib['id']
+
+        if ( ( self.GetWifeID( idFamily ) is None ) and
+             ( self.GetHusbandID( idFamily ) is None ) and
+             ( len( self.GetChildIDs( idFamily ) ) == 0 ) ):
+
+            self.RemoveFamilyElement( family )
+
+
+    # ----------------------------------------------------------------------
+    def GetIndividual( self, idIndi ):
+
+        if ( idIndi is None ):
+            individual = self.ftXML.find( 'INDIVIDUAL' )
+        else:
+            individual = self.individualsByID.get( idIndi )
+
+        self.MarkChanged( individual )
+
+        return individual
+
+
+    # ----------------------------------------------------------------------
+    def GetIndividualID( self, individual ):
+
+        return individual.attrib['id']
+
+
+    # ----------------------------------------------------------------------
+    def GetIndividuals( self ):
+
+        return self.ftXML.findall( 'INDIVIDUAL' )
+
+
+    # ----------------------------------------------------------------------
+    def GetFamilies( self ):
+
+        return self.ftXML.findall( 'FAMILY' )
+
+
+    # ----------------------------------------------------------------------
+    def IsIndividualKept( self, individual ):
+
+        # Every individual in the tree is held in memory
+
+        return True
+
+
+    # ----------------------------------------------------------------------
+    def GetDerivedFields( self, individual ):
+
+        # The names, labels and dates already worked out for an individual.
+        # They are forgotten when the individual is changed, and not kept
+        # at all while a change is being made or for a passing copy of an
+        # individual the tree doesn't hold.
+
+        if ( ( self.journalDepth > 0 ) or ( not self.IsIndividualKept( individual ) ) ):
+            return {}
+
+        idIndi = individual.attrib['id']
+
+        derived = self.derivedByID.get( idIndi )
+
+        if ( ( derived is None ) or ( not derived[0] is individual ) ):
+
+            derived = ( individual, {} )
+            self.derivedByID[ idIndi ] = derived
+
+        return derived[1]
+
+
+    # ----------------------------------------------------------------------
+    def GetForename(  self, individual ):
+
+        return individual.findtext('NAME/forename')
+
+
+    # ----------------------------------------------------------------------
+    def GetSurname(  self, individual ):
+
+        return individual.findtext('NAME/surname')
+
+
+    # ----------------------------------------------------------------------
+    def GetAlias(  self, individual ):
+
+        return individual.findtext('ALIAS')
+
+
+    # ----------------------------------------------------------------------
+    def GetName(  self, individual ):
+
+        derived = self.GetDerivedFields( individual )
+
+        if ( 'name' in derived ):
+            return derived[ 'name' ]
+
+        forename = self.GetForename( individual ) or ''
+        surname  = self.GetSurname( individual ) or ''
+
+        alias = self.GetAlias( individual )
+
+        if ( ( alias is None ) or ( len( alias ) == 0 ) ):
+            name = ' '.join( [ forename, surname ] )
+        else:
+            name = ' '.join( [ forename, "'" + alias + "'", surname ] )
+
+        derived[ 'name' ] = name
+
+        return name
+
+
+    # ----------------------------------------------------------------------
+    def GetNameAndID(  self, individual ):
+
+        derived = self.GetDerivedFields( individual )
+
+        if ( 'nameAndID' in derived ):
+            return derived[ 'nameAndID' ]
+
+        idIndi = individual.attrib['id']
+
+        name = self.GetName( individual )
+
+        derived[ 'nameAndID' ] = ''.join( [ idIndi + '\n', name ] )
+
+        return derived[ 'nameAndID' ]
+
+    # ----------------------------------------------------------------------
+    def GetLabel(self, individual):
+
+        derived = self.GetDerivedFields( individual )
+
+        if ( 'label' in derived ):
+            return derived[ 'label' ]
+
+        label = individual.attrib['id']
+
+        forename = self.GetForename( individual )
+        surname  = self.GetSurname( individual )
+
+        if ( ( not forename is None ) and ( len( forename ) != 0 ) ):
+            label = forename + ' ' + label
+
+        if ( ( not surname is None ) and ( len( surname ) != 0 ) ):
+
+            if ( ( not forename is None ) and ( len( forename ) != 0 ) ):
+                label = surname + ', ' + label
+            else:
+                label = surname + ' ' + label
+
+        derived[ 'label' ] = label
+
+        return label
+
+
+    # ----------------------------------------------------------------------
+    def GetNameAsSingleString(self, individual):
+
+        derived = self.GetDerivedFields( individual )
+
+        if ( 'nameAsSingleString' in derived ):
+            return derived[ 'nameAsSingleString' ]
+
+        label = ''
+
+        idIndividual = individual.attrib['id']
+
+        forename = self.GetForename( individual ).title()
+        surname  = self.GetSurname( individual ).title()
+        alias  = self.GetAlias( individual )
+
+        if ( ( not surname is None ) and ( len( surname ) != 0 ) ):
+
+            label = surname
+
+        if ( ( not forename is None ) and ( len( forename ) != 0 ) ):
+
+            label = label + forename
+
+        if ( ( not alias is None ) and ( len( alias ) != 0 ) ):
+
+            label = label + alias
+
+        if ( len( label ) == 0 ):
+
+            label = idIndividual
+
+        derived[ 'nameAsSingleString' ] = label.replace( ' ', '' )
+
+        return derived[ 'nameAsSingleString' ]
+
+
+    # ----------------------------------------------------------------------
+    def GetFamily( self, individual, idFamilySpouse=None ):
+
+        if ( not individual is None ):
+            
+            if ( idFamilySpouse is None ):
+                idFamily = individual.findtext('FAMILY_SPOUSE')
+                        
+                if ( not idFamily is None ):
+
+                    for family in self.GetFamilyWithID( idFamily ):
+                        return family
+
+            else:
+                families = individual.findall('FAMILY_SPOUSE')
+                for family in families:
+                    if ( family.text == idFamilySpouse ):
+                        return family
+
+        return None
+
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def GetFamilyWithID( self, idFamily ):
+
+        family = self.familiesByID.get( idFamily )
+
+        if ( family is None ):
+            return []
+
+        self.MarkChanged( family )
+
+        return [ family ]
+
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def GetIndividualWithID( self, id ):
+
+        individual = self.individualsByID.get( id )
+
+        self.MarkChanged( individual )
+
+        return individual
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def GetChildWithID( self, idFamily, idIndividual ):
+
+        children = []
+
+        for family in self.GetFamilyWithID( idFamily ):
+
+            for child in family.findall( 'CHILD' ):
+
+                if ( idIndividual == child.text ):
+
+                    return child
+
+        return None
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def ConvertDateTupleToLabel( self, date ):
+
+        label = None
+
+        if ( date is None ):
+            return None
+
+        # The same dates recur throughout a tree
+
+        if ( date in self.dateLabels ):
+            return self.dateLabels[ date ]
+
+        day, month, year = date
+
+        if ( not day is None ):
+            label = '{:2s}'.format( day )
+
+        if ( not month is None ):
+            if ( not label is None ):
+                label = label + ' {:3s}'.format( month )
+            else:
+                label = month
+
+        if ( not year is None ):
+            if ( not label is None ):
+                label = label + ' {:4s}'.format( year )
+            else:
+                label = year
+
+        if ( not label is None ):
+            label = label.strip()
+
+        self.dateLabels[ date ] = label
+
+        return label
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def GetDate( self, element ):
+
+        dateText = None
+
+        day = None
+        month = None
+        year = None
+
+        if ( element is not None ):
+            date = element.find( 'DATE' )
+
+            if ( date is not None ):
+
+                day   = date.findtext('day')
+                month = date.findtext('month')
+                year  = date.findtext('year')
+
+        return ( day, month, year )
+
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def GetBirthDate( self, individual ):
+
+        derived = self.GetDerivedFields( individual )
+
+        if ( not 'birthDate' in derived ):
+            derived[ 'birthDate' ] = self.GetDate( individual.find('BIRTH') )
+
+        return derived[ 'birthDate' ]
+
+
+    # ----------------------------------------------------------------------
+    def GetDeathDate( self, individual ):
+
+        derived = self.GetDerivedFields( individual )
+
+        if ( not 'deathDate' in derived ):
+            derived[ 'deathDate' ] = self.GetDate( individual.find('DEATH') )
+
+        return derived[ 'deathDate' ]
+
+
+    # ----------------------------------------------------------------------
+    def ConvertDateTupleToOrdinal( self, date ):
+
+        # A ( day, month, year ) tuple as a yyyymmdd integer, with zeros
+        # for an unknown day or month so that dates sort in order, and how
+        # precisely it is known. None if the year isn't known.
+
+        if ( date is None ):
+            return None
+
+        day, month, year = date
+
+        year = self.ConvertDateTextToNumber( year )
+
+        if ( year is None ):
+            return None
+
+        month = ( month or '' ).strip()
+
+        if ( month[:3].title() in MONTHS ):
+            month = MONTHS.index( month[:3].title() ) + 1
+        else:
+            month = self.ConvertDateTextToNumber( month )
+
+        if ( ( month is None ) or ( month < 1 ) or ( month > 12 ) ):
+            return ( year*10000, DATE_PRECISION_YEAR )
+
+        day = self.ConvertDateTextToNumber( day )
+
+        if ( ( day is None ) or ( day < 1 ) or ( day > 31 ) ):
+            return ( year*10000 + month*100, DATE_PRECISION_MONTH )
+
+        return ( year*10000 + month*100 + day, DATE_PRECISION_DAY )
+
+
+    # ----------------------------------------------------------------------
+    def ConvertDateTextToNumber( self, text ):
+
+        # The first number in text, so 'c1500' is 1500
+
+        match = re.search( r'\d+', text or '' )
+
+        if ( match is None ):
+            return None
+
+        return int( match.group() )
+
+
+    # ----------------------------------------------------------------------
+    def GetDateIndex( self ):
+
+        # For each of DATED_EVENTS a list of the ( ordinal, ID ) of every
+        # record with that event's date, in date order. It is made the
+        # first time it's needed and kept up to date from then on.
+
+        if ( self.dateIndex is None ):
+
+            self.dateIndex = dict( ( event, [] ) for event in DATED_EVENTS )
+            self.dateOrdinals = {}
+
+            # The records are walked, rather than each looked up by ID, so
+            # that a database doesn't keep every one it reads
+
+            for individual in self.ftXML.findall( 'INDIVIDUAL' ):
+                self.IndexRecordDates( 'INDIVIDUAL', individual.attrib['id'], False, individual )
+
+            for family in self.ftXML.findall( 'FAMILY' ):
+                self.IndexRecordDates( 'FAMILY', family.attrib['id'], False, family )
+
+            for dates in self.dateIndex.values():
+                dates.sort()
+
+        return self.dateIndex
+
+
+    # ----------------------------------------------------------------------
+    def UpdateRecordIndexes( self, tag, idElement, flgChanged=False ):
+
+        # Changes are indexed once they are complete, anything else, such
+        # as a record being appended, straight away
+
+        if ( ( self.journalDepth > 0 ) and ( not flgChanged ) ):
+            return
+
+        if ( not self.dateIndex is None ):
+            self.IndexRecordDates( tag, idElement, True )
+
+        if ( ( not self.textIndex is None ) and ( tag == 'INDIVIDUAL' ) ):
+            self.IndexRecordText( idElement )
+
+        if ( ( not self.nameIndex is None ) and ( tag == 'INDIVIDUAL' ) ):
+            self.IndexRecordNames( idElement )
+
+
+    # ----------------------------------------------------------------------
+    def IndexRecordDates( self, tag, idElement, flgSorted, element=None ):
+
+        # Replace the dates indexed for a record with those it has now.
+        # Unless flgSorted the dates are added unsorted. The record is
+        # looked up unless its element is given.
+
+        if ( ( element is None ) and ( tag == 'INDIVIDUAL' ) ):
+            element = self.individualsByID.get( idElement )
+
+        elif ( element is None ):
+            element = self.familiesByID.get( idElement )
+
+        for event, tagEvent in DATED_EVENTS.iteritems():
+
+            if ( tagEvent != tag ):
+                continue
+
+            dates = self.dateIndex[ event ]
+
+            date = self.dateOrdinals.pop( ( event, idElement ), None )
+
+            if ( not date is None ):
+                del dates[ bisect.bisect_left( dates, ( date[0], idElement ) ) ]
+
+            if ( element is None ):
+                continue
+
+            date = self.ConvertDateTupleToOrdinal( self.GetDate( element.find( event ) ) )
+
+            if ( date is None ):
+                continue
+
+            self.dateOrdinals[ ( event, idElement ) ] = date
+
+            if ( flgSorted ):
+                bisect.insort( dates, ( date[0], idElement ) )
+            else:
+                dates.append( ( date[0], idElement ) )
+
+
+    # ----------------------------------------------------------------------
+    def GetIDsByDate( self, event, yearFirst, yearLast ):
+
+        # The IDs of the records with event ('BIRTH', 'DEATH', 'MARRIAGE'
+        # or 'DIVORCE') dated from yearFirst to yearLast, in date order
+
+        dates = self.GetDateIndex()[ event ]
+
+        first = bisect.bisect_left( dates, ( yearFirst*10000, ) )
+        last  = bisect.bisect_left( dates, ( ( yearLast + 1 )*10000, ) )
+
+        return [ idElement for ordinal, idElement in dates[ first:last ] ]
+
+
+    # ----------------------------------------------------------------------
+    def GetDateOrdinal( self, event, idElement ):
+
+        # The ( ordinal, precision ) of a record's event, as
+        # ConvertDateTupleToOrdinal() has it, or None if it isn't dated
+
+        self.GetDateIndex()
+
+        return self.dateOrdinals.get( ( event, idElement ) )
+
+
+    # ----------------------------------------------------------------------
+    def GetOrdinalRange( self, date ):
+
+        # The first and last days an ( ordinal, precision ) date may be,
+        # so a date known only to the year is the whole of that year
+
+        ordinal, precision = date
+
+        if ( precision == DATE_PRECISION_YEAR ):
+            return ( ordinal + 101, ordinal + 1231 )
+
+        if ( precision == DATE_PRECISION_MONTH ):
+            return ( ordinal + 1, ordinal + 31 )
+
+        return ( ordinal, ordinal )
+
+
+    # ----------------------------------------------------------------------
+    def GetIDsAliveIn( self, year, month=None, day=None ):
+
+        # The IDs of the individuals who may have been alive in a year, a
+        # month of it or on a day: those born in the MAX_LIFESPAN years up
+        # to it who didn't die before it, and those with no birth date who
+        # died in the MAX_LIFESPAN years after it. A birth or death known
+        # only to the year or month may be any day of it.
+
+        self.GetDateIndex()
+
+        if ( month is None ):
+            first, last = self.GetOrdinalRange( ( year*10000, DATE_PRECISION_YEAR ) )
+
+        elif ( day is None ):
+            first, last = self.GetOrdinalRange( ( year*10000 + month*100, DATE_PRECISION_MONTH ) )
+
+        else:
+            first = last = year*10000 + month*100 + day
+
+        ids = []
+
+        for idIndi in self.GetIDsByDate( 'BIRTH', year - MAX_LIFESPAN, year ):
+
+            birth = self.dateOrdinals[ ( 'BIRTH', idIndi ) ]
+            death = self.dateOrdinals.get( ( 'DEATH', idIndi ) )
+
+            if ( ( self.GetOrdinalRange( birth )[0] <= last ) and
+                 ( ( death is None ) or ( self.GetOrdinalRange( death )[1] >= first ) ) ):
+                ids.append( idIndi )
+
+        for idIndi in self.GetIDsByDate( 'DEATH', year, year + MAX_LIFESPAN ):
+
+            death = self.dateOrdinals[ ( 'DEATH', idIndi ) ]
+
+            if ( ( not ( 'BIRTH', idIndi ) in self.dateOrdinals ) and
+                 ( self.GetOrdinalRange( death )[1] >= first ) ):
+                ids.append( idIndi )
+
+        return ids
+
+
+    # ----------------------------------------------------------------------
+    def GetSearchText( self, individual ):
+
+        # The lower case text an individual is searched by: their label,
+        # which has their names and ID, alias, places and note. Fields of
+        # whitespace alone are left out, as a record that is restored no
+        # longer has them.
+
+        text = [ self.GetLabel( individual ),
+                 individual.findtext( 'ALIAS' ),
+                 individual.findtext( 'BIRTH/PLACE' ),
+                 individual.findtext( 'DEATH/PLACE' ),
+                 individual.findtext( 'BURIAL/PLACE' ),
+                 individual.findtext( 'NOTE' ) ]
+
+        return '\n'.join( [ field for field in text if field and field.strip() ] ).lower()
+
+
+    # ----------------------------------------------------------------------
+    def GetSearchGrams( self, word ):
+
+        # Every fragment of a word up to SEARCH_GRAM_LENGTH characters long
+
+        grams = set()
+
+        for length in range( 1, SEARCH_GRAM_LENGTH + 1 ):
+            for i in range( len( word ) - length + 1 ):
+                grams.add( word[ i:i + length ] )
+
+        return grams
+
+
+    # ----------------------------------------------------------------------
+    def GetTextIndex( self ):
+
+        # The IDs of the individuals with each word in their search text.
+        # Search terms can't span words, so they are looked up in the
+        # words with all the term's fragments in them, in textGrams. These
+        # are made the first time they're needed and kept up to date from
+        # then on.
+
+        if ( self.textIndex is None ):
+
+            self.textIndex = {}
+            self.textGrams = {}
+            self.textByID = {}
+
+            for individual in self.ftXML.findall( 'INDIVIDUAL' ):
+                self.IndexRecordText( individual.attrib['id'], individual )
+
+        return self.textIndex
+
+
+    # ----------------------------------------------------------------------
+    def IndexRecordText( self, idIndividual, individual=None ):
+
+        # Replace the text indexed for an individual with what they have
+        # now. They are looked up unless their element is given.
+
+        text = self.textByID.pop( idIndividual, None )
+
+        if ( not text is None ):
+            for word in set( text.split() ):
+
+                ids = self.textIndex[ word ]
+                ids.discard( idIndividual )
+
+                if ( len( ids ) == 0 ):
+
+                    del self.textIndex[ word ]
+
+                    for gram in self.GetSearchGrams( word ):
+
+                        words = self.textGrams[ gram ]
+                        words.discard( word )
+
+                        if ( len( words ) == 0 ):
+                            del self.textGrams[ gram ]
+
+        if ( individual is None ):
+            individual = self.individualsByID.get( idIndividual )
+
+        if ( individual is None ):
+            return
+
+        text = self.GetSearchText( individual )
+
+        self.textByID[ idIndividual ] = text
+
+        for word in text.split():
+
+            if ( not word in self.textIndex ):
+
+                self.textIndex[ word ] = set()
+
+                for gram in self.GetSearchGrams( word ):
+                    self.textGrams.setdefault( gram, set() ).add( word )
+
+            self.textIndex[ word ].add( idIndividual )
+
+
+    # ----------------------------------------------------------------------
+    def GetIDsMatching( self, strSearch ):
+
+        # The IDs of the individuals whose search text has every word of
+        # strSearch in it, ignoring case. Words starting with '~' match
+        # names that sound like them instead.
+
+        textIndex = self.GetTextIndex()
+
+        matches = []
+
+        for term in set( strSearch.lower().split() ):
+
+            if ( term.startswith( '~' ) and ( len( term ) > 1 ) ):
+                matches.append( self.GetIDsSoundingLike( term[1:] ) )
+                continue
+
+            # The words with every fragment of the term in them, of which
+            # those longer than a fragment need checking
+
+            grams = [ self.textGrams.get( term[ i:i + SEARCH_GRAM_LENGTH ], set() )
+                      for i in range( max( 1, len( term ) - SEARCH_GRAM_LENGTH + 1 ) ) ]
+
+            words = set.intersection( *sorted( grams, key=len ) )
+
+            if ( len( term ) > SEARCH_GRAM_LENGTH ):
+                words = [ word for word in words if term in word ]
+
+            ids = set()
+
+            for word in words:
+                ids |= textIndex[ word ]
+
+            matches.append( ids )
+
+        if ( len( matches ) == 0 ):
+            return set( self.individualsByID.keys() )
+
+        matches.sort( key=len )
+
+        return matches[0].intersection( *matches[1:] )
+
+
+    # ----------------------------------------------------------------------
+    def GetNameWords( self, text ):
+
+        # The lower case words of a name, without punctuation
+
+        return re.findall( r'[a-z]+', ( text or '' ).lower() )
+
+
+    # ----------------------------------------------------------------------
+    def GetPhoneticKey( self, word ):
+
+        # The sounds of a word as PHONETIC_CODES, so that 'tudor' and
+        # 'tewdwr' or 'katherine' and 'catherine' have the same key
+
+        # A name starting with a vowel or 'h' keeps it, or 'henry' would
+        # sound like 'mary'
+
+        key = ''
+        previous = None
+
+        if ( PHONETIC_CODES.get( word[:1], '0' ) == '0' ):
+            key = word[:1]
+
+        for letter in word:
+
+            code = PHONETIC_CODES.get( letter )
+
+            if ( code is None ):
+                continue
+
+            if ( ( code != previous ) and ( code != '0' ) ):
+                key += code
+
+            previous = code
+
+        return key[ :PHONETIC_KEY_LENGTH ] or word
+
+
+    # ----------------------------------------------------------------------
+    def GetNameDeletions( self, word ):
+
+        # The word with up to NAME_EDIT_DISTANCE letters deleted. Two
+        # words within that many edits of each other share one of these.
+
+        deletions = set( [ word ] )
+        previous = deletions
+
+        for distance in range( NAME_EDIT_DISTANCE ):
+
+            previous = set( variant[ :i ] + variant[ i + 1: ]
+                            for variant in previous
+                            for i in range( len( variant ) ) )
+
+            deletions |= previous
+
+        return deletions
+
+
+    # ----------------------------------------------------------------------
+    def GetEditDistance( self, word1, word2, maxDistance ):
+
+        # The number of letters to insert, delete or change to turn one
+        # word into the other, or maxDistance + 1 once it's more than that
+
+        if ( abs( len( word1 ) - len( word2 ) ) > maxDistance ):
+            return maxDistance + 1
+
+        previous = range( len( word2 ) + 1 )
+
+        for i, letter1 in enumerate( word1 ):
+
+            current = [ i + 1 ]
+
+            for j, letter2 in enumerate( word2 ):
+                current.append( min( previous[ j + 1 ] + 1,
+                                     current[ j ] + 1,
+                                     previous[ j ] + ( letter1 != letter2 ) ) )
+
+            if ( min( current ) > maxDistance ):
+                return maxDistance + 1
+
+            previous = current
+
+        return min( previous[-1], maxDistance + 1 )
+
+
+    # ----------------------------------------------------------------------
+    def GetNameIndex( self ):
+
+        # The IDs of the individuals with each word in their forename,
+        # surname or alias, and the name words with each phonetic key and
+        # each of GetNameDeletions. These are made the first time they're
+        # needed and kept up to date from then on.
+
+        if ( self.nameIndex is None ):
+
+            self.nameIndex = {}
+            self.namePhonetic = {}
+            self.nameDeletions = {}
+            self.namesByID = {}
+
+            for individual in self.ftXML.findall( 'INDIVIDUAL' ):
+                self.IndexRecordNames( individual.attrib['id'], individual )
+
+        return self.nameIndex
+
+
+    # ----------------------------------------------------------------------
+    def IndexRecordNames( self, idIndividual, individual=None ):
+
+        # Replace the names indexed for an individual with those they have
+        # now. They are looked up unless their element is given.
+
+        for word in self.namesByID.pop( idIndividual, () ):
+
+            ids = self.nameIndex[ word ]
+            ids.discard( idIndividual )
+
+            if ( len( ids ) == 0 ):
+
+                del self.nameIndex[ word ]
+
+                for index, keys in ( ( self.namePhonetic, [ self.GetPhoneticKey( word ) ] ),
+                                     ( self.nameDeletions, self.GetNameDeletions( word ) ) ):
+                    for key in keys:
+
+                        words = index[ key ]
+                        words.discard( word )
+
+                        if ( len( words ) == 0 ):
+                            del index[ key ]
+
+        if ( individual is None ):
+            individual = self.individualsByID.get( idIndividual )
+
+        if ( individual is None ):
+            return
 
-        return None
-    # ----------------------------------------------------------------------
+        names = set( self.GetNameWords( self.GetForename( individual ) ) +
+                     self.GetNameWords( self.GetSurname( individual ) ) +
+                     self.GetNameWords( self.GetAlias( individual ) ) )
 
+        self.namesByID[ idIndividual ] = names
 
-    # ----------------------------------------------------------------------
-    def ConvertDateTupleToLabel( self, date ):
+        for word in names:
 
-        label = None
+            if ( not word in self.nameIndex ):
 
-        if ( date is None ):
-            return None
+                self.nameIndex[ word ] = set()
 
-        day, month, year = date
+                self.namePhonetic.setdefault( self.GetPhoneticKey( word ), set() ).add( word )
 
-        if ( not day is None ):
-            label = '{:2s}'.format( day )
+                for deletion in self.GetNameDeletions( word ):
+                    self.nameDeletions.setdefault( deletion, set() ).add( word )
 
-        if ( not month is None ):
-            if ( not label is None ):
-                label = label + ' {:3s}'.format( month )
-            else:
-                label = month
+            self.nameIndex[ word ].add( idIndividual )
 
-        if ( not year is None ):
-            if ( not label is None ):
-                label = label + ' {:4s}'.format( year )
-            else:
-                label = year
 
-        if ( not label is None ):
-            return label.strip()
-        else:
-            return label
     # ----------------------------------------------------------------------
+    def GetIDsSoundingLike( self, name ):
 
+        # The IDs of the individuals with a forename, surname or alias that
+        # sounds like name, or is spelt within NAME_EDIT_DISTANCE letters
+        # of it
 
-    # ----------------------------------------------------------------------
-    def GetDate( self, element ):
+        nameIndex = self.GetNameIndex()
 
-        dateText = None
+        ids = set()
 
-        day = None
-        month = None
-        year = None
+        for term in self.GetNameWords( name ):
 
-        if ( element is not None ):
-            date = element.find( 'DATE' )
+            words = set( self.namePhonetic.get( self.GetPhoneticKey( term ), () ) )
 
-            if ( date is not None ):
+            for deletion in self.GetNameDeletions( term ):
+                for word in self.nameDeletions.get( deletion, () ):
 
-                day   = date.findtext('day')
-                month = date.findtext('month')
-                year  = date.findtext('year')
+                    if ( ( not word in words ) and
+                         ( self.GetEditDistance( term, word, NAME_EDIT_DISTANCE ) <= NAME_EDIT_DISTANCE ) ):
+                        words.add( word )
 
-        return ( day, month, year )
+            for word in words:
+                ids |= nameIndex[ word ]
 
-    # ----------------------------------------------------------------------
+        return ids
 
 
     # ----------------------------------------------------------------------
@@ -394,7 +2815,7 @@ class FamilyTreeXML( object ):
         sex = individual.findtext('SEX')
 
         if ( idFamily is None ): 
-            idFamilySpouse = individual.findtext('FAMILY_SPOUSE')
+            idFamilySpouse = self.GetFirstID( self.GetFamiliesAsSpouse( individual.attrib['id'] ) )
         else:
             idFamilySpouse = idFamily
         
@@ -403,20 +2824,16 @@ class FamilyTreeXML( object ):
             for family in self.GetFamilyWithID( idFamilySpouse ):
 
                 if ( sex == 'M' ):
-                    idSpouse = family.findtext('WIFE')
+                    idSpouse = self.GetWifeID( idFamilySpouse )
                 else:
-                    idSpouse = family.findtext('HUSBAND')
+                    idSpouse = self.GetHusbandID( idFamilySpouse )
 
                 if ( idSpouse is None ):
                     return ( None, idFamilySpouse, dateMarriage, dateDivorce )
 
-                flgFoundSpouse = False
-                for spouse in self.GetIndividuals():
-                    if ( spouse.attrib['id'] == idSpouse ):
-                        flgFoundSpouse = True
-                        break
+                spouse = self.GetIndividualWithID( idSpouse )
 
-                if ( flgFoundSpouse ):
+                if ( not spouse is None ):
                     marriage = family.find('MARRIAGE')
 
                     if ( marriage is not None ):
@@ -439,11 +2856,11 @@ class FamilyTreeXML( object ):
 
         spouses = []
 
-        families = individual.findall('FAMILY_SPOUSE')
+        idFamilies = self.GetFamiliesAsSpouse( individual.attrib['id'] )
         
-        for family in families:
+        for idFamily in idFamilies:
 
-            spouses.append( self.GetSpouse( individual, family.text ) )
+            spouses.append( self.GetSpouse( individual, idFamily ) )
 
         return spouses
 
@@ -456,22 +2873,15 @@ class FamilyTreeXML( object ):
         children = []
 
         if ( idFamily is None ):
-
-            familieIDs = individual.findall('FAMILY_SPOUSE')
-
-            families = []
-
-            for idFamily in familieIDs:
-                families = families + self.GetFamilyWithID( idFamily.text )
-
+            idFamilies = self.GetFamiliesAsSpouse( individual.attrib['id'] )
         else:
-            families = self.GetFamilyWithID( idFamily )
+            idFamilies = [ idFamily ]
 
-        for family in families:
+        for idFamily in idFamilies:
 
-            for child in family.findall( 'CHILD' ):
+            for idChild in self.GetChildIDs( idFamily ):
 
-                individualChild = self.GetIndividualWithID( child.text )
+                individualChild = self.GetIndividualWithID( idChild )
                 
                 if ( individualChild is not None ):
                     children.append( individualChild )
@@ -487,22 +2897,12 @@ class FamilyTreeXML( object ):
         mother = None
         father = None
 
-        idFamilyChild  = individual.findtext('FAMILY_CHILD')
+        idFamilyChild  = self.GetFirstID( self.GetFamiliesAsChild( individual.attrib['id'] ) )
 
         if ( idFamilyChild ):
-            for family in self.GetFamilyWithID( idFamilyChild ):
-
-                idMother = family.findtext('WIFE')
-                idFather = family.findtext('HUSBAND')
 
-                for parent in self.GetIndividuals():
-                    if ( parent.attrib['id'] == idMother ):
-                        mother = parent
-                    elif ( parent.attrib['id'] == idFather ):
-                        father = parent
-
-                    if ( ( mother is not None ) and ( father  is not None ) ):
-                        break
+            mother = self.GetIndividualWithID( self.GetWifeID( idFamilyChild ) )
+            father = self.GetIndividualWithID( self.GetHusbandID( idFamilyChild ) )
 
         return ( mother, father, idFamilyChild )
 
@@ -514,20 +2914,18 @@ class FamilyTreeXML( object ):
 
         siblings = []
 
-        idFamilyChild  = individual.findtext('FAMILY_CHILD')
+        idFamilyChild  = self.GetFirstID( self.GetFamiliesAsChild( individual.attrib['id'] ) )
 
         if ( idFamilyChild ):
 
-            for family in self.GetFamilyWithID( idFamilyChild ):
-
-                for sibling in family.findall( 'CHILD' ):
+            for idSibling in self.GetChildIDs( idFamilyChild ):
 
-                    if ( individual.attrib['id'] != sibling.text ):
+                if ( individual.attrib['id'] != idSibling ):
 
-                        individualSibling = self.GetIndividualWithID( sibling.text )
+                    individualSibling = self.GetIndividualWithID( idSibling )
 
-                        if ( individualSibling is not None ):
-                            siblings.append( individualSibling )
+                    if ( individualSibling is not None ):
+                        siblings.append( individualSibling )
 
         return ( siblings, idFamilyChild )
 
@@ -535,10 +2933,182 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
-    def CollateSubjectsSiblings( self, ftInputXML, idInputIndividual=None ):
+    def GetParentIDs( self, idIndividual ):
+
+        idParents = []
+
+        idFamilyChild  = self.GetFirstID( self.GetFamiliesAsChild( idIndividual ) )
+
+        if ( idFamilyChild ):
+
+            for idParent in ( self.GetWifeID( idFamilyChild ), self.GetHusbandID( idFamilyChild ) ):
+
+                if ( idParent in self.individualsByID ):
+                    idParents.append( idParent )
+
+        return idParents
+
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def GetOffspringIDs( self, idIndividual ):
+
+        idChildren = []
+
+        for idFamily in self.GetFamiliesAsSpouse( idIndividual ):
+
+            for idChild in self.GetChildIDs( idFamily ):
+
+                if ( idChild in self.individualsByID ):
+                    idChildren.append( idChild )
+
+        return idChildren
+
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def TraverseIDs( self, idIndividual, fnGetNextIDs, maxGenerations=None ):
+
+        # Depth first walk yielding ( id, generation ) in the same order as
+        # the old recursive routines but visiting each individual only once,
+        # so pedigree collapse costs nothing and deep lines cannot exhaust
+        # the recursion limit
+
+        if ( not idIndividual in self.individualsByID ):
+            return
+
+        # With pedigree collapse the walk can reach someone by a longer line
+        # first, so each generation is found breadth first beforehand as the
+        # fewest steps from the subject, and only people within
+        # maxGenerations of it are walked
+
+        generations = { idIndividual : 0 }
+        idsNextByID = {}
+
+        idsGeneration = [ idIndividual ]
+        depth = 0
+
+        while ( idsGeneration and ( ( maxGenerations is None ) or ( depth < maxGenerations ) ) ):
+
+            depth += 1
+            idsFound = []
+
+            for idIndi in idsGeneration:
+
+                idsNextByID[ idIndi ] = fnGetNextIDs( idIndi )
+
+                for idNext in idsNextByID[ idIndi ]:
+
+                    if ( not idNext in generations ):
+                        generations[ idNext ] = depth
+                        idsFound.append( idNext )
+
+            idsGeneration = idsFound
+
+        idsVisited = set()
+        stack = [ idIndividual ]
+
+        while ( stack ):
+
+            idIndi = stack.pop()
+
+            if ( idIndi in idsVisited ):
+                continue
+
+            idsVisited.add( idIndi )
+
+            yield ( idIndi, generations[ idIndi ] )
+
+            for idNext in reversed( idsNextByID.get( idIndi, [] ) ):
+
+                if ( not idNext in idsVisited ):
+                    stack.append( idNext )
+
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def IterateAncestors( self, idIndividual, maxGenerations=None ):
+
+        return self.TraverseIDs( idIndividual, self.GetParentIDs, maxGenerations )
+
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def IterateDescendents( self, idIndividual, maxGenerations=None ):
+
+        return self.TraverseIDs( idIndividual, self.GetOffspringIDs, maxGenerations )
+
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def AddFamilyRecordIDs( self, idsRecords, idFamilies ):
+
+        for idFamily in idFamilies:
+
+            idsRecords.add( ( 'FAMILY', idFamily ) )
+
+            for idMember in ( [ self.GetHusbandID( idFamily ), self.GetWifeID( idFamily ) ] +
+                              self.GetChildIDs( idFamily ) ):
+
+                if ( idMember ):
+                    idsRecords.add( ( 'INDIVIDUAL', idMember ) )
+
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def GetSubjectsRecordIDs( self, idInputIndividual, flgAncestors=False, flgDescendents=False,
+                              generationsUp=None, generationsDown=None ):
+
+        # The ( tag, id ) of every record a plot of this individual's
+        # ancestors and/or descendents can touch: each individual on the
+        # way, the families they belong to and everyone in those
+        # families, plus their spouses' other families and children
+
+        idsSubjects = set( [ idInputIndividual ] )
+
+        if ( flgAncestors ):
+            idsSubjects.update( idAncestor for idAncestor, depth in
+                                self.IterateAncestors( idInputIndividual, generationsUp ) )
+
+        if ( flgDescendents ):
+            idsSubjects.update( idDescendent for idDescendent, depth in
+                                self.IterateDescendents( idInputIndividual, generationsDown ) )
+
+        idsRecords = set()
+
+        for idSubject in idsSubjects:
+
+            idsRecords.add( ( 'INDIVIDUAL', idSubject ) )
+
+            self.AddFamilyRecordIDs( idsRecords, self.GetFamiliesAsChild( idSubject ) )
+            self.AddFamilyRecordIDs( idsRecords, self.GetFamiliesAsSpouse( idSubject ) )
+
+            for idFamily in self.GetFamiliesAsSpouse( idSubject ):
+
+                for idSpouse in ( self.GetHusbandID( idFamily ), self.GetWifeID( idFamily ) ):
+
+                    if ( idSpouse and ( idSpouse != idSubject ) ):
+                        self.AddFamilyRecordIDs( idsRecords, self.GetFamiliesAsSpouse( idSpouse ) )
+
+        return idsRecords
+
+    # ----------------------------------------------------------------------
+
+
+    # ----------------------------------------------------------------------
+    def CollateSubjectsSiblings( self, ftInputXML, idInputIndividual=None, idsCollated=None ):
 
         if ( idInputIndividual is None ):
             idInputIndividual = self.idIndividual
+
+        if ( idsCollated is None ):
+            idsCollated = self.GetCollatedIDs( ftInputXML )
             
         eIndividual = self.GetIndividual( idInputIndividual )        
 
@@ -555,29 +3125,32 @@ class FamilyTreeXML( object ):
                         eSibling = self.GetIndividualWithID( idSibling.text )
 
                         if ( eSibling is not None ):
-                             self.AppendIndividual( eSibling, ftInputXML )
+                             self.AppendIndividual( eSibling, ftInputXML, idsCollated )
                             
     # ----------------------------------------------------------------------
 
 
     # ----------------------------------------------------------------------
-    def CollateSubjectsFamilyMembers( self, ftInputXML, idInputIndividual=None ):
+    def CollateSubjectsFamilyMembers( self, ftInputXML, idInputIndividual=None, idsCollated=None ):
 
         if ( idInputIndividual is None ):
             idInputIndividual = self.idIndividual
+
+        if ( idsCollated is None ):
+            idsCollated = self.GetCollatedIDs( ftInputXML )
             
         eIndividual = self.GetIndividual( idInputIndividual )        
 
         if ( eIndividual is None ):
             return
 
-        self.AppendIndividual( eIndividual, ftInputXML )
+        self.AppendIndividual( eIndividual, ftInputXML, idsCollated )
 
         sex = eIndividual.findtext('SEX')
 
         # Siblings
 
-        self.CollateSubjectsSiblings( ftInputXML, idInputIndividual )
+        self.CollateSubjectsSiblings( ftInputXML, idInputIndividual, idsCollated )
             
         # Parents
 
@@ -585,15 +3158,15 @@ class FamilyTreeXML( object ):
 
         if ( not eMother is None ):
 
-            self.AppendIndividual( eMother, ftInputXML )
+            self.AppendIndividual( eMother, ftInputXML, idsCollated )
 
         if ( not eFather is None ):
 
-            self.AppendIndividual( eFather, ftInputXML )
+            self.AppendIndividual( eFather, ftInputXML, idsCollated )
 
         for eFamilyChild in self.GetFamilyWithID( idFamilyChild ):
 
-            self.AppendFamily( eFamilyChild, ftInputXML )
+            self.AppendFamily( eFamilyChild, ftInputXML, idsCollated )
 
         # Families
 
@@ -603,7 +3176,7 @@ class FamilyTreeXML( object ):
 
             for eFamily in self.GetFamilyWithID( idFamily.text ):
 
-                self.AppendFamily( eFamily, ftInputXML )
+                self.AppendFamily( eFamily, ftInputXML, idsCollated )
 
                 # Spouse
                 
@@ -615,7 +3188,7 @@ class FamilyTreeXML( object ):
                 if ( not idSpouse is None ):
                     eSpouse = self.GetIndividual( idSpouse ) 
 
-                    self.AppendIndividual( eSpouse, ftInputXML )
+                    self.AppendIndividual( eSpouse, ftInputXML, idsCollated )
 
                 # Children
 
@@ -625,175 +3198,127 @@ class FamilyTreeXML( object ):
 
                     if ( not eChild is None ):
 
-                        self.AppendIndividual( eChild, ftInputXML )
+                        self.AppendIndividual( eChild, ftInputXML, idsCollated )
 
     # ----------------------------------------------------------------------
 
 
     # ----------------------------------------------------------------------
-    def GetSubjectsAncestors( self, idInputIndividual, indent=None, idAncestors=None ):
-
-        if ( idAncestors is None ):
-            idAncestors = []
-
-        if ( indent is None ):
-            indent = ''
-        else:
-            indent = indent + '  '
-
-        eIndividual = self.GetIndividual( idInputIndividual )        
-
-        if ( eIndividual is None ):
-            return idAncestors
-
-        print indent, idInputIndividual, self.GetName( eIndividual )
+    def GetSubjectsAncestors( self, idInputIndividual, maxGenerations=None ):
 
-        eMother, eFather, idFamilyChild = self.GetParents( eIndividual )
+        idAncestors = []
 
-        flgHasParent = False
+        for idAncestor, depth in self.IterateAncestors( idInputIndividual, maxGenerations ):
 
-        if ( not eMother is None ):
-            flgHasParent = True
-            idAncestors = self.GetSubjectsAncestors( eMother.attrib['id'], indent, idAncestors )
-            
-        if ( not eFather is None ):
-            flgHasParent = True
-            idAncestors = self.GetSubjectsAncestors( eFather.attrib['id'], indent, idAncestors )
+            print '  '*depth, idAncestor, self.GetName( self.GetIndividualWithID( idAncestor ) )
 
-        if ( not flgHasParent ):
-            idAncestors.append( idInputIndividual )
+            if ( len( self.GetParentIDs( idAncestor ) ) == 0 ):
+                idAncestors.append( idAncestor )
 
         return idAncestors
     # ----------------------------------------------------------------------
 
 
     # ----------------------------------------------------------------------
-    def CollateSubjectsAncestors( self, ftInputXML, idInputIndividual=None, flgIncludeSiblings=False ):
+    def CollateSubjectsAncestors( self, ftInputXML, idInputIndividual=None, flgIncludeSiblings=False,
+                                  idsCollated=None, maxGenerations=None ):
 
         if ( idInputIndividual is None ):
             idInputIndividual = self.idIndividual
 
-        eIndividual = self.GetIndividual( idInputIndividual )        
-
-        if ( eIndividual is None ):
-            return
-        
-        self.AppendIndividual( eIndividual, ftInputXML )
-
-        sex = eIndividual.findtext('SEX')
+        if ( idsCollated is None ):
+            idsCollated = self.GetCollatedIDs( ftInputXML )
 
-        # Siblings?
+        for idAncestor, depth in self.IterateAncestors( idInputIndividual, maxGenerations ):
 
-        if ( flgIncludeSiblings ):
-            self.CollateSubjectsSiblings( ftInputXML, idInputIndividual )
+            eIndividual = self.GetIndividualWithID( idAncestor )
 
-        # Parents
+            self.AppendIndividual( eIndividual, ftInputXML, idsCollated )
 
-        eMother, eFather, idFamilyChild = self.GetParents( eIndividual )
+            # Siblings?
 
-        for eFamilyChild in self.GetFamilyWithID( idFamilyChild ):
+            if ( flgIncludeSiblings ):
+                self.CollateSubjectsSiblings( ftInputXML, idAncestor, idsCollated )
 
-            self.AppendFamily( eFamilyChild, ftInputXML )
+            # Parents (appended in turn as the walk reaches them)
 
-        if ( not eMother is None ):
+            if ( ( maxGenerations is None ) or ( depth < maxGenerations ) ):
 
-            self.CollateSubjectsAncestors( ftInputXML, eMother.attrib['id'], flgIncludeSiblings )
+                idFamilyChild  = self.GetFirstID( self.GetFamiliesAsChild( idAncestor ) )
 
-        if ( not eFather is None ):
+                for eFamilyChild in self.GetFamilyWithID( idFamilyChild ):
 
-            self.CollateSubjectsAncestors( ftInputXML, eFather.attrib['id'], flgIncludeSiblings )
+                    self.AppendFamily( eFamilyChild, ftInputXML, idsCollated )
 
     # ----------------------------------------------------------------------
 
 
     # ----------------------------------------------------------------------
-    def CollateSubjectsDescendents( self, ftInputXML, idInputIndividual=None, flgIncludeSiblings=False ):
+    def CollateSubjectsDescendents( self, ftInputXML, idInputIndividual=None, flgIncludeSiblings=False,
+                                    idsCollated=None, maxGenerations=None ):
 
         if ( idInputIndividual is None ):
             idInputIndividual = self.idIndividual
 
-        eIndividual = self.GetIndividual( idInputIndividual )        
-
-        if ( eIndividual is None ):
-            return
-
-        self.AppendIndividual( eIndividual, ftInputXML )
-
-        sex = eIndividual.findtext('SEX')
-
-        # Siblings?
-
-        if ( flgIncludeSiblings ):
-            self.CollateSubjectsSiblings( ftInputXML, idInputIndividual )
-
-
-        # Families
+        if ( idsCollated is None ):
+            idsCollated = self.GetCollatedIDs( ftInputXML )
 
-        idFamilies = eIndividual.findall('FAMILY_SPOUSE')
+        for idDescendent, depth in self.IterateDescendents( idInputIndividual, maxGenerations ):
 
-        for idFamily in idFamilies:
+            eIndividual = self.GetIndividualWithID( idDescendent )
 
-            for eFamily in self.GetFamilyWithID( idFamily.text ):
+            self.AppendIndividual( eIndividual, ftInputXML, idsCollated )
 
-                self.AppendFamily( eFamily, ftInputXML )
+            # Siblings?
 
-                # Spouse
-                
-                if ( sex == 'M' ):
-                    idSpouse = eFamily.findtext('WIFE')
-                else:
-                    idSpouse = eFamily.findtext('HUSBAND')
+            if ( flgIncludeSiblings ):
+                self.CollateSubjectsSiblings( ftInputXML, idDescendent, idsCollated )
 
-                if ( not idSpouse is None ):
-                    eSpouse = self.GetIndividual( idSpouse ) 
+            # Families and spouses (children are appended as the walk reaches them)
 
-                    self.AppendIndividual( eSpouse, ftInputXML )
+            for idFamily in self.GetFamiliesAsSpouse( idDescendent ):
 
-                # Children
+                for eFamily in self.GetFamilyWithID( idFamily ):
 
-                for idChild in eFamily.findall( 'CHILD' ):
+                    self.AppendFamily( eFamily, ftInputXML, idsCollated )
 
-                    eChild = self.GetIndividual( idChild.text ) 
+                    if ( eIndividual.findtext('SEX') == 'M' ):
+                        idSpouse = self.GetWifeID( idFamily )
+                    else:
+                        idSpouse = self.GetHusbandID( idFamily )
 
-                    if ( not eChild is None ):
+                    eSpouse = self.GetIndividualWithID( idSpouse )
 
-                        self.CollateSubjectsDescendents( ftInputXML, idChild.text, flgIncludeSiblings )
+                    if ( not eSpouse is None ):
+                        self.AppendIndividual( eSpouse, ftInputXML, idsCollated )
 
     # ----------------------------------------------------------------------
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def CreateIndividual( self, idFamilyChild=None, idFamilySpouse=None ):
 
-        ids = []
-        for individual in self.GetIndividuals():
-            ids.append( individual.attrib['id'] )
+        idIndi = self.AllocateID( 'I', self.individualsByID )
 
-        i = 1
-        idIndi = 'I{:03d}'.format ( i )
-        while ( idIndi in ids ):
-            i = i + 1
-            idIndi = 'I{:03d}'.format ( i )
+        individual = ET.SubElement( self.ftXML, 'INDIVIDUAL', { 'id': idIndi } )
 
-        return ET.SubElement( self.ftXML, 'INDIVIDUAL', { 'id': idIndi } )
+        self.IndexIndividual( individual )
+
+        return individual
     # ----------------------------------------------------------------------
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def CreateFamily( self, individual=None ):
 
-        ids = []
-        for family in self.GetFamilies():
-            ids.append( family.attrib['id'] )
-
-        i = 1
-        idFamily = 'F{:03d}'.format ( i )
-        while ( idFamily in ids ):
-            i = i + 1
-            idFamily = 'F{:03d}'.format ( i )
+        idFamily = self.AllocateID( 'F', self.familiesByID )
 
         eFamily = ET.SubElement( self.ftXML, 'FAMILY', { 'id': idFamily } )
 
+        self.IndexFamily( eFamily )
+
         # Assign the id to this individual
 
         if ( not individual is None ):
@@ -802,34 +3327,46 @@ class FamilyTreeXML( object ):
 
             eFamilySpouse.text = idFamily
 
+            self.UpdateIndividualRelations( individual )
 
         return eFamily
    # ----------------------------------------------------------------------
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def DeleteFamily( self, idFamily ):
 
         if ( not idFamily is None ):
 
             for family in self.GetFamilyWithID( idFamily ):
 
-                print 'DeleteFamily: Deleting family', idFamily
-                ET.dump( family )
-                self.ftXML.remove( family )
+                if ( self.flgDebug ):
+                    print 'DeleteFamily: Deleting family', idFamily
+                    ET.dump( family )
+
+                self.RemoveFamilyElement( family )
+
+            # Only the individuals that refer to the family need updating
 
-            for individual in self.GetIndividuals():
+            for idIndividual in sorted( self.GetFamilyReferences( idFamily ) ):
 
-                print '\nDeleteFamily: Individual'
-                ET.dump( individual )
+                individual = self.GetIndividualWithID( idIndividual )
+
+                if ( self.flgDebug ):
+                    print '\nDeleteFamily: Individual'
+                    ET.dump( individual )
 
                 families = individual.findall('FAMILY_SPOUSE')
 
                 for family in families:
 
                     if ( family.text == idFamily ):
-                        print 'DeleteFamily: Deleting spouse', family.text
-                        ET.dump( family )
+
+                        if ( self.flgDebug ):
+                            print 'DeleteFamily: Deleting spouse', family.text
+                            ET.dump( family )
+
                         individual.remove( family )
 
                 families = individual.findall('FAMILY_CHILD')
@@ -837,97 +3374,103 @@ class FamilyTreeXML( object ):
                 for family in families:
 
                     if ( family.text == idFamily ):
-                        print 'DeleteFamily: Deleting child', family.text
-                        ET.dump( family )
+
+                        if ( self.flgDebug ):
+                            print 'DeleteFamily: Deleting child', family.text
+                            ET.dump( family )
+
                         individual.remove( family )
 
+                self.UpdateIndividualRelations( individual )
+
 
     # ----------------------------------------------------------------------
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def DeleteIndividual( self, idIndividual ):
 
-        prevIndividual = None
-        theIndividual  = None
-        nextIndividual = None
+        # Find the individual
 
-        lastIndividual = None
+        theIndividual = self.GetIndividualWithID( idIndividual )
 
-        # Find the individual
+        if ( theIndividual is None ):
+            return None
 
-        for individual in self.GetIndividuals():
+        idAdjacent = self.GetAdjacentIndividualID( theIndividual )
 
-            if ( individual.attrib['id'] == idIndividual ):
+        idFamiliesSpouse = self.GetFamiliesAsSpouse( idIndividual )
+        idFamiliesChild  = self.GetFamiliesAsChild( idIndividual )
 
-                theIndividual = individual
-                prevIndividual = lastIndividual
+        self.ftXML.remove( theIndividual )
+        self.UnindexIndividual( theIndividual )
 
-            elif ( not theIndividual is None ):
+        # Also delete spouse references
 
-                nextIndividual = individual
-                break
+        for idFamilySpouse in idFamiliesSpouse:
 
-            lastIndividual = individual
+            for family in self.GetFamilyWithID( idFamilySpouse ):
 
-        self.ftXML.remove( theIndividual )
+                for eSpouse in family.findall('WIFE') + family.findall('HUSBAND'):
 
-        # Also delete spouse references
+                    if ( idIndividual == eSpouse.text ):
+                        family.remove( eSpouse )
 
-        idFamilySpouse = theIndividual.findtext('FAMILY_SPOUSE')
+                self.UpdateFamilyRelations( family )
+                self.RemoveFamilyIfEmpty( family )
 
-        for family in self.GetFamilyWithID( idFamilySpouse ):
+        # and child references
 
-            if ( idIndividual == family.findtext('WIFE') ):
+        for idFamilyChild in idFamiliesChild:
 
-                eWife = family.find('WIFE')
-                family.remove( eWife )
+            for family in self.GetFamilyWithID( idFamilyChild ):
 
-            if ( idIndividual == family.findtext('HUSBAND') ):
+                for eChild in family.findall('CHILD'):
 
-                eHusband = family.find('HUSBAND')
-                family.remove( eHusband )
+                    if ( idIndividual == eChild.text ):
+                        family.remove( eChild )
 
-            # If the family has no spouses or children then delete is
+                self.UpdateFamilyRelations( family )
+                self.RemoveFamilyIfEmpty( family )
 
-            if ( ( family.findtext('WIFE') is None ) and
-                 ( family.findtext('HUSBAND') is None ) and
-                 ( family.findtext('CHILD') is None ) ):
 
-                self.ftXML.remove( family )
+        # Return the id of an adjacent individual
 
-        # and child references
+        return idAdjacent
 
-        idFamilyChild = theIndividual.findtext('FAMILY_CHILD')
 
-        for family in self.GetFamilyWithID( idFamilyChild ):
+    # ----------------------------------------------------------------------
+    def GetAdjacentIndividualID( self, individual ):
 
-            if ( idIndividual == family.findtext('CHILD') ):
+        # lxml elements can step straight to their neighbours, otherwise
+        # find the individual's position in the tree
 
-                eChild = family.find('CHILD')
-                family.remove( eChild )
+        if ( hasattr( individual, 'itersiblings' ) ):
 
-            # If the family has no spouses or children then delete is
+            for adjacent in individual.itersiblings( 'INDIVIDUAL', preceding=True ):
+                return adjacent.attrib['id']
 
-            if ( ( family.findtext('WIFE') is None ) and
-                 ( family.findtext('HUSBAND') is None ) and
-                 ( family.findtext('CHILD') is None ) ):
+            for adjacent in individual.itersiblings( 'INDIVIDUAL' ):
+                return adjacent.attrib['id']
 
-                self.ftXML.remove( family )
+            return None
 
+        individuals = self.GetIndividuals()
 
-        # Return the id of an adjacent individual
+        index = individuals.index( individual )
 
-        if ( not prevIndividual is None ):
-            return prevIndividual.attrib['id']
+        if ( index > 0 ):
+            return individuals[ index - 1 ].attrib['id']
 
-        elif ( not nextIndividual is None ):
-            return nextIndividual.attrib['id']
+        elif ( index + 1 < len( individuals ) ):
+            return individuals[ index + 1 ].attrib['id']
 
         return None
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetFirstName( self, idIndividual, name ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -948,6 +3491,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetLastName( self, idIndividual, name ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -968,6 +3512,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetAlias( self, idIndividual, alias ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -983,6 +3528,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetSex( self, idIndividual, sex ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1055,6 +3601,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetBirthDay( self, idIndividual, day ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1070,6 +3617,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetBirthMonth( self, idIndividual, month ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1085,6 +3633,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetBirthYear( self, idIndividual, year ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1100,6 +3649,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetBirthPlace( self, idIndividual, place ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1120,6 +3670,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetDeathDay( self, idIndividual, day ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1135,6 +3686,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetDeathMonth( self, idIndividual, month ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1150,6 +3702,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetDeathYear( self, idIndividual, year ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1165,6 +3718,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetDeathPlace( self, idIndividual, place ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1185,6 +3739,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetBurialPlace( self, idIndividual, place ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1205,12 +3760,14 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetDivorcedDay( self, idIndividual, day, idFamily ):
 
         self.SetMarriedDay( idIndividual, day, idFamily, True )
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetSubjectNote( self, idIndividual, note ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1226,6 +3783,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetFamilyNote( self, idIndividual, idFamily, note ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1244,6 +3802,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetMarriedDay( self, idIndividual, day, idFamily, flgDivorced=False ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1280,6 +3839,7 @@ class FamilyTreeXML( object ):
 
                 if ( not eSpouse is None ):
                     eSpouse.text = idIndividual
+                    self.UpdateFamilyRelations( family )
 
                 if ( flgDivorced ):
                     eMarried = family.find('DIVORCE')
@@ -1296,12 +3856,14 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetDivorcedMonth( self, idIndividual, month, idFamily ):
 
         self.SetMarriedMonth( idIndividual, month, idFamily, True )
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetMarriedMonth( self, idIndividual, month, idFamily, flgDivorced=False ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1337,6 +3899,7 @@ class FamilyTreeXML( object ):
 
                 if ( not eSpouse is None ):
                     eSpouse.text = idIndividual
+                    self.UpdateFamilyRelations( family )
 
 
                 if ( flgDivorced ):
@@ -1354,12 +3917,14 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetDivorcedYear( self, idIndividual, year, idFamily ):
 
         self.SetMarriedYear( idIndividual, year, idFamily, True )
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetMarriedYear( self, idIndividual, year, idFamily, flgDivorced=False ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1395,6 +3960,7 @@ class FamilyTreeXML( object ):
 
                 if ( not eSpouse is None ):
                     eSpouse.text = idIndividual
+                    self.UpdateFamilyRelations( family )
 
                 if ( flgDivorced ):
                     eMarried = family.find('DIVORCE')
@@ -1411,6 +3977,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetMarriedPlace( self, idIndividual, idFamily, place ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1437,6 +4004,7 @@ class FamilyTreeXML( object ):
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetFather( self, idIndividual, idFather ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1507,11 +4075,18 @@ class FamilyTreeXML( object ):
 
             eFamilySpouse.text = idFamily
 
+            self.UpdateIndividualRelations( theIndividual )
+            self.UpdateIndividualRelations( theFather )
+
+            for family in families:
+                self.UpdateFamilyRelations( family )
+
         else:
             print 'SetFather(', idIndividual, idFather, ') Individual is none:'
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetMother( self, idIndividual, idMother ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1582,11 +4157,18 @@ class FamilyTreeXML( object ):
 
             eFamilySpouse.text = idFamily
 
+            self.UpdateIndividualRelations( theIndividual )
+            self.UpdateIndividualRelations( theMother )
+
+            for family in families:
+                self.UpdateFamilyRelations( family )
+
         else:
             print 'SetMother(', idIndividual, idMother, ') Individual is none:'
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetSpouse( self, idIndividual, idSpouse, idFamilySpouse=None ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1674,12 +4256,18 @@ class FamilyTreeXML( object ):
                 eFamilySpouse = ET.SubElement( theSpouse, 'FAMILY_SPOUSE' )
                 eFamilySpouse.text = idFamily
 
+            self.UpdateIndividualRelations( theIndividual )
+            self.UpdateIndividualRelations( theSpouse )
+
+            for family in families:
+                self.UpdateFamilyRelations( family )
 
         else:
             print 'SetSpouse(', idIndividual, idSpouse, ') Individual is none:'
 
 
     # ----------------------------------------------------------------------
+    @Journalled
     def SetChild( self, idIndividual, idChild, idFamily=None ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1761,8 +4349,15 @@ class FamilyTreeXML( object ):
 
         eChild.text = idFamily
 
+        self.UpdateIndividualRelations( theIndividual )
+        self.UpdateIndividualRelations( theChild )
+
+        for family in self.GetFamilyWithID( idFamily ):
+            self.UpdateFamilyRelations( family )
+
 
     # ----------------------------------------------------------------------
+    @Journalled
     def RemoveParents( self, idIndividual ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1783,21 +4378,19 @@ class FamilyTreeXML( object ):
 
                             family.remove( child )
 
-                    # If the family has no spouses or children then delete is
-
-                    if ( ( family.findtext('WIFE') is None ) and
-                         ( family.findtext('HUSBAND') is None ) and
-                         ( family.findtext('CHILD') is None ) ):
-
-                        self.ftXML.remove( family )
+                    self.UpdateFamilyRelations( family )
+                    self.RemoveFamilyIfEmpty( family )
 
 
                 eFamilyChild = theIndividual.find('FAMILY_CHILD')
 
                 theIndividual.remove( eFamilyChild )
 
+                self.UpdateIndividualRelations( theIndividual )
+
 
     # ----------------------------------------------------------------------
+    @Journalled
     def RemoveSpouse( self, idIndividual ):
 
         theIndividual = self.GetIndividual( idIndividual )
@@ -1824,21 +4417,19 @@ class FamilyTreeXML( object ):
 
                             family.remove( eSpouse )
 
-                    # If the family has no spouses or children then delete is
-
-                    if ( ( family.findtext('WIFE') is None ) and
-                         ( family.findtext('HUSBAND') is None ) and
-                         ( family.findtext('CHILD') is None ) ):
-
-                        self.ftXML.remove( family )
+                    self.UpdateFamilyRelations( family )
+                    self.RemoveFamilyIfEmpty( family )
 
 
                 eFamilySpouse = theIndividual.find('FAMILY_SPOUSE')
 
                 theIndividual.remove( eFamilySpouse )
 
+                self.UpdateIndividualRelations( theIndividual )
+
 
     # ----------------------------------------------------------------------
+    @Journalled
     def RemoveChild( self, idParent, idChild ):
 
         theParent = self.GetIndividual( idParent )
@@ -1864,56 +4455,85 @@ class FamilyTreeXML( object ):
 
                             family.remove( child )
 
+                    self.UpdateFamilyRelations( family )
+
                 eFamilyChild = theChild.find('FAMILY_CHILD')
 
                 theChild.remove( eFamilyChild )
 
+                self.UpdateIndividualRelations( theChild )
+
+
+    # ----------------------------------------------------------------------
+    def GetCollatedIDs( self, ftInputXML ):
+
+        # The IDs of the individuals and families already in a collated
+        # tree, so that each record is only appended to it once
+
+        idsCollated = set()
+
+        for individual in ftInputXML.findall( 'INDIVIDUAL' ):
+            idsCollated.add( ( 'INDIVIDUAL', individual.attrib['id'] ) )
+
+        for family in ftInputXML.findall( 'FAMILY' ):
+            idsCollated.add( ( 'FAMILY', family.attrib['id'] ) )
+
+        return idsCollated
+
+
+    # ----------------------------------------------------------------------
+    def CopyElement( self, element ):
+
+        # Records read compactly are copied out as elements
+
+        if ( isinstance( element, FamilyTreeRecord ) ):
+            return self.ConvertRecordToElement( element )
+
+        return deepcopy( element )
 
     # ----------------------------------------------------------------------
-    def AppendIndividual( self, newIndividual, ftInputXML=None ):
+    def AppendIndividual( self, newIndividual, ftInputXML=None, idsCollated=None ):
 
-        if ( ftInputXML is None ):
-            ftInputXML = self.ftXML
+        if ( ( ftInputXML is None ) or ( ftInputXML is self.ftXML ) ):
 
-        individuals = ftInputXML.findall( 'INDIVIDUAL' )
+            if ( not newIndividual.attrib['id'] in self.individualsByID ):
+
+                individual = deepcopy( newIndividual )
+                self.ftXML.append( individual )
+                self.IndexIndividual( individual )
 
-        if ( individuals is None ):
-            ftInputXML.append( deepcopy( newIndividual ) )
             return
 
-        idNewIndividual = newIndividual.attrib['id']
+        if ( idsCollated is None ):
+            idsCollated = self.GetCollatedIDs( ftInputXML )
 
-        flgFound = False
-        for individual in individuals:
+        idNewIndividual = ( 'INDIVIDUAL', newIndividual.attrib['id'] )
 
-            if ( individual.attrib['id'] == idNewIndividual ):
-                flgFound = True
-                break
+        if ( not idNewIndividual in idsCollated ):
 
-        if ( not flgFound ):
-            ftInputXML.append( deepcopy( newIndividual ) )
+            ftInputXML.append( self.CopyElement( newIndividual ) )
+            idsCollated.add( idNewIndividual )
 
     # ----------------------------------------------------------------------
-    def AppendFamily( self, newFamily, ftInputXML=None ):
+    def AppendFamily( self, newFamily, ftInputXML=None, idsCollated=None ):
+
+        if ( ( ftInputXML is None ) or ( ftInputXML is self.ftXML ) ):
 
-        if ( ftInputXML is None ):
-            ftInputXML = self.ftXML
+            if ( not newFamily.attrib['id'] in self.familiesByID ):
 
-        families = ftInputXML.findall( 'FAMILY' )
+                family = deepcopy( newFamily )
+                self.ftXML.append( family )
+                self.IndexFamily( family )
 
-        if ( families is None ):
-            ftInputXML.append( deepcopy( newFamily ) )
             return
 
-        idNewFamily = newFamily.attrib['id']
+        if ( idsCollated is None ):
+            idsCollated = self.GetCollatedIDs( ftInputXML )
 
-        flgFound = False
-        for family in families:
+        idNewFamily = ( 'FAMILY', newFamily.attrib['id'] )
 
-            if ( family.attrib['id'] == idNewFamily ):
-                flgFound = True
-                break
+        if ( not idNewFamily in idsCollated ):
 
-        if ( not flgFound ):
-            ftInputXML.append( deepcopy( newFamily ) )
+            ftInputXML.append( self.CopyElement( newFamily ) )
+            idsCollated.add( idNewFamily )
 
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+#   FamilyTree
+#   Copyright (C) 2015 Elstree Caldwell
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os                               # Operating system
+import sys                              # System functions
+import argparse
+import FamilyTreeSQLite as FTS
+
+
+# Parse the command line
+# ~~~~~~~~~~~~~~~~~~~~~~
+
+parser = argparse.ArgumentParser(description='Convert a family tree between XML and an SQLite database.')
+
+parser.add_argument( '-i', dest='fileIn',       help='Input XML family tree file or SQLite database')
+parser.add_argument( '-o', dest='fileOut',      help='Output SQLite database or XML family tree file')
+
+args = parser.parse_args()
+
+print 'Input family tree file:', args.fileIn
+print 'Output family tree file:', args.fileOut
+
+
+if ( FTS.IsDatabaseFile( args.fileIn ) ):
+
+    # Database to XML
+
+    ftSQLite = FTS.FamilyTreeSQLite( args.fileIn )
+    ftSQLite.ExportXML( args.fileOut )
+
+else:
+
+    # XML to database, the records are added to any already there
+
+    ftSQLite = FTS.FamilyTreeSQLite( args.fileOut )
+    ftSQLite.ImportXML( args.fileIn )
+
+ftSQLite.Close()
@@ -26,6 +26,7 @@ import re                               # Regular expressions
 import csv                              # Easy way to parse files
 import datetime
 import argparse
+import threading
 
 import pydot
 
@@ -40,6 +41,7 @@ from ttk import *
 # from ImageTk import PhotoImage
 
 import FamilyTreeGraph as FTG
+import FamilyTreeSQLite as FTS
 
 import Dialogs
 import FamilyTab
@@ -47,6 +49,19 @@ import FamilyTab
 import pdb
 
 
+# How often, in milliseconds, to check whether a save has finished
+
+SAVE_POLL_MS = 200
+
+# How often, in seconds, to save any changes by default
+
+AUTOSAVE_SECONDS = 60
+
+# The most generations that can be chosen for the subject's tree plots
+
+PLOT_GENERATIONS_MAX = 10
+
+
 # ========================================================================
 # Main GUI Application
 # ========================================================================
@@ -57,7 +72,7 @@ class Application( Frame ):
     #  __init__
     # --------------------------------------------------------------------
 
-    def __init__( self, master, fileInXML, fileOutXML ):
+    def __init__( self, master, fileInXML, fileOutXML, autosave=AUTOSAVE_SECONDS ):
 
         """Initialise the application class"""
 
@@ -68,6 +83,16 @@ class Application( Frame ):
         self.etXML = None
         self.ftXML = None
 
+        # The save running in the background, if any
+
+        self.saveThread = None
+        self.saveError = None
+
+        # Whether the subject and listbox need updating once a batch of
+        # changes is complete
+
+        self.flgUpdateDeferred = False
+
         self.fileInXML = fileInXML
         self.fileOutXML = fileOutXML
 
@@ -95,6 +120,13 @@ class Application( Frame ):
 
         master.bind("<Key>", self.OnKeypress)
 
+        # Save changes periodically, unless autosave is zero
+
+        self.autosaveMS = int( autosave*1000 )
+
+        if ( self.autosaveMS > 0 ):
+            self.after( self.autosaveMS, self.OnAutosave )
+
         self.master.protocol("WM_DELETE_WINDOW", self.OnQuit)
 
         
@@ -117,7 +149,7 @@ class Application( Frame ):
             ftXML = ET.Element( 'FamilyTree' )
 
         if ( etXML is None ):
-            etXML = ET.ElementTree( ftXML )
+            etXML = self.CreateElementTree( ftXML )
 
         if ( ftXML.tag != 'FamilyTree' ):
             ftXML.tag = 'FamilyTree'
@@ -125,7 +157,8 @@ class Application( Frame ):
         eHeader = ftXML.find( 'HEADER' )
 
         if ( eHeader is None ):
-            eHeader = ET.SubElement( ftXML, 'HEADER' )
+            eHeader = ftXML.makeelement( 'HEADER', {} )
+            ftXML.append( eHeader )
 
 
         eDestination = eHeader.find( 'DESTINATION' )
@@ -213,6 +246,225 @@ class Application( Frame ):
         return ( ftXML, etXML )
 
 
+    # --------------------------------------------------------------------
+    #  CreateElementTree()
+    # --------------------------------------------------------------------
+
+    def CreateElementTree(self, ftXML):
+
+        # A tree kept in a database is saved by the database rather than
+        # written out from an ElementTree
+
+        if ( not ET.iselement( ftXML ) ):
+            return None
+
+        return ET.ElementTree( ftXML )
+
+
+    # --------------------------------------------------------------------
+    #  WriteTreeXML()
+    # --------------------------------------------------------------------
+
+    def WriteTreeXML(self, filename):
+
+        # The header is only brought up to date when the whole tree is
+        # written, it isn't one of the records the journal holds
+
+        if ( isinstance( self.ftGraph, FTS.FamilyTreeSQLite ) ):
+
+            self.SetHeader( filename )
+
+            self.ftGraph.Commit()
+            self.ftGraph.MarkSaved()
+
+            if ( os.path.abspath( filename ) != os.path.abspath( self.ftGraph.fileDatabase ) ):
+                self.ftGraph.ExportXML( filename )
+
+        elif ( ( self.ftGraph.IsJournalling( filename ) ) and
+               ( not self.ftGraph.IsJournalDueCompaction() ) ):
+
+            # The changes are already in the journal, they only have to
+            # be marked as saved
+
+            self.ftGraph.SaveJournal()
+            self.ftGraph.MarkSaved()
+
+        else:
+
+            self.SetHeader( filename )
+
+            self.CompactTreeXML( filename )
+
+
+    # --------------------------------------------------------------------
+    #  CompactTreeXML()
+    # --------------------------------------------------------------------
+
+    def CompactTreeXML(self, filename):
+
+        # Write the whole tree, on a thread of its own so that editing can
+        # carry on, from its records as they are now. Changes made while it
+        # is written are carried over into the new journal.
+
+        self.WaitForSave()
+
+        self.fileSaving = filename
+        self.fileSavingTemp = filename + '.tmp'
+        self.saveError = None
+        self.saveSignature = None
+        self.saveChanges = self.ftGraph.nChanges
+        self.saveJournalOffset = self.ftGraph.GetJournalOffset()
+
+        treeTuples = self.ftGraph.GetTreeTuples()
+
+        self.saveThread = threading.Thread( target=self.SaveTreeXMLThread,
+                                            args=( treeTuples, self.fileSavingTemp ) )
+        self.saveThread.start()
+
+        self.master.title( filename + ' (saving...)' )
+
+        self.after( SAVE_POLL_MS, self.CheckSave )
+
+
+    # --------------------------------------------------------------------
+    #  SaveTreeXMLThread()
+    # --------------------------------------------------------------------
+
+    def SaveTreeXMLThread(self, treeTuples, fileTemp):
+
+        # Write to a temporary file, which FinishSave() moves into place
+        # along with its journal, so that the file is never left half
+        # written
+
+        ( tag, attrib ), records = treeTuples
+
+        ftCopy = ET.Element( tag, attrib )
+
+        for record in records:
+            ftCopy.append( self.ftGraph.ConvertTupleToElement( record, ET.Element ) )
+
+        try:
+            with open( fileTemp, 'wb' ) as fileOut:
+
+                ET.ElementTree( ftCopy ).write( fileOut, pretty_print=True )
+
+                fileOut.flush()
+                os.fsync( fileOut.fileno() )
+
+            self.saveSignature = self.ftGraph.GetFileSignature( fileTemp )
+
+        except ( IOError, OSError ) as e:
+            self.saveError = e
+
+
+    # --------------------------------------------------------------------
+    #  CheckSave()
+    # --------------------------------------------------------------------
+
+    def CheckSave(self):
+
+        if ( self.saveThread is None ):
+            return
+
+        if ( self.saveThread.is_alive() ):
+            self.after( SAVE_POLL_MS, self.CheckSave )
+
+        else:
+            self.FinishSave()
+
+
+    # --------------------------------------------------------------------
+    #  WaitForSave()
+    # --------------------------------------------------------------------
+
+    def WaitForSave(self):
+
+        while ( not self.saveThread is None ):
+
+            self.saveThread.join()
+            self.FinishSave()
+
+
+    # --------------------------------------------------------------------
+    #  FinishSave()
+    # --------------------------------------------------------------------
+
+    def FinishSave(self):
+
+        self.saveThread.join()
+        self.saveThread = None
+
+        if ( not self.saveError is None ):
+
+            print 'ERROR: Cannot save tree data to filename:', self.fileSaving, str( self.saveError )
+
+            self.master.title( self.fileSaving + ' (save failed)' )
+            return
+
+        try:
+            self.ftGraph.MoveJournal( self.fileSaving, self.saveJournalOffset,
+                                      self.fileSavingTemp, self.saveSignature )
+
+        except ( IOError, OSError ) as e:
+
+            print 'ERROR: Cannot save tree data to filename:', self.fileSaving, str( e )
+
+            self.master.title( self.fileSaving + ' (save failed)' )
+            return
+
+        self.ftGraph.MarkSaved( self.saveChanges )
+
+        self.master.title( self.fileSaving )
+
+        # Without a journal to carry them over, changes made during the
+        # save have to be saved again
+
+        if ( ( self.saveJournalOffset is None ) and
+             ( self.ftGraph.nChanges != self.saveChanges ) ):
+
+            self.CompactTreeXML( self.fileSaving )
+
+
+    # --------------------------------------------------------------------
+    #  IsTreeSaved()
+    # --------------------------------------------------------------------
+
+    def IsTreeSaved(self, filename):
+
+        # Whether filename already holds the tree as it is
+
+        if ( self.ftGraph.IsDirty() ):
+            return False
+
+        if ( isinstance( self.ftGraph, FTS.FamilyTreeSQLite ) ):
+            return ( os.path.abspath( filename ) == os.path.abspath( self.ftGraph.fileDatabase ) )
+
+        return self.ftGraph.IsJournalling( filename )
+
+
+    # --------------------------------------------------------------------
+    #  OnAutosave()
+    # --------------------------------------------------------------------
+
+    def OnAutosave(self):
+
+        # Save only when there is something to save, and not while a save
+        # is still being written
+
+        filename = self.fileOutXML
+
+        if ( filename is None ):
+            filename = self.fileInXML
+
+        if ( ( not filename is None ) and
+             ( self.saveThread is None ) and
+             ( not self.IsTreeSaved( filename ) ) ):
+
+            self.SaveTreeXML()
+
+        self.after( self.autosaveMS, self.OnAutosave )
+
+
     # --------------------------------------------------------------------
     #  ReadXML()
     # --------------------------------------------------------------------
@@ -221,14 +473,65 @@ class Application( Frame ):
 
         if ( self.fileInXML is not None ):
 
-            parser = ET.XMLParser( remove_blank_text=True )
+            self.ftGraph = self.ReadTreeXML( self.fileInXML )
+
+            self.ftXML = self.ftGraph.ftXML
+            self.etXML = self.CreateElementTree( self.ftXML )
+
+            self.SetHeader( None )
+
+        else:
+
+            self.SetHeader( None )
+
+            self.ftGraph = FTG.FamilyTreeGraph( self.ftXML )
+
+
+    # --------------------------------------------------------------------
+    #  ReadTreeXML()
+    # --------------------------------------------------------------------
+
+    def ReadTreeXML(self, filename):
+
+        # Take the tree's index from its snapshot if it has one that is up
+        # to date, otherwise index the tree as it is parsed and write a new
+        # snapshot
+
+        # An SQLite database is opened in place and its records read as
+        # they are needed
+
+        if ( FTS.IsDatabaseFile( filename ) ):
+            return FTG.FamilyTreeGraphSQLite( filename, moduleET=ET )
+
+        ftGraph = FTG.FamilyTreeGraph( None )
+        ftGraph.ReadFile( filename, None, False, self.IterParseXML, ET.Element, self.ParseXML )
 
-            self.etXML = ET.parse( self.fileInXML, parser )
-            self.ftXML = self.etXML.getroot()
+        # Carry on journalling the changes made since the file was last
+        # saved in full
 
-        self.SetHeader( None )
+        ftGraph.OpenJournal( filename )
 
-        self.ftGraph = FTG.FamilyTreeGraph( self.ftXML )
+        return ftGraph
+
+
+    # --------------------------------------------------------------------
+    #  IterParseXML()
+    # --------------------------------------------------------------------
+
+    def IterParseXML(self, source, events):
+
+        return ET.iterparse( source, events=events, remove_blank_text=True )
+
+
+    # --------------------------------------------------------------------
+    #  ParseXML()
+    # --------------------------------------------------------------------
+
+    def ParseXML(self, source):
+
+        parser = ET.XMLParser( remove_blank_text=True )
+
+        return ET.parse( source, parser ).getroot()
 
 
     # --------------------------------------------------------------------
@@ -242,12 +545,14 @@ class Application( Frame ):
 
         if ( self.fileOutXML is not None ):
 
-            print 'Saving tree data to filename:', self.fileOutXML
+            if ( not self.IsTreeSaved( self.fileOutXML ) ):
 
-            self.SetHeader( self.fileOutXML )
-            self.etXML.write( self.fileOutXML, pretty_print=True )
+                print 'Saving tree data to filename:', self.fileOutXML
 
-        else:
+                self.WriteTreeXML( self.fileOutXML )
+
+        elif ( ( self.fileInXML is None ) or
+               ( not self.IsTreeSaved( self.fileInXML ) ) ):
 
             flgSaved = False
 
@@ -259,6 +564,13 @@ class Application( Frame ):
                                                 "Are you sure you want to quit without saving your data?") ) ):
                  return
 
+        self.WaitForSave()
+
+        # Changes the user chose not to save mustn't be replayed when the
+        # file is next opened
+
+        self.ftGraph.DiscardJournal()
+
         self.quit()
 
              
@@ -328,6 +640,7 @@ class Application( Frame ):
 
         fileMenu.add_command( label="Save", underline=0, command=self.SaveTreeXML )
         fileMenu.add_command( label="SaveAs", underline=0, command=self.SaveAsTreeXML )
+        fileMenu.add_command( label="Compact", underline=0, command=self.OnCompactTreeXML )
 
         fileMenu.add_separator()
 
@@ -350,6 +663,19 @@ class Application( Frame ):
         menubar.add_cascade(label="File", underline=0, menu=fileMenu)
 
 
+        # The Edit Menu
+
+        editMenu = Menu(menubar)
+
+        editMenu.add_command( label="Undo", underline=0, accelerator="Ctrl+Z", command=self.OnUndo )
+        editMenu.add_command( label="Redo", underline=0, accelerator="Ctrl+Y", command=self.OnRedo )
+
+        menubar.add_cascade(label="Edit", underline=0, menu=editMenu)
+
+        self.master.bind( "<Control-z>", self.OnUndo )
+        self.master.bind( "<Control-y>", self.OnRedo )
+
+
         # The Plot Menu
 
         plotMenu = Menu(menubar)
@@ -369,6 +695,26 @@ class Application( Frame ):
         plotMenu.add_command( label="Plot Tree of Subject's Descendents",
                               underline=0, command=self.OnPlotDescendents )
 
+        plotMenu.add_separator()
+
+        # How many generations the subject's trees go up and down
+
+        self.varGenerationsUp = StringVar()
+        self.varGenerationsUp.set( 'All' )
+
+        self.varGenerationsDown = StringVar()
+        self.varGenerationsDown.set( 'All' )
+
+        for label, varGenerations in ( ( "Generations Up", self.varGenerationsUp ),
+                                       ( "Generations Down", self.varGenerationsDown ) ):
+
+            generationsMenu = Menu(plotMenu)
+
+            for value in [ 'All' ] + [ str( n ) for n in range( 1, PLOT_GENERATIONS_MAX + 1 ) ]:
+                generationsMenu.add_radiobutton( label=value, value=value, variable=varGenerations )
+
+            plotMenu.add_cascade( label=label, menu=generationsMenu )
+
         menubar.add_cascade(label="Plot", underline=0, menu=plotMenu)
 
 
@@ -413,7 +759,7 @@ class Application( Frame ):
         iRow = iRow + nRows + 2
 
         # SearchSubjects
-        self.labelSearch = Label(self, text='Subject Search')
+        self.labelSearch = Label(self, text='Subject Search (~ sounds like)')
         self.labelSearch.grid(row=iRow, column=iCol, columnspan=2, sticky=N+S)
 
         iRow = iRow + 1
@@ -810,12 +1156,8 @@ class Application( Frame ):
 
         idx = sender.curselection()
 
-        try:
-            value = sender.get(idx)
-            self.ChangeSubject( re.search( 'I\d\d\d$', value ).group( 0 ) )
-
-        except TclError:
-            pass
+        if ( len( idx ) > 0 ):
+            self.ChangeSubject( self.subjectListboxIDs[ int( idx[0] ) ] )
 
     # --------------------------------------------------------------------
     # OnAddFather
@@ -829,31 +1171,31 @@ class Application( Frame ):
                                          [ '***  New Individual ***' ],
                                          'M', [ self.idIndividual ] )
 
-        # Create a new father?
-
         if ( self.idSelectedFather is None ):
 
             return
 
-        elif ( self.idSelectedFather == '***  New Individual ***' ):
+        # Adding the father is one change
 
-            self.idSelectedFather = self.GetNewIndividual()
-            theFather = self.ftGraph.GetIndividual( self.idSelectedFather )
+        with self.ftGraph.Batch():
 
-            theIndividual = self.ftGraph.GetIndividual( self.idIndividual )
-            surname = theIndividual.findtext('NAME/surname')
+            # Create a new father?
 
-            if ( ( not surname is None ) and ( len( surname ) > 0 ) ):
-                self.ftGraph.SetLastName( self.idSelectedFather, surname )
+            if ( self.idSelectedFather == '***  New Individual ***' ):
 
-        else:
+                self.idSelectedFather = self.GetNewIndividual()
+                theFather = self.ftGraph.GetIndividual( self.idSelectedFather )
+
+                theIndividual = self.ftGraph.GetIndividual( self.idIndividual )
+                surname = theIndividual.findtext('NAME/surname')
 
-            self.idSelectedFather = re.search( 'I\d\d\d$', self.idSelectedFather ).group( 0 )
+                if ( ( not surname is None ) and ( len( surname ) > 0 ) ):
+                    self.ftGraph.SetLastName( self.idSelectedFather, surname )
 
-        # Set the father
+            # Set the father
 
-        self.ftGraph.SetSex( self.idSelectedFather, 'M' )
-        self.ftGraph.SetFather( self.idIndividual, self.idSelectedFather )
+            self.ftGraph.SetSex( self.idSelectedFather, 'M' )
+            self.ftGraph.SetFather( self.idIndividual, self.idSelectedFather )
 
         self.UpdateSelectedSubject()
 
@@ -862,23 +1204,16 @@ class Application( Frame ):
     # OnSelectedFather
     # --------------------------------------------------------------------
 
-    def OnSelectedFather(self, val):
+    def OnSelectedFather(self, idSelected):
 
-        # If val is None then this means there were non individuals to
+        # If idSelected is None then this means there were non individuals to
         # choose from so a new one should be created
 
-        if ( val is None ):
+        if ( idSelected is None ):
             self.idSelectedFather = '***  New Individual ***'
 
         else:
-            sender = val.widget
-            idx = sender.curselection()
-
-            try:
-                self.idSelectedFather = sender.get(idx)
-
-            except TclError:
-                pass
+            self.idSelectedFather = idSelected
 
 
     # --------------------------------------------------------------------
@@ -915,24 +1250,24 @@ class Application( Frame ):
                                  [ '***  New Individual ***' ],
                                  'F', [ self.idIndividual ] )
 
-        # Create a new mother?
-
         if ( self.idSelectedMother is None ):
 
             return
 
-        elif ( self.idSelectedMother == '***  New Individual ***' ):
+        # Adding the mother is one change
 
-            self.idSelectedMother = self.GetNewIndividual()
+        with self.ftGraph.Batch():
 
-        else:
+            # Create a new mother?
 
-            self.idSelectedMother = re.search( 'I\d\d\d$', self.idSelectedMother ).group( 0 )
+            if ( self.idSelectedMother == '***  New Individual ***' ):
 
-        # Set the mother
+                self.idSelectedMother = self.GetNewIndividual()
 
-        self.ftGraph.SetSex( self.idSelectedMother, 'F' )
-        self.ftGraph.SetMother( self.idIndividual, self.idSelectedMother )
+            # Set the mother
+
+            self.ftGraph.SetSex( self.idSelectedMother, 'F' )
+            self.ftGraph.SetMother( self.idIndividual, self.idSelectedMother )
 
         self.UpdateSelectedSubject()
 
@@ -942,23 +1277,16 @@ class Application( Frame ):
     # OnSelectedMother
     # --------------------------------------------------------------------
 
-    def OnSelectedMother(self, val):
+    def OnSelectedMother(self, idSelected):
 
-        # If val is None then this means there were non individuals to
+        # If idSelected is None then this means there were non individuals to
         # choose from so a new one should be created
 
-        if ( val is None ):
+        if ( idSelected is None ):
             self.idSelectedMother = '***  New Individual ***'
 
         else:
-            sender = val.widget
-            idx = sender.curselection()
-
-            try:
-                self.idSelectedMother = sender.get(idx)
-
-            except TclError:
-                pass
+            self.idSelectedMother = idSelected
 
 
     # --------------------------------------------------------------------
@@ -1031,6 +1359,10 @@ class Application( Frame ):
 
     def UpdateSelectedSubject(self):
 
+        if ( self.ftGraph.IsBatching() ):
+            self.flgUpdateDeferred = True
+            return
+
         theIndividual = self.ftGraph.GetIndividual( self.idIndividual )
 
         self.InitialiseSelectedSubject()
@@ -1042,6 +1374,11 @@ class Application( Frame ):
 
         self.UpdateFamily()
 
+        if ( self.flgUpdateDeferred ):
+
+            self.flgUpdateDeferred = False
+            self.UpdateSubjectListboxItems( True )
+
 
     # --------------------------------------------------------------------
     # UpdateSubjectNote
@@ -1106,46 +1443,46 @@ class Application( Frame ):
 
     def UpdateSubjectListboxItems(self, flgActivateSelectedIndividual):
 
+        if ( self.ftGraph.IsBatching() ):
+            self.flgUpdateDeferred = True
+            return
+
         strSearch = self.varSelectedSearch.get()
 
         self.SubjectListbox.delete( 0, END )
 
         theIndividual = self.ftGraph.GetIndividual( self.idIndividual )
 
+        # Only the individuals the search finds are looked at, so typing
+        # in the search box doesn't go through the whole tree
+
+        if ( len( strSearch.split() ) != 0 ):
+            individuals = [ self.ftGraph.GetIndividualWithID( idIndi )
+                            for idIndi in self.ftGraph.GetIDsMatching( strSearch ) ]
+        else:
+            individuals = self.ftGraph.GetIndividuals()
+
         labels = []
-        theLabel  = None
-        for individual in self.ftGraph.GetIndividuals():
+        for individual in individuals:
 
             label = self.ftGraph.GetLabel( individual )
-            
-            if ( len( strSearch ) != 0 ):
-                flgFound = True
 
-                for searchTerm in strSearch.split():
-                    if ( not searchTerm.lower() in label.lower() ):
-                        flgFound = False
-            else:
-                flgFound = True
+            labels.append( ( label, individual.attrib['id'] ) )
 
-            if ( flgFound ):
-                labels.append( label )
+        labels = sorted( labels )
 
-            if ( individual == theIndividual ):
-                theLabel = label
+        # The IDs of the subjects in listbox row order
 
-        labels = sorted( labels )
+        self.subjectListboxIDs = [ idIndi for label, idIndi in labels ]
 
-        index = None
-        for label in labels:
-            self.SubjectListbox.insert( END, label )
+        self.SubjectListbox.insert( END, *[ label for label, idIndi in labels ] )
 
-            if ( flgActivateSelectedIndividual and ( label == theLabel ) ):
+        if ( flgActivateSelectedIndividual and ( self.idIndividual in self.subjectListboxIDs ) ):
 
-                self.SubjectListbox.selection_clear( 0, END )
-                self.SubjectListbox.selection_set( END )
-                index = self.SubjectListbox.curselection()
+            index = self.subjectListboxIDs.index( self.idIndividual )
 
-        if ( index is not None ):
+            self.SubjectListbox.selection_clear( 0, END )
+            self.SubjectListbox.selection_set( index )
             self.SubjectListbox.activate( index )
             self.SubjectListbox.see( index )
 
@@ -1195,7 +1532,7 @@ class Application( Frame ):
                 familyTab = FamilyTab.FamilyTab( self.master, self.notebookFamilies,
                                                  self.ftGraph,
                                                  self.idIndividual, idFamily, self.familyColumn,
-                                                 self.OnSubjectListboxSelect, self.GetNewIndividual,
+                                                 self.GetNewIndividual,
                                                  self.UpdateSelectedSubject, self.ChangeSubject )
 
                 self.FamilyTabs[ idFamily ] = familyTab
@@ -1353,6 +1690,15 @@ class Application( Frame ):
 
         note = self.textSubjectNote.get(1.0, END)
 
+        # The text box adds a newline to the note it shows stripped, so
+        # only a note that has actually been edited is copied
+
+        theIndividual = self.ftGraph.GetIndividual( self.idIndividual )
+
+        if ( ( not theIndividual is None ) and
+             ( note.rstrip() == ( theIndividual.findtext('NOTE') or '' ).rstrip() ) ):
+            return
+
         self.ftGraph.SetSubjectNote( self.idIndividual, note )
 
 
@@ -1364,6 +1710,13 @@ class Application( Frame ):
 
         note = self.FamilyTabs[ self.idSelectedFamilySpouse ].textFamilyNote.get(1.0, END)
 
+        theIndividual = self.ftGraph.GetIndividual( self.idIndividual )
+        theFamily = self.ftGraph.GetFamily( theIndividual, self.idSelectedFamilySpouse )
+
+        if ( ( not theFamily is None ) and
+             ( note.rstrip() == ( theFamily.findtext('NOTE') or '' ).rstrip() ) ):
+            return
+
         self.ftGraph.SetFamilyNote( self.idIndividual, self.idSelectedFamilySpouse, note )
 
 
@@ -1440,9 +1793,13 @@ class Application( Frame ):
 
     def OnFamilyChanged(self, event):
 
-        tabText = self.notebookFamilies.tab( self.notebookFamilies.index("current"), "text" )
-        self.idSelectedFamilySpouse = re.search( 'F\d\d\d$', tabText ).group( 0 )
-        
+        tabCurrent = self.notebookFamilies.select()
+
+        for idFamily, familyTab in self.FamilyTabs.items():
+
+            if ( str( familyTab.familyFrame ) == tabCurrent ):
+                self.idSelectedFamilySpouse = idFamily
+
         self.FamilyTabs[ self.idSelectedFamilySpouse ].UpdateChildrenListboxItems()
         self.FamilyTabs[ self.idSelectedFamilySpouse ].UpdateSpouseButtonAdd()
         self.FamilyTabs[ self.idSelectedFamilySpouse ].UpdateFamilyNote()
@@ -1517,9 +1874,16 @@ class Application( Frame ):
             self.idIndividual = None
             self.idSelectedFamilySpouse = None
 
+            # The tree being closed is not saved, as before, so neither
+            # are the changes in its journal
 
-            self.ftXML = ET.parse( filename ).getroot()
-            self.ftGraph = FTG.FamilyTreeGraph( self.ftXML )
+            self.WaitForSave()
+            self.ftGraph.DiscardJournal()
+
+            self.ftGraph = self.ReadTreeXML( filename )
+
+            self.ftXML = self.ftGraph.ftXML
+            self.etXML = self.CreateElementTree( self.ftXML )
 
             theIndividual = self.ftGraph.GetIndividual( self.idIndividual )
 
@@ -1536,6 +1900,77 @@ class Application( Frame ):
             self.master.title( self.fileInXML )
 
 
+    # --------------------------------------------------------------------
+    # OnUndo
+    # --------------------------------------------------------------------
+
+    def OnUndo( self, event=None ):
+
+        # A note being typed is a change to undo too
+
+        self.CopySubjectNoteTextToXML()
+        self.CopyFamilyNoteTextToXML()
+
+        if ( self.ftGraph.Undo() ):
+            self.UpdateAfterUndo()
+
+
+    # --------------------------------------------------------------------
+    # OnRedo
+    # --------------------------------------------------------------------
+
+    def OnRedo( self, event=None ):
+
+        self.CopySubjectNoteTextToXML()
+        self.CopyFamilyNoteTextToXML()
+
+        if ( self.ftGraph.Redo() ):
+            self.UpdateAfterUndo()
+
+
+    # --------------------------------------------------------------------
+    # UpdateAfterUndo
+    # --------------------------------------------------------------------
+
+    def UpdateAfterUndo( self ):
+
+        # The subject may have been one of the records put back
+
+        if ( self.ftGraph.GetIndividual( self.idIndividual ) is None ):
+
+            theIndividual = self.ftGraph.GetIndividual( None )
+
+            if ( theIndividual is None ):
+                theIndividual = self.ftGraph.CreateIndividual()
+
+            self.idIndividual = self.ftGraph.GetIndividualID( theIndividual )
+            self.idSelectedFamilySpouse = None
+
+        self.UpdateSelectedSubject()
+        self.UpdateSubjectListboxItems( True )
+
+
+    # --------------------------------------------------------------------
+    # OnCompactTreeXML
+    # --------------------------------------------------------------------
+
+    def OnCompactTreeXML( self ):
+
+        filename = self.ftGraph.fileJournalled
+
+        if ( filename is None ):
+
+            self.SaveTreeXML()
+
+        else:
+
+            print 'Compacting tree data to filename:', filename
+
+            self.SetHeader( filename )
+
+            self.CompactTreeXML( filename )
+
+
     # --------------------------------------------------------------------
     # SaveTreeXML
     # --------------------------------------------------------------------
@@ -1546,9 +1981,7 @@ class Application( Frame ):
 
             print 'Saving tree data to filename:', self.fileOutXML
 
-            self.SetHeader( self.fileOutXML )
-
-            self.etXML.write( self.fileOutXML, pretty_print=True )
+            self.WriteTreeXML( self.fileOutXML )
 
         elif ( self.fileInXML is None ):
 
@@ -1558,9 +1991,7 @@ class Application( Frame ):
 
             print 'Saving tree data to filename:', self.fileInXML
 
-            self.SetHeader( self.fileInXML )
-
-            self.etXML.write( self.fileInXML, pretty_print=True )
+            self.WriteTreeXML( self.fileInXML )
 
 
     # --------------------------------------------------------------------
@@ -1586,19 +2017,29 @@ class Application( Frame ):
         if ( ( not filename is None ) and ( len( filename ) > 0 ) ):
             print 'Saving tree data to filename:', filename
 
-            self.SetHeader( filename )
-
-            self.etXML.write( filename, pretty_print=True )
-
             self.fileOutXML = filename
             
             self.master.title( self.fileOutXML )
 
+            self.WriteTreeXML( filename )
+
             return True
 
         return False
 
 
+    # --------------------------------------------------------------------
+    # GetGenerations
+    # --------------------------------------------------------------------
+
+    def GetGenerations( self, varGenerations ):
+
+        if ( varGenerations.get() == 'All' ):
+            return None
+
+        return int( varGenerations.get() )
+
+
     # --------------------------------------------------------------------
     # OnPlotEntireTree
     # --------------------------------------------------------------------
@@ -1685,7 +2126,8 @@ class Application( Frame ):
             print 'Saving ancestors tree plot to filename:', filename
 
             self.ftGraph.SetIndividual( self.idIndividual )
-            graph = self.ftGraph.PlotSubjectTree()
+            graph = self.ftGraph.PlotSubjectTree( self.GetGenerations( self.varGenerationsUp ),
+                                                  self.GetGenerations( self.varGenerationsDown ) )
             graph.write_png( filename )
 
 
@@ -1717,7 +2159,7 @@ class Application( Frame ):
             print 'Saving ancestors tree plot to filename:', filename
 
             self.ftGraph.SetIndividual( self.idIndividual )
-            graph = self.ftGraph.PlotAncestorsTree()
+            graph = self.ftGraph.PlotAncestorsTree( self.GetGenerations( self.varGenerationsUp ) )
             graph.write_png( filename )
 
 
@@ -1747,7 +2189,7 @@ class Application( Frame ):
             print 'Saving descendents tree plot to filename:', filename
 
             self.ftGraph.SetIndividual( self.idIndividual )
-            graph = self.ftGraph.PlotDescendentsTree()
+            graph = self.ftGraph.PlotDescendentsTree( self.GetGenerations( self.varGenerationsDown ) )
             graph.write_png( filename )
 
 
@@ -1812,10 +2254,12 @@ class Application( Frame ):
             self.ftGraph.SetIndividual( self.idIndividual )
 
             idAncestors = self.ftGraph.GetSubjectsAncestors( self.idIndividual )
-    
+
+            idsCollated = self.ftGraph.GetCollatedIDs( ftNewXML )
+
             for idAncestor in idAncestors:
 
-                self.ftGraph.CollateSubjectsDescendents( ftNewXML, idAncestor, True )
+                self.ftGraph.CollateSubjectsDescendents( ftNewXML, idAncestor, True, idsCollated )
         
             etNewXML.write( filename, pretty_print=True )
           
@@ -1976,6 +2420,9 @@ parser = argparse.ArgumentParser(description='Family tree processing.')
 parser.add_argument( '-i', dest='fileIn',  help='Input XML family tree file')
 parser.add_argument( '-o', dest='fileOut', help='Output XML family tree file')
 
+parser.add_argument( '-autosave', dest='autosave', type=float, default=AUTOSAVE_SECONDS,
+                     help='Seconds between saves of any changes, or 0 not to autosave')
+
 args = parser.parse_args()
 
 
@@ -1993,7 +2440,7 @@ root.title( 'Family Tree Editor' )
 
 #root.geometry('{}x{}'.format(1200, 900))
 
-app = Application( root, args.fileIn, args.fileOut )
+app = Application( root, args.fileIn, args.fileOut, args.autosave )
 app.mainloop()
 root.destroy()
 
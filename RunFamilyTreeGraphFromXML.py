@@ -26,9 +26,34 @@ import re                               # Regular expressions
 import csv                              # Easy way to parse files
 import datetime
 import argparse
+import subprocess
+import multiprocessing
 import pydot
 import xml.etree.ElementTree as ET
 import FamilyTreeGraph as FTG
+import FamilyTreeSQLite as FTS
+
+from multiprocessing.pool import ThreadPool
+
+
+
+# Lay out a DOT file with graphviz
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+def RenderDOT( fileDOT, fileImage ):
+
+    # The time taken and any error, so that one failure doesn't stop a batch
+
+    timeStart = time.time()
+    error = None
+
+    try:
+        subprocess.check_call( [ 'dot', '-Tgif', '-o', fileImage, fileDOT ] )
+
+    except ( OSError, subprocess.CalledProcessError ) as e:
+        error = str( e )
+
+    return ( time.time() - timeStart, error )
 
 
 
@@ -39,7 +64,7 @@ parser = argparse.ArgumentParser(description='Family tree processing.')
 
 parser.add_argument('-id', dest='idIndividual', help='A specific ID to plot ancestors and descendents for')
 
-parser.add_argument( '-i', dest='fileIn',       help='Input XML family tree file')
+parser.add_argument( '-i', dest='fileIn',       help='Input XML family tree file or SQLite database')
 parser.add_argument( '-o', dest='fileOut',      help='Output family tree image')
 
 parser.add_argument( '-ancestors', dest='ancestors',
@@ -47,11 +72,28 @@ parser.add_argument( '-ancestors', dest='ancestors',
 parser.add_argument( '-descendents', dest='descendents',
                      help='Plot descendents of an individual', action='store_true')
 
+parser.add_argument( '-generations-up', dest='generationsUp', type=int,
+                     help='The number of generations of ancestors to plot (default all)')
+parser.add_argument( '-generations-down', dest='generationsDown', type=int,
+                     help='The number of generations of descendents to plot (default all)')
+
+parser.add_argument( '-stream', dest='stream',
+                     help='Write the DOT file as the tree is plotted, without pydot', action='store_true')
+
+parser.add_argument( '-batch', dest='batch',
+                     help='Plot each of these IDs, comma separated, listed in a file or "all", to <output>_<id>')
+parser.add_argument( '-jobs', dest='jobs', type=int, default=multiprocessing.cpu_count(),
+                     help='The number of graphviz layouts to run at once in a batch (default the number of cores)')
+
 parser.set_defaults( descendents=False )
 parser.set_defaults( ancestors=False )
+parser.set_defaults( stream=False )
 
 args = parser.parse_args()
 
+if ( ( not args.batch is None ) and ( args.fileOut is None ) ):
+    parser.error( '-batch needs -o for the output file names' )
+
 print 'Individual ID:', args.idIndividual
 
 print 'Input XML family tree file:', args.fileIn
@@ -59,20 +101,152 @@ print 'Output family tree image:', args.fileOut
 
 print 'Ancestors?:', args.ancestors
 print 'Descendents?:', args.descendents
+print 'Generations up:', args.generationsUp
+print 'Generations down:', args.generationsDown
+print 'Stream?:', args.stream
+print 'Batch:', args.batch
+
+
+if ( FTS.IsDatabaseFile( args.fileIn ) ):
+
+    # A database is read a record at a time as the plot asks for them
+
+    ftGraph = FTG.FamilyTreeGraphSQLite( args.fileIn,
+                                         args.idIndividual,
+                                         args.ancestors,
+                                         args.descendents,
+                                         args.generationsUp,
+                                         args.generationsDown )
+
+else:
+
+    ftGraph = FTG.FamilyTreeGraph( None,
+                                   args.idIndividual,
+                                   args.ancestors,
+                                   args.descendents,
+                                   args.generationsUp,
+                                   args.generationsDown )
+
+    # Plotting only reads the tree, so it can be held compactly
+
+    ftGraph.SetCompact( True )
+
+    if ( ( args.idIndividual is None ) or ( not args.batch is None ) ):
+
+        ftGraph.ReadFile( args.fileIn )
+
+    else:
+
+        # Read the file twice, first to index who is related to whom and
+        # then to keep only the records this individual's plot needs. Both
+        # come from the snapshot next to the file when it is up to date.
+
+        ftIndex = FTG.FamilyTreeGraph( None )
+        ftIndex.SetCompact( True )
+        ftIndex.ReadFile( args.fileIn, None, True )
+
+        idsRetained = ftIndex.GetSubjectsRecordIDs( args.idIndividual,
+                                                    args.ancestors,
+                                                    args.descendents,
+                                                    args.generationsUp,
+                                                    args.generationsDown )
+        del ftIndex
+
+        ftGraph.ReadFile( args.fileIn, idsRetained )
+
+if ( not args.batch is None ):
+
+    # Plot each subject from the one copy of the tree, writing their DOT
+    # files here while graphviz lays out the ones already written
+
+    if ( args.batch == 'all' ):
+        idsBatch = sorted( ftGraph.individualsByID.keys() )
+
+    elif ( os.path.isfile( args.batch ) ):
+        idsBatch = open( args.batch ).read().split()
+
+    else:
+        idsBatch = [ idIndi for idIndi in args.batch.split( ',' ) if idIndi ]
+
+    print 'Plotting', len( idsBatch ), 'subjects,', args.jobs, 'at once'
+
+    timeStart = time.time()
+
+    pool = ThreadPool( args.jobs )
+
+    jobs = []
+    failures = []
+
+    for idIndi in idsBatch:
+
+        fileDOT = '{:s}_{:s}.dot'.format( args.fileOut, idIndi )
+        fileImage = '{:s}_{:s}.gif'.format( args.fileOut, idIndi )
+
+        timePlot = time.time()
+
+        try:
+            with open( fileDOT, 'w' ) as fileOutDOT:
+
+                ftGraph.SetIndividual( idIndi )
+                ftGraph.SetDotFile( fileOutDOT )
+                ftGraph.GetGraph()
+
+        except Exception as e:
+            failures.append( idIndi )
+            print 'FAILED:', idIndi, 'plot:', e
+
+            # The DOT file may never have been opened
+
+            if ( os.path.exists( fileDOT ) ):
+                os.remove( fileDOT )
+
+            continue
+
+        timePlot = time.time() - timePlot
+
+        jobs.append( ( idIndi, timePlot, pool.apply_async( RenderDOT, ( fileDOT, fileImage ) ) ) )
+
+    pool.close()
+
+    for idIndi, timePlot, job in jobs:
+
+        timeLayout, error = job.get()
+
+        if ( error is None ):
+            print '{:s}: plot {:.3f}s, layout {:.3f}s'.format( idIndi, timePlot, timeLayout )
+        else:
+            failures.append( idIndi )
+            print 'FAILED:', idIndi, 'layout:', error
+
+    pool.join()
+
+    print '\nPlotted {:d} of {:d} subjects in {:.1f}s'.format( len( idsBatch ) - len( failures ),
+                                                              len( idsBatch ),
+                                                              time.time() - timeStart )
+
+    if ( len( failures ) > 0 ):
+        print 'FAILED:', ' '.join( failures )
+        sys.exit( 1 )
+
+elif ( args.stream and ( args.fileOut is not None ) ):
+
+    # Write the DOT file directly and lay it out with graphviz
+
+    fileDOT = open( args.fileOut + '.dot', 'w' )
+
+    ftGraph.SetDotFile( fileDOT )
+    ftGraph.GetGraph()
 
+    fileDOT.close()
 
-ft = ET.parse( args.fileIn ).getroot()
+    subprocess.check_call( [ 'dot', '-Tgif', '-o', args.fileOut + '.gif', args.fileOut + '.dot' ] )
 
+else:
 
-ftGraph = FTG.FamilyTreeGraph( ft,
-                               args.idIndividual,
-                               args.ancestors,
-                               args.descendents )
+    graph = ftGraph.GetGraph()
 
-graph = ftGraph.GetGraph()
 
+    if ( args.fileOut is not None ):
 
-if ( args.fileOut is not None ):
-      
-    graph.write_gif( args.fileOut + '.gif' )
-    graph.write( args.fileOut + '.dot' )
+        graph.write_gif( args.fileOut + '.gif' )
+        graph.write( args.fileOut + '.dot' )
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+#   FamilyTree
+#   Copyright (C) 2015 Elstree Caldwell
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import StringIO
+import unittest
+import xml.etree.ElementTree as ET
+
+from copy import deepcopy
+
+import pydot
+
+import FamilyTreeGraph as FTG
+
+from TestFamilyTreeXML import FILE_EXAMPLE, XML_PEDIGREE_COLLAPSE
+
+
+# ------------------------------------------------------------------------
+def GetIndividualID( name ):
+
+    # Nodes are named by ID when written as DOT, and by label, which
+    # starts with the ID, when built with pydot
+
+    return name.strip( '"' ).split( '\\n' )[0]
+
+
+# ------------------------------------------------------------------------
+def ParseGraph( dot ):
+
+    # The label of each individual in DOT text by ID, the IDs of the nodes
+    # in the graph and in each subgraph, of a couple, and its edges as
+    # ( ID, ID ), with any repeats kept
+
+    graph = pydot.graph_from_dot_data( dot )
+
+    if ( isinstance( graph, list ) ):
+        graph = graph[0]
+
+    graphs = [ [ ( node.get_name(), node.get( 'label' ) ) for node in subgraph.get_nodes()
+                 if ( not node.get_name() in [ 'node', 'edge', 'graph' ] ) ]
+               for subgraph in [ graph ] + graph.get_subgraphs() ]
+
+    edges = [ ( edge.get_source(), edge.get_destination() ) for edge in graph.get_edges() ]
+
+    # pydot names a node by its label, which edges refer to it by too
+
+    labels = {}
+
+    nodes = [ node for subgraph in graphs for node in subgraph ]
+
+    for name, label in nodes + [ ( name, None ) for edge in edges for name in edge ]:
+
+        idIndi = GetIndividualID( name )
+
+        if ( ( label is None ) and ( name.strip( '"' ) != idIndi ) ):
+            label = name
+
+        if ( not label is None ):
+            labels[ idIndi ] = label.strip( '"' )
+
+        elif ( not idIndi in labels ):
+            labels[ idIndi ] = None
+
+    return ( labels,
+             [ [ GetIndividualID( name ) for name, label in subgraph ] for subgraph in graphs ],
+             [ ( GetIndividualID( idFrom ), GetIndividualID( idTo ) ) for idFrom, idTo in edges ] )
+
+
+# ========================================================================
+# Checks the individuals and relationships plotted for a subject
+# ========================================================================
+
+class TestFamilyTreeGraph( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  Plot
+    # --------------------------------------------------------------------
+
+    def Plot( self, xmlFamilyTree, idIndividual, flgDotWriter=False, **kwargs ):
+
+        # Plot the subject, with pydot or written straight to DOT, and
+        # return the DOT
+
+        ftGraph = FTG.FamilyTreeGraph( xmlFamilyTree, idIndividual, **kwargs )
+
+        if ( not flgDotWriter ):
+            return ftGraph.GetGraph().to_string()
+
+        fileDOT = StringIO.StringIO()
+
+        ftGraph.SetDotFile( fileDOT )
+        ftGraph.GetGraph()
+
+        return fileDOT.getvalue()
+
+
+    # --------------------------------------------------------------------
+    #  testAncestors
+    # --------------------------------------------------------------------
+
+    def testAncestors( self ):
+
+        for flgDotWriter in [ False, True ]:
+
+            dot = self.Plot( ET.fromstring( XML_PEDIGREE_COLLAPSE ), 'I001',
+                             flgDotWriter, ancestors=True )
+
+            labels, graphs, edges = ParseGraph( dot )
+
+            # Each mother has an edge to her children and each husband to
+            # his wife
+
+            self.assertEqual( set( labels ), set( [ 'I001', 'I002', 'I003', 'I004',
+                                                    'I005', 'I006', 'I007' ] ) )
+
+            self.assertEqual( set( edges ), set( [ ( 'I003', 'I001' ), ( 'I002', 'I003' ),
+                                                   ( 'I007', 'I003' ), ( 'I006', 'I007' ),
+                                                   ( 'I005', 'I006' ), ( 'I005', 'I002' ),
+                                                   ( 'I004', 'I005' ) ] ) )
+
+
+    # --------------------------------------------------------------------
+    #  testPlottedOnce
+    # --------------------------------------------------------------------
+
+    def testPlottedOnce( self ):
+
+        # I001 descends from I004 and I005 by both of its parents, and
+        # the Tudors marry cousins
+
+        plots = [ ( ET.fromstring( XML_PEDIGREE_COLLAPSE ), 'I004', { 'descendents': True } ),
+                  ( ET.fromstring( XML_PEDIGREE_COLLAPSE ), 'I001', { 'ancestors': True,
+                                                                      'descendents': True } ),
+                  ( ET.parse( FILE_EXAMPLE ).getroot(), 'I042', { 'ancestors': True,
+                                                                  'descendents': True } ) ]
+
+        for xmlFamilyTree, idIndividual, kwargs in plots:
+            for flgDotWriter in [ False, True ]:
+
+                dot = self.Plot( deepcopy( xmlFamilyTree ), idIndividual, flgDotWriter, **kwargs )
+
+                labels, graphs, edges = ParseGraph( dot )
+
+                # Each individual is in the graph and in their couples'
+                # subgraphs once, each couple has a single subgraph and
+                # each edge is plotted once
+
+                for nodes in graphs:
+                    self.assertEqual( len( nodes ), len( set( nodes ) ) )
+
+                couples = [ frozenset( nodes ) for nodes in graphs[1:] ]
+
+                self.assertEqual( len( couples ), len( set( couples ) ) )
+                self.assertEqual( len( edges ), len( set( edges ) ) )
+
+                self.assertTrue( len( edges ) > 0 )
+
+
+
+    # --------------------------------------------------------------------
+    #  testGenerations
+    # --------------------------------------------------------------------
+
+    def testGenerations( self ):
+
+        for flgDotWriter in [ False, True ]:
+
+            dot = self.Plot( ET.fromstring( XML_PEDIGREE_COLLAPSE ), 'I001',
+                             flgDotWriter, ancestors=True, generationsUp=1 )
+
+            labels, graphs, edges = ParseGraph( dot )
+
+            self.assertEqual( set( labels ), set( [ 'I001', 'I002', 'I003' ] ) )
+            self.assertEqual( set( edges ), set( [ ( 'I003', 'I001' ), ( 'I002', 'I003' ) ] ) )
+
+            # The grandparents are two generations up through the father,
+            # but the grandfather's parents are past the limit
+
+            dot = self.Plot( ET.fromstring( XML_PEDIGREE_COLLAPSE ), 'I001',
+                             flgDotWriter, ancestors=True, generationsUp=2 )
+
+            labels, graphs, edges = ParseGraph( dot )
+
+            self.assertEqual( set( labels ), set( [ 'I001', 'I002', 'I003', 'I004',
+                                                    'I005', 'I006', 'I007' ] ) )
+            self.assertFalse( ( 'I005', 'I006' ) in edges )
+
+            dot = self.Plot( ET.fromstring( XML_PEDIGREE_COLLAPSE ), 'I004',
+                             flgDotWriter, descendents=True, generationsDown=1 )
+
+            labels, graphs, edges = ParseGraph( dot )
+
+            self.assertEqual( set( labels ), set( [ 'I004', 'I005', 'I006', 'I002' ] ) )
+            self.assertEqual( set( edges ), set( [ ( 'I004', 'I005' ), ( 'I005', 'I006' ),
+                                                   ( 'I005', 'I002' ) ] ) )
+
+
+
+    # --------------------------------------------------------------------
+    #  testDotWriter
+    # --------------------------------------------------------------------
+
+    def testDotWriter( self ):
+
+        # Writing DOT directly plots the same individuals, with the same
+        # labels, couples and edges as building the graph with pydot. The
+        # whole tree is plotted when there's no subject.
+
+        plots = [ ( 'I005', { 'ancestors': True, 'descendents': True } ),
+                  ( 'I042', { 'ancestors': True } ),
+                  ( 'I001', {} ),
+                  ( None, {} ) ]
+
+        for idIndividual, kwargs in plots:
+
+            graphs = []
+
+            for flgDotWriter in [ False, True ]:
+
+                dot = self.Plot( ET.parse( FILE_EXAMPLE ).getroot(), idIndividual,
+                                 flgDotWriter, **kwargs )
+
+                labels, subgraphs, edges = ParseGraph( dot )
+
+                couples = set( frozenset( nodes ) for nodes in subgraphs[1:] )
+
+                graphs.append( ( labels, couples, set( edges ) ) )
+
+            self.assertEqual( graphs[0], graphs[1] )
+            self.assertTrue( len( graphs[0][0] ) > 1 )
+
+
+if ( __name__ == '__main__' ):
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+#   FamilyTree
+#   Copyright (C) 2015 Elstree Caldwell
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import FamilyTreeGraph as FTG
+import FamilyTreeSQLite as FTS
+
+
+FILE_EXAMPLE = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ),
+                             'Example', 'HouseOfTudor.xml' )
+
+
+# ========================================================================
+# Checks that a tree kept in a database can be edited and searched
+# ========================================================================
+
+class TestFamilyTreeSQLite( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  setUp
+    # --------------------------------------------------------------------
+
+    def setUp( self ):
+
+        self.dirTemp = tempfile.mkdtemp()
+        self.fileDatabase = os.path.join( self.dirTemp, 'HouseOfTudor.db' )
+
+        ftSQLite = FTS.FamilyTreeSQLite( self.fileDatabase )
+        ftSQLite.ImportXML( FILE_EXAMPLE )
+        ftSQLite.Close()
+
+        self.ftGraph = FTG.FamilyTreeGraphSQLite( self.fileDatabase )
+
+
+    # --------------------------------------------------------------------
+    #  tearDown
+    # --------------------------------------------------------------------
+
+    def tearDown( self ):
+
+        self.ftGraph.Close()
+
+        shutil.rmtree( self.dirTemp )
+
+
+    # --------------------------------------------------------------------
+    #  testSetters
+    # --------------------------------------------------------------------
+
+    def testSetters( self ):
+
+        self.ftGraph.SetFirstName( 'I001', 'Harry' )
+        self.ftGraph.SetBirthYear( 'I001', '1400' )
+
+        self.assertEqual( self.ftGraph.nChanges, 2 )
+        self.assertTrue( self.ftGraph.IsDirty() )
+        self.assertEqual( self.ftGraph.GetIndividual( 'I001' ).findtext( 'NAME/forename' ), 'Harry' )
+
+        self.ftGraph.Undo()
+
+        self.assertEqual( self.ftGraph.GetIndividual( 'I001' ).findtext( 'BIRTH/DATE/year' ), '1457' )
+
+
+    # --------------------------------------------------------------------
+    #  testIndexes
+    # --------------------------------------------------------------------
+
+    def testIndexes( self ):
+
+        self.assertIn( 'I001', self.ftGraph.GetIDsByDate( 'BIRTH', 1450, 1460 ) )
+        self.assertIn( 'I001', self.ftGraph.GetIDsMatching( 'henry' ) )
+        self.assertIn( 'I001', self.ftGraph.GetIDsMatching( '~tewdwr' ) )
+
+        # Making the indexes doesn't keep the records they're made from
+
+        self.assertEqual( len( self.ftGraph.individualsByID.elements ), 0 )
+        self.assertEqual( len( self.ftGraph.familiesByID.elements ), 0 )
+
+        self.ftGraph.SetBirthYear( 'I001', '1400' )
+
+        self.assertNotIn( 'I001', self.ftGraph.GetIDsByDate( 'BIRTH', 1450, 1460 ) )
+        self.assertIn( 'I001', self.ftGraph.GetIDsByDate( 'BIRTH', 1400, 1400 ) )
+
+
+
+    # --------------------------------------------------------------------
+    #  testRecordCache
+    # --------------------------------------------------------------------
+
+    def testRecordCache( self ):
+
+        individuals = self.ftGraph.individualsByID
+        individuals.cacheSize = 10
+
+        self.ftGraph.SetFirstName( 'I001', 'Harry' )
+
+        for idIndi in individuals.keys():
+            self.assertEqual( individuals.get( idIndi ).attrib['id'], idIndi )
+
+        self.assertEqual( len( individuals.elements ), 10 )
+        self.assertEqual( individuals.dirty.keys(), [ 'I001' ] )
+
+        # The change outlives the records read since, and only it is
+        # written back
+
+        self.ftGraph.Commit()
+
+        self.assertEqual( len( individuals.dirty ), 0 )
+
+        self.ftGraph.Close()
+        self.ftGraph = FTG.FamilyTreeGraphSQLite( self.fileDatabase )
+
+        self.assertEqual( self.ftGraph.GetIndividual( 'I001' ).findtext( 'NAME/forename' ), 'Harry' )
+        self.assertEqual( len( self.ftGraph.individualsByID.elements ), 1 )
+
+
+if ( __name__ == '__main__' ):
+    unittest.main()
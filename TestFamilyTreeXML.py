@@ -0,0 +1,1193 @@
+#!/usr/bin/env python
+
+#   FamilyTree
+#   Copyright (C) 2015 Elstree Caldwell
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from copy import deepcopy
+
+import FamilyTreeGraph as FTG
+import FamilyTreeSQLite as FTS
+import FamilyTreeXML as FTX
+
+
+FILE_EXAMPLE = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ),
+                             'Example', 'HouseOfTudor.xml' )
+
+# The indexes kept of a tree's records, by ID and by the relationships
+# between them, and those made when they're first asked for
+
+INDEXES_RECORDS = [ 'familiesAsChild', 'familiesAsSpouse', 'familyHusbands',
+                    'familyWives', 'familyChildren', 'familyReferences' ]
+
+INDEXES_SEARCH = [ 'dateIndex', 'dateOrdinals', 'textIndex', 'textGrams', 'textByID',
+                   'nameIndex', 'namePhonetic', 'nameDeletions', 'namesByID' ]
+
+# A tree with pedigree collapse. The subject's (I001) father (I002) and
+# maternal grandfather (I006) are brothers, so their parents (I004, I005)
+# are the subject's grandparents through the father and great-grandparents
+# through the mother, whose line is walked first.
+
+XML_PEDIGREE_COLLAPSE = """
+<FamilyTree>
+  <INDIVIDUAL id="I001"><NAME><forename>Subject</forename></NAME><SEX>M</SEX><FAMILY_CHILD>F001</FAMILY_CHILD></INDIVIDUAL>
+  <INDIVIDUAL id="I002"><NAME><forename>Father</forename></NAME><SEX>M</SEX><FAMILY_SPOUSE>F001</FAMILY_SPOUSE><FAMILY_CHILD>F002</FAMILY_CHILD></INDIVIDUAL>
+  <INDIVIDUAL id="I003"><NAME><forename>Mother</forename></NAME><SEX>F</SEX><FAMILY_SPOUSE>F001</FAMILY_SPOUSE><FAMILY_CHILD>F003</FAMILY_CHILD></INDIVIDUAL>
+  <INDIVIDUAL id="I004"><NAME><forename>Ancestor</forename></NAME><SEX>M</SEX><FAMILY_SPOUSE>F002</FAMILY_SPOUSE></INDIVIDUAL>
+  <INDIVIDUAL id="I005"><NAME><forename>AncestorWife</forename></NAME><SEX>F</SEX><FAMILY_SPOUSE>F002</FAMILY_SPOUSE></INDIVIDUAL>
+  <INDIVIDUAL id="I006"><NAME><forename>Grandfather</forename></NAME><SEX>M</SEX><FAMILY_SPOUSE>F003</FAMILY_SPOUSE><FAMILY_CHILD>F002</FAMILY_CHILD></INDIVIDUAL>
+  <INDIVIDUAL id="I007"><NAME><forename>Grandmother</forename></NAME><SEX>F</SEX><FAMILY_SPOUSE>F003</FAMILY_SPOUSE></INDIVIDUAL>
+  <FAMILY id="F001"><HUSBAND>I002</HUSBAND><WIFE>I003</WIFE><CHILD>I001</CHILD></FAMILY>
+  <FAMILY id="F002"><HUSBAND>I004</HUSBAND><WIFE>I005</WIFE><CHILD>I006</CHILD><CHILD>I002</CHILD></FAMILY>
+  <FAMILY id="F003"><HUSBAND>I006</HUSBAND><WIFE>I007</WIFE><CHILD>I003</CHILD></FAMILY>
+</FamilyTree>
+"""
+
+
+# ------------------------------------------------------------------------
+def GetRecords( ftXML ):
+
+    # Each of a tree's records as a tuple, by tag and ID
+
+    return dict( ( ( element.tag, element.attrib['id'] ), ftXML.ConvertElementToTuple( element ) )
+                 for element in ftXML.ftXML.findall( 'INDIVIDUAL' ) + ftXML.ftXML.findall( 'FAMILY' ) )
+
+
+# ------------------------------------------------------------------------
+def GetIndexes( ftXML ):
+
+    # A copy of each of a tree's indexes, the search indexes being made
+    # first if they haven't been
+
+    ftXML.GetDateIndex()
+    ftXML.GetTextIndex()
+    ftXML.GetNameIndex()
+
+    indexes = dict( ( name, deepcopy( getattr( ftXML, name ) ) )
+                    for name in INDEXES_RECORDS + INDEXES_SEARCH )
+
+    indexes[ 'individualsByID' ] = sorted( ftXML.individualsByID )
+    indexes[ 'familiesByID' ] = sorted( ftXML.familiesByID )
+
+    return indexes
+
+
+# ========================================================================
+# Checks that changes journalled against a tree file are read back only
+# once they have been saved
+# ========================================================================
+
+class TestFamilyTreeJournal( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  setUp
+    # --------------------------------------------------------------------
+
+    def setUp( self ):
+
+        self.dirTemp = tempfile.mkdtemp()
+        self.fileXML = os.path.join( self.dirTemp, 'HouseOfTudor.xml' )
+
+        shutil.copy( FILE_EXAMPLE, self.fileXML )
+
+        self.ftGraph = self.OpenTree( self.fileXML )
+
+
+    # --------------------------------------------------------------------
+    #  tearDown
+    # --------------------------------------------------------------------
+
+    def tearDown( self ):
+
+        self.ftGraph.CloseJournal()
+
+        shutil.rmtree( self.dirTemp )
+
+
+    # --------------------------------------------------------------------
+    #  OpenTree
+    # --------------------------------------------------------------------
+
+    def OpenTree( self, filename ):
+
+        ftGraph = FTG.FamilyTreeGraph( None )
+
+        ftGraph.ReadFile( filename )
+        ftGraph.OpenJournal( filename )
+
+        return ftGraph
+
+
+    # --------------------------------------------------------------------
+    #  GetFirstName
+    # --------------------------------------------------------------------
+
+    def GetFirstName( self, ftGraph, idIndividual ):
+
+        return ftGraph.GetIndividual( idIndividual ).findtext( 'NAME/forename' )
+
+
+    # --------------------------------------------------------------------
+    #  testSavedChangesReplayed
+    # --------------------------------------------------------------------
+
+    def testSavedChangesReplayed( self ):
+
+        self.ftGraph.SetFirstName( 'I001', 'Harry' )
+        self.ftGraph.SaveJournal()
+        self.ftGraph.CloseJournal()
+
+        ftGraph = self.OpenTree( self.fileXML )
+
+        self.assertEqual( self.GetFirstName( ftGraph, 'I001' ), 'Harry' )
+        self.assertFalse( ftGraph.IsDirty() )
+
+        ftGraph.CloseJournal()
+
+
+    # --------------------------------------------------------------------
+    #  testUnsavedChangesDropped
+    # --------------------------------------------------------------------
+
+    def testUnsavedChangesDropped( self ):
+
+        self.ftGraph.SetFirstName( 'I001', 'Harry' )
+        self.ftGraph.SaveJournal()
+
+        self.ftGraph.SetFirstName( 'I001', 'UNSAVED' )
+        self.ftGraph.CloseJournal()
+
+        ftGraph = self.OpenTree( self.fileXML )
+
+        self.assertEqual( self.GetFirstName( ftGraph, 'I001' ), 'Harry' )
+
+        # and they stay dropped once more changes are journalled
+
+        ftGraph.SetBirthYear( 'I001', '1400' )
+        ftGraph.SaveJournal()
+        ftGraph.CloseJournal()
+
+        ftGraph = self.OpenTree( self.fileXML )
+
+        self.assertEqual( self.GetFirstName( ftGraph, 'I001' ), 'Harry' )
+        self.assertEqual( ftGraph.GetIndividual( 'I001' ).findtext( 'BIRTH/DATE/year' ), '1400' )
+
+        ftGraph.CloseJournal()
+
+
+    # --------------------------------------------------------------------
+    #  testDiscardJournal
+    # --------------------------------------------------------------------
+
+    def testDiscardJournal( self ):
+
+        fileJournal = self.ftGraph.GetJournalFilename( self.fileXML )
+
+        self.ftGraph.SetFirstName( 'I001', 'Harry' )
+        self.ftGraph.SaveJournal()
+
+        sizeSaved = os.path.getsize( fileJournal )
+
+        self.ftGraph.SetFirstName( 'I001', 'UNSAVED' )
+        self.ftGraph.DiscardJournal()
+
+        self.assertEqual( os.path.getsize( fileJournal ), sizeSaved )
+
+        ftGraph = self.OpenTree( self.fileXML )
+
+        self.assertEqual( self.GetFirstName( ftGraph, 'I001' ), 'Harry' )
+
+        ftGraph.CloseJournal()
+
+
+
+    # --------------------------------------------------------------------
+    #  testReadersSeeSavedChanges
+    # --------------------------------------------------------------------
+
+    def testReadersSeeSavedChanges( self ):
+
+        self.ftGraph.SetFirstName( 'I001', 'Harry' )
+        self.ftGraph.SaveJournal()
+
+        self.ftGraph.SetFirstName( 'I001', 'UNSAVED' )
+        self.ftGraph.FlushJournal()
+
+        # Read compactly, as the plots are
+
+        ftGraph = FTG.FamilyTreeGraph( None )
+        ftGraph.SetCompact( True )
+        ftGraph.ReadFile( self.fileXML )
+
+        self.assertEqual( self.GetFirstName( ftGraph, 'I001' ), 'Harry' )
+
+        # and in part
+
+        ftIndex = FTG.FamilyTreeGraph( None )
+        ftIndex.ReadFile( self.fileXML, None, True )
+
+        idsRetained = ftIndex.GetSubjectsRecordIDs( 'I001', True )
+
+        ftGraph = FTG.FamilyTreeGraph( None )
+        ftGraph.SetCompact( True )
+        ftGraph.ReadFile( self.fileXML, idsRetained )
+
+        self.assertEqual( self.GetFirstName( ftGraph, 'I001' ), 'Harry' )
+        self.assertEqual( len( ftGraph.individualsByID ),
+                          len( [ tag for tag, idRecord in idsRetained if tag == 'INDIVIDUAL' ] ) )
+
+        # and converted to a database
+
+        ftSQLite = FTS.FamilyTreeSQLite( os.path.join( self.dirTemp, 'HouseOfTudor.db' ) )
+        ftSQLite.ImportXML( self.fileXML )
+
+        self.assertEqual( self.GetFirstName( ftSQLite, 'I001' ), 'Harry' )
+
+        ftSQLite.Close()
+
+
+
+    # --------------------------------------------------------------------
+    #  testSaveAs
+    # --------------------------------------------------------------------
+
+    def testSaveAs( self ):
+
+        fileJournal = self.ftGraph.GetJournalFilename( self.fileXML )
+
+        self.ftGraph.SetFirstName( 'I001', 'Harry' )
+        self.ftGraph.SaveJournal()
+
+        sizeSaved = os.path.getsize( fileJournal )
+
+        self.ftGraph.SetFirstName( 'I001', 'Henri' )
+
+        fileSaveAs = os.path.join( self.dirTemp, 'SaveAs.xml' )
+
+        ET.ElementTree( self.ftGraph.ftXML ).write( fileSaveAs )
+
+        self.ftGraph.MoveJournal( fileSaveAs, self.ftGraph.GetJournalOffset() )
+        self.ftGraph.SetBirthYear( 'I001', '1400' )
+        self.ftGraph.SaveJournal()
+
+        # The original file keeps only the changes saved to it
+
+        self.assertEqual( os.path.getsize( fileJournal ), sizeSaved )
+
+        ftGraph = self.OpenTree( self.fileXML )
+
+        self.assertEqual( self.GetFirstName( ftGraph, 'I001' ), 'Harry' )
+        self.assertEqual( ftGraph.GetIndividual( 'I001' ).findtext( 'BIRTH/DATE/year' ), '1457' )
+
+        ftGraph.CloseJournal()
+
+        ftGraph = FTG.FamilyTreeGraph( None )
+        ftGraph.ReadFile( fileSaveAs )
+
+        self.assertEqual( self.GetFirstName( ftGraph, 'I001' ), 'Henri' )
+        self.assertEqual( ftGraph.GetIndividual( 'I001' ).findtext( 'BIRTH/DATE/year' ), '1400' )
+
+
+
+# ========================================================================
+# Checks that a snapshot is only left beside a tree file that was read
+# ========================================================================
+
+class TestFamilyTreeSnapshot( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  setUp
+    # --------------------------------------------------------------------
+
+    def setUp( self ):
+
+        self.dirTemp = tempfile.mkdtemp()
+        self.fileXML = os.path.join( self.dirTemp, 'HouseOfTudor.xml' )
+
+
+    # --------------------------------------------------------------------
+    #  tearDown
+    # --------------------------------------------------------------------
+
+    def tearDown( self ):
+
+        shutil.rmtree( self.dirTemp )
+
+
+    # --------------------------------------------------------------------
+    #  testSnapshotWritten
+    # --------------------------------------------------------------------
+
+    def testSnapshotWritten( self ):
+
+        shutil.copy( FILE_EXAMPLE, self.fileXML )
+
+        ftGraph = FTG.FamilyTreeGraph( None )
+        ftGraph.ReadFile( self.fileXML )
+
+        self.assertEqual( sorted( os.listdir( self.dirTemp ) ),
+                          [ 'HouseOfTudor.xml', 'HouseOfTudor.xml.snapshot' ] )
+
+
+    # --------------------------------------------------------------------
+    #  testTruncatedFile
+    # --------------------------------------------------------------------
+
+    def testTruncatedFile( self ):
+
+        with open( FILE_EXAMPLE, 'rb' ) as fileIn:
+            xml = fileIn.read()
+
+        with open( self.fileXML, 'wb' ) as fileOut:
+            fileOut.write( xml[ : len( xml )//2 ] )
+
+        ftGraph = FTG.FamilyTreeGraph( None )
+
+        self.assertRaises( ET.ParseError, ftGraph.ReadFile, self.fileXML )
+
+        self.assertEqual( os.listdir( self.dirTemp ), [ 'HouseOfTudor.xml' ] )
+
+
+
+# ========================================================================
+# Checks that dates are indexed as precisely as they are known
+# ========================================================================
+
+class TestFamilyTreeDates( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  setUp
+    # --------------------------------------------------------------------
+
+    def setUp( self ):
+
+        self.dirTemp = tempfile.mkdtemp()
+        self.fileXML = os.path.join( self.dirTemp, 'HouseOfTudor.xml' )
+
+        shutil.copy( FILE_EXAMPLE, self.fileXML )
+
+        self.ftGraph = FTG.FamilyTreeGraph( None )
+        self.ftGraph.ReadFile( self.fileXML )
+
+
+    # --------------------------------------------------------------------
+    #  tearDown
+    # --------------------------------------------------------------------
+
+    def tearDown( self ):
+
+        shutil.rmtree( self.dirTemp )
+
+
+    # --------------------------------------------------------------------
+    #  testPrecision
+    # --------------------------------------------------------------------
+
+    def testPrecision( self ):
+
+        # Henry VII's death is known only to the year
+
+        self.assertEqual( self.ftGraph.GetDateOrdinal( 'DEATH', 'I001' ),
+                          ( 15090000, FTX.DATE_PRECISION_YEAR ) )
+
+        self.ftGraph.SetDeathMonth( 'I001', 'Apr' )
+        self.ftGraph.SetDeathDay( 'I001', '21' )
+
+        self.assertEqual( self.ftGraph.GetDateOrdinal( 'DEATH', 'I001' ),
+                          ( 15090421, FTX.DATE_PRECISION_DAY ) )
+
+
+    # --------------------------------------------------------------------
+    #  testAliveIn
+    # --------------------------------------------------------------------
+
+    def testAliveIn( self ):
+
+        # He may have died on any day of 1509
+
+        self.assertIn( 'I001', self.ftGraph.GetIDsAliveIn( 1509 ) )
+        self.assertIn( 'I001', self.ftGraph.GetIDsAliveIn( 1509, 12, 31 ) )
+        self.assertNotIn( 'I001', self.ftGraph.GetIDsAliveIn( 1510 ) )
+
+        self.ftGraph.SetDeathMonth( 'I001', 'Apr' )
+        self.ftGraph.SetDeathDay( 'I001', '21' )
+
+        self.assertIn( 'I001', self.ftGraph.GetIDsAliveIn( 1509, 4, 21 ) )
+        self.assertIn( 'I001', self.ftGraph.GetIDsAliveIn( 1509, 4 ) )
+        self.assertNotIn( 'I001', self.ftGraph.GetIDsAliveIn( 1509, 4, 22 ) )
+        self.assertNotIn( 'I001', self.ftGraph.GetIDsAliveIn( 1509, 5 ) )
+
+
+
+# ========================================================================
+# Checks that files with records sharing an ID can still be read
+# ========================================================================
+
+class TestFamilyTreeDuplicateIDs( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  setUp
+    # --------------------------------------------------------------------
+
+    def setUp( self ):
+
+        self.dirTemp = tempfile.mkdtemp()
+        self.fileXML = os.path.join( self.dirTemp, 'Duplicates.xml' )
+
+        with open( self.fileXML, 'w' ) as fileOut:
+            fileOut.write( '<FamilyTree>'
+                           '<INDIVIDUAL id="I001"><FAMILY_SPOUSE>F001</FAMILY_SPOUSE></INDIVIDUAL>'
+                           '<INDIVIDUAL id="I002"><FAMILY_SPOUSE>F001</FAMILY_SPOUSE></INDIVIDUAL>'
+                           '<FAMILY id="F001"><HUSBAND>I001</HUSBAND></FAMILY>'
+                           '<FAMILY id="F001"><HUSBAND>I002</HUSBAND></FAMILY>'
+                           '</FamilyTree>' )
+
+
+    # --------------------------------------------------------------------
+    #  tearDown
+    # --------------------------------------------------------------------
+
+    def tearDown( self ):
+
+        shutil.rmtree( self.dirTemp )
+
+
+    # --------------------------------------------------------------------
+    #  testFirstFamilyKept
+    # --------------------------------------------------------------------
+
+    def testFirstFamilyKept( self ):
+
+        # Both as the XML is read and from the snapshot written then
+
+        for read in range( 2 ):
+
+            ftGraph = FTG.FamilyTreeGraph( None )
+            ftGraph.ReadFile( self.fileXML )
+
+            self.assertEqual( ftGraph.familiesByID[ 'F001' ].findtext( 'HUSBAND' ), 'I001' )
+            self.assertEqual( ftGraph.GetHusbandID( 'F001' ), 'I001' )
+            self.assertEqual( len( ftGraph.ftXML.findall( 'FAMILY' ) ), 2 )
+
+        self.assertTrue( os.path.exists( ftGraph.GetSnapshotFilename( self.fileXML ) ) )
+
+
+
+# ========================================================================
+# Checks that changes to a tree can be undone and redone
+# ========================================================================
+
+class TestFamilyTreeUndo( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  setUp
+    # --------------------------------------------------------------------
+
+    def setUp( self ):
+
+        self.dirTemp = tempfile.mkdtemp()
+        self.fileXML = os.path.join( self.dirTemp, 'HouseOfTudor.xml' )
+
+        shutil.copy( FILE_EXAMPLE, self.fileXML )
+
+        self.ftGraph = FTG.FamilyTreeGraph( None )
+        self.ftGraph.ReadFile( self.fileXML )
+
+
+    # --------------------------------------------------------------------
+    #  tearDown
+    # --------------------------------------------------------------------
+
+    def tearDown( self ):
+
+        shutil.rmtree( self.dirTemp )
+
+
+    # --------------------------------------------------------------------
+    #  GetFirstName
+    # --------------------------------------------------------------------
+
+    def GetFirstName( self, idIndividual ):
+
+        return self.ftGraph.GetIndividualWithID( idIndividual ).findtext( 'NAME/forename' )
+
+
+    # --------------------------------------------------------------------
+    #  testUndoRedo
+    # --------------------------------------------------------------------
+
+    def testUndoRedo( self ):
+
+        self.assertFalse( self.ftGraph.Undo() )
+        self.assertFalse( self.ftGraph.Redo() )
+
+        self.ftGraph.SetFirstName( 'I001', 'Harry' )
+
+        self.assertTrue( self.ftGraph.Undo() )
+        self.assertEqual( self.GetFirstName( 'I001' ), 'Henry' )
+        self.assertFalse( self.ftGraph.Undo() )
+
+        self.assertTrue( self.ftGraph.Redo() )
+        self.assertEqual( self.GetFirstName( 'I001' ), 'Harry' )
+        self.assertFalse( self.ftGraph.Redo() )
+
+        # and the redone change can itself be undone
+
+        self.assertTrue( self.ftGraph.Undo() )
+        self.assertEqual( self.GetFirstName( 'I001' ), 'Henry' )
+
+
+    # --------------------------------------------------------------------
+    #  testEditClearsRedo
+    # --------------------------------------------------------------------
+
+    def testEditClearsRedo( self ):
+
+        self.ftGraph.SetFirstName( 'I001', 'Harry' )
+        self.ftGraph.Undo()
+
+        self.ftGraph.SetFirstName( 'I003', 'Art' )
+
+        self.assertFalse( self.ftGraph.Redo() )
+        self.assertEqual( self.GetFirstName( 'I001' ), 'Henry' )
+
+        self.assertTrue( self.ftGraph.Undo() )
+        self.assertEqual( self.GetFirstName( 'I003' ), 'Arthur' )
+        self.assertFalse( self.ftGraph.Undo() )
+
+
+    # --------------------------------------------------------------------
+    #  testUndoDepth
+    # --------------------------------------------------------------------
+
+    def testUndoDepth( self ):
+
+        self.ftGraph.SetUndoDepth( 2 )
+
+        for name in [ 'Harry', 'Hal', 'Hank' ]:
+            self.ftGraph.SetFirstName( 'I001', name )
+
+        self.assertEqual( len( self.ftGraph.undoHistory ), 2 )
+
+        # The oldest change is dropped, so it can't be undone
+
+        self.assertTrue( self.ftGraph.Undo() )
+        self.assertTrue( self.ftGraph.Undo() )
+        self.assertFalse( self.ftGraph.Undo() )
+
+        self.assertEqual( self.GetFirstName( 'I001' ), 'Harry' )
+
+
+    # --------------------------------------------------------------------
+    #  testUndoRelationships
+    # --------------------------------------------------------------------
+
+    def testUndoRelationships( self ):
+
+        # Elizabeth (I002) has no parents, Arthur (I003) is both a child
+        # and a spouse
+
+        changes = [ ( self.ftGraph.SetFather, ( 'I002', 'I017' ) ),
+                    ( self.ftGraph.SetMother, ( 'I002', 'I009' ) ),
+                    ( self.ftGraph.DeleteIndividual, ( 'I003', ) ) ]
+
+        for method, args in changes:
+
+            records = GetRecords( self.ftGraph )
+            indexes = GetIndexes( self.ftGraph )
+
+            method( *args )
+
+            self.assertNotEqual( GetRecords( self.ftGraph ), records )
+
+            self.assertTrue( self.ftGraph.Undo() )
+
+            self.assertEqual( GetRecords( self.ftGraph ), records )
+            self.assertEqual( GetIndexes( self.ftGraph ), indexes )
+
+            # Redone so that the next change is made on top of it
+
+            self.assertTrue( self.ftGraph.Redo() )
+
+        self.assertEqual( self.ftGraph.GetFamiliesAsChild( 'I002' ), [ 'F004' ] )
+        self.assertFalse( 'I003' in self.ftGraph.individualsByID )
+        self.assertFalse( 'I003' in self.ftGraph.familyChildren[ 'F001' ] )
+
+
+
+# ========================================================================
+# Checks that the changes made in a batch are one change, and that none
+# of them are kept if the batch fails
+# ========================================================================
+
+class TestFamilyTreeBatch( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  setUp
+    # --------------------------------------------------------------------
+
+    def setUp( self ):
+
+        self.dirTemp = tempfile.mkdtemp()
+        self.fileXML = os.path.join( self.dirTemp, 'HouseOfTudor.xml' )
+
+        shutil.copy( FILE_EXAMPLE, self.fileXML )
+
+        self.ftGraph = FTG.FamilyTreeGraph( None )
+
+        self.ftGraph.ReadFile( self.fileXML )
+        self.ftGraph.OpenJournal( self.fileXML )
+
+        self.fileJournal = self.ftGraph.GetJournalFilename( self.fileXML )
+
+
+    # --------------------------------------------------------------------
+    #  tearDown
+    # --------------------------------------------------------------------
+
+    def tearDown( self ):
+
+        self.ftGraph.CloseJournal()
+
+        shutil.rmtree( self.dirTemp )
+
+
+    # --------------------------------------------------------------------
+    #  MakeChanges
+    # --------------------------------------------------------------------
+
+    def MakeChanges( self ):
+
+        self.ftGraph.SetFirstName( 'I001', 'Harry' )
+        self.ftGraph.SetBirthYear( 'I001', '1400' )
+        self.ftGraph.SetFather( 'I002', 'I017' )
+        self.ftGraph.CreateIndividual()
+        self.ftGraph.DeleteIndividual( 'I003' )
+
+
+    # --------------------------------------------------------------------
+    #  testBatch
+    # --------------------------------------------------------------------
+
+    def testBatch( self ):
+
+        with self.ftGraph.Batch():
+            self.MakeChanges()
+
+        self.assertEqual( len( self.ftGraph.undoHistory ), 1 )
+
+        self.ftGraph.SaveJournal()
+
+        changes, offset = self.ftGraph.ReadJournal( self.fileXML )
+
+        self.assertEqual( [ name for name, args, kwargs in changes ], [ 'RestoreRecords' ] )
+
+
+    # --------------------------------------------------------------------
+    #  testRollback
+    # --------------------------------------------------------------------
+
+    def testRollback( self ):
+
+        records = GetRecords( self.ftGraph )
+        indexes = GetIndexes( self.ftGraph )
+
+        self.ftGraph.FlushJournal()
+
+        sizeJournal = os.path.getsize( self.fileJournal )
+
+        with self.assertRaises( ValueError ):
+
+            with self.ftGraph.Batch():
+
+                self.MakeChanges()
+
+                raise ValueError( 'Part way through the batch' )
+
+        self.assertEqual( GetRecords( self.ftGraph ), records )
+        self.assertEqual( GetIndexes( self.ftGraph ), indexes )
+
+        # Nothing was changed, so there's nothing to journal or undo
+
+        self.ftGraph.FlushJournal()
+
+        self.assertEqual( os.path.getsize( self.fileJournal ), sizeJournal )
+        self.assertEqual( len( self.ftGraph.undoHistory ), 0 )
+        self.assertFalse( self.ftGraph.IsDirty() )
+        self.assertFalse( self.ftGraph.IsBatching() )
+
+
+
+# ========================================================================
+# Checks that deleting a record removes every reference to it
+# ========================================================================
+
+class TestFamilyTreeDelete( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  setUp
+    # --------------------------------------------------------------------
+
+    def setUp( self ):
+
+        self.dirTemp = tempfile.mkdtemp()
+        self.fileXML = os.path.join( self.dirTemp, 'HouseOfTudor.xml' )
+
+        shutil.copy( FILE_EXAMPLE, self.fileXML )
+
+        self.ftGraph = FTG.FamilyTreeGraph( None )
+        self.ftGraph.ReadFile( self.fileXML )
+
+
+    # --------------------------------------------------------------------
+    #  tearDown
+    # --------------------------------------------------------------------
+
+    def tearDown( self ):
+
+        shutil.rmtree( self.dirTemp )
+
+
+    # --------------------------------------------------------------------
+    #  CheckReferences
+    # --------------------------------------------------------------------
+
+    def CheckReferences( self ):
+
+        # Every ID a record refers to is that of a record in the tree
+
+        for individual in self.ftGraph.ftXML.findall( 'INDIVIDUAL' ):
+            for tag in [ 'FAMILY_SPOUSE', 'FAMILY_CHILD' ]:
+                for eFamily in individual.findall( tag ):
+                    self.assertTrue( eFamily.text in self.ftGraph.familiesByID )
+
+        for family in self.ftGraph.ftXML.findall( 'FAMILY' ):
+            for tag in [ 'HUSBAND', 'WIFE', 'CHILD' ]:
+                for eIndividual in family.findall( tag ):
+                    self.assertTrue( eIndividual.text in self.ftGraph.individualsByID )
+
+        # and the relationships indexed are those found reading it afresh
+
+        ftXML = FTX.FamilyTreeXML( deepcopy( self.ftGraph.ftXML ) )
+
+        for name in INDEXES_RECORDS:
+            self.assertEqual( getattr( self.ftGraph, name ), getattr( ftXML, name ) )
+
+
+    # --------------------------------------------------------------------
+    #  testDeleteIndividual
+    # --------------------------------------------------------------------
+
+    def testDeleteIndividual( self ):
+
+        # Henry VIII (I005) is a child of F001 and a spouse in six families
+
+        self.ftGraph.DeleteIndividual( 'I005' )
+
+        self.assertIsNone( self.ftGraph.GetIndividualWithID( 'I005' ) )
+        self.assertEqual( self.ftGraph.familyChildren[ 'F001' ], [ 'I003', 'I006', 'I007' ] )
+        self.assertIsNone( self.ftGraph.GetHusbandID( 'F007' ) )
+
+        self.CheckReferences()
+
+
+    # --------------------------------------------------------------------
+    #  testDeleteFamily
+    # --------------------------------------------------------------------
+
+    def testDeleteFamily( self ):
+
+        # The parents of four children, each of them also a spouse
+
+        self.ftGraph.DeleteFamily( 'F001' )
+
+        self.assertFalse( 'F001' in self.ftGraph.familiesByID )
+        self.assertEqual( self.ftGraph.GetFamiliesAsChild( 'I003' ), [] )
+        self.assertEqual( self.ftGraph.GetFamiliesAsSpouse( 'I003' ), [ 'F002' ] )
+        self.assertEqual( self.ftGraph.GetFamiliesAsSpouse( 'I001' ), [] )
+        self.assertEqual( self.ftGraph.GetFamilyReferences( 'F001' ), set() )
+
+        self.CheckReferences()
+
+
+
+# ========================================================================
+# Checks that new records are given the lowest unused IDs
+# ========================================================================
+
+class TestFamilyTreeIDs( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  MakeTree
+    # --------------------------------------------------------------------
+
+    def MakeTree( self, idsIndividuals, idsFamilies=[] ):
+
+        xmlFamilyTree = ET.Element( 'FamilyTree' )
+
+        for idIndividual in idsIndividuals:
+            ET.SubElement( xmlFamilyTree, 'INDIVIDUAL', { 'id': idIndividual } )
+
+        for idFamily in idsFamilies:
+            ET.SubElement( xmlFamilyTree, 'FAMILY', { 'id': idFamily } )
+
+        return FTX.FamilyTreeXML( xmlFamilyTree )
+
+
+    # --------------------------------------------------------------------
+    #  CreateIndividuals
+    # --------------------------------------------------------------------
+
+    def CreateIndividuals( self, ftXML, n ):
+
+        return [ ftXML.CreateIndividual().attrib['id'] for i in range( n ) ]
+
+
+    # --------------------------------------------------------------------
+    #  testGaps
+    # --------------------------------------------------------------------
+
+    def testGaps( self ):
+
+        # The numbers missing from a file are used before any past them
+
+        ftXML = self.MakeTree( [ 'I007', 'I001', 'I004' ], [ 'F003' ] )
+
+        self.assertEqual( ftXML.idHighWater, { 'I': 7, 'F': 3 } )
+
+        self.assertEqual( self.CreateIndividuals( ftXML, 5 ),
+                          [ 'I002', 'I003', 'I005', 'I006', 'I008' ] )
+
+        self.assertEqual( ftXML.CreateFamily().attrib['id'], 'F001' )
+
+
+    # --------------------------------------------------------------------
+    #  testReuse
+    # --------------------------------------------------------------------
+
+    def testReuse( self ):
+
+        ftXML = self.MakeTree( [ 'I001', 'I002', 'I003', 'I004', 'I005' ] )
+
+        ftXML.DeleteIndividual( 'I003' )
+
+        self.assertEqual( self.CreateIndividuals( ftXML, 2 ), [ 'I003', 'I006' ] )
+
+
+    # --------------------------------------------------------------------
+    #  testMergeRanges
+    # --------------------------------------------------------------------
+
+    def testMergeRanges( self ):
+
+        ftXML = self.MakeTree( [ 'I001', 'I002', 'I003', 'I004', 'I005', 'I006' ] )
+
+        for idIndividual in [ 'I004', 'I002', 'I003' ]:
+            ftXML.DeleteIndividual( idIndividual )
+
+        self.assertEqual( len( ftXML.idsFree[ 'I' ] ), 3 )
+
+        self.assertEqual( self.CreateIndividuals( ftXML, 1 ), [ 'I002' ] )
+        self.assertEqual( ftXML.idsFree[ 'I' ], [ ( 3, 4 ) ] )
+
+        self.assertEqual( self.CreateIndividuals( ftXML, 3 ), [ 'I003', 'I004', 'I007' ] )
+
+
+    # --------------------------------------------------------------------
+    #  testPastI999
+    # --------------------------------------------------------------------
+
+    def testPastI999( self ):
+
+        ftXML = self.MakeTree( [ 'I{:03d}'.format( i ) for i in range( 1, 1000 ) ],
+                               [ 'F{:03d}'.format( i ) for i in range( 1, 1000 ) ] )
+
+        self.assertEqual( self.CreateIndividuals( ftXML, 2 ), [ 'I1000', 'I1001' ] )
+        self.assertEqual( ftXML.CreateFamily().attrib['id'], 'F1000' )
+
+        # and the four digit IDs are read back
+
+        ftXML = self.MakeTree( [ 'I001', 'I1000' ] )
+
+        self.assertEqual( ftXML.idHighWater[ 'I' ], 1000 )
+        self.assertEqual( ftXML.idsFree[ 'I' ], [ ( 2, 999 ) ] )
+
+        ftXML.DeleteIndividual( 'I1000' )
+
+        self.assertEqual( self.CreateIndividuals( ftXML, 1 ), [ 'I002' ] )
+
+
+
+# ========================================================================
+# Checks the order and generation in which ancestors and descendents are
+# walked
+# ========================================================================
+
+class TestFamilyTreeTraversal( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  setUp
+    # --------------------------------------------------------------------
+
+    def setUp( self ):
+
+        self.ftXML = FTX.FamilyTreeXML( ET.fromstring( XML_PEDIGREE_COLLAPSE ) )
+
+
+    # --------------------------------------------------------------------
+    #  testAncestors
+    # --------------------------------------------------------------------
+
+    def testAncestors( self ):
+
+        # The grandparents are found through the mother's longer line
+        # first but are only two generations back
+
+        self.assertEqual( list( self.ftXML.IterateAncestors( 'I001' ) ),
+                          [ ( 'I001', 0 ), ( 'I003', 1 ), ( 'I007', 2 ), ( 'I006', 2 ),
+                            ( 'I005', 2 ), ( 'I004', 2 ), ( 'I002', 1 ) ] )
+
+
+    # --------------------------------------------------------------------
+    #  testAncestorsLimited
+    # --------------------------------------------------------------------
+
+    def testAncestorsLimited( self ):
+
+        self.assertEqual( list( self.ftXML.IterateAncestors( 'I001', 1 ) ),
+                          [ ( 'I001', 0 ), ( 'I003', 1 ), ( 'I002', 1 ) ] )
+
+        # Within two generations the grandparents are only reached
+        # through the father
+
+        self.assertEqual( list( self.ftXML.IterateAncestors( 'I001', 2 ) ),
+                          [ ( 'I001', 0 ), ( 'I003', 1 ), ( 'I007', 2 ), ( 'I006', 2 ),
+                            ( 'I002', 1 ), ( 'I005', 2 ), ( 'I004', 2 ) ] )
+
+        self.assertEqual( list( self.ftXML.IterateAncestors( 'I001', 0 ) ), [ ( 'I001', 0 ) ] )
+
+
+    # --------------------------------------------------------------------
+    #  testDescendents
+    # --------------------------------------------------------------------
+
+    def testDescendents( self ):
+
+        self.assertEqual( list( self.ftXML.IterateDescendents( 'I004' ) ),
+                          [ ( 'I004', 0 ), ( 'I006', 1 ), ( 'I003', 2 ), ( 'I001', 2 ),
+                            ( 'I002', 1 ) ] )
+
+        self.assertEqual( list( self.ftXML.IterateDescendents( 'I004', 1 ) ),
+                          [ ( 'I004', 0 ), ( 'I006', 1 ), ( 'I002', 1 ) ] )
+
+        self.assertEqual( list( self.ftXML.IterateDescendents( 'I999' ) ), [] )
+
+
+
+# ========================================================================
+# Checks that the names, labels and dates kept for each individual are
+# those of the individual as they are now
+# ========================================================================
+
+class TestFamilyTreeDerived( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  setUp
+    # --------------------------------------------------------------------
+
+    def setUp( self ):
+
+        self.ftXML = FTX.FamilyTreeXML( ET.parse( FILE_EXAMPLE ).getroot() )
+
+
+    # --------------------------------------------------------------------
+    #  GetLabel
+    # --------------------------------------------------------------------
+
+    def GetLabel( self, idIndividual ):
+
+        return self.ftXML.GetLabel( self.ftXML.GetIndividualWithID( idIndividual ) )
+
+
+    # --------------------------------------------------------------------
+    #  GetBirthYear
+    # --------------------------------------------------------------------
+
+    def GetBirthYear( self, idIndividual ):
+
+        return self.ftXML.GetBirthDate( self.ftXML.GetIndividualWithID( idIndividual ) )[2]
+
+
+    # --------------------------------------------------------------------
+    #  testLabel
+    # --------------------------------------------------------------------
+
+    def testLabel( self ):
+
+        self.assertEqual( self.GetLabel( 'I001' ), 'Tudor, Henry I001' )
+        self.assertEqual( self.ftXML.derivedByID[ 'I001' ][1][ 'label' ], 'Tudor, Henry I001' )
+
+        self.ftXML.SetFirstName( 'I001', 'Harry' )
+
+        self.assertEqual( self.GetLabel( 'I001' ), 'Tudor, Harry I001' )
+
+        self.ftXML.Undo()
+
+        self.assertEqual( self.GetLabel( 'I001' ), 'Tudor, Henry I001' )
+
+        self.ftXML.Redo()
+
+        self.assertEqual( self.GetLabel( 'I001' ), 'Tudor, Harry I001' )
+
+
+    # --------------------------------------------------------------------
+    #  testBirthYear
+    # --------------------------------------------------------------------
+
+    def testBirthYear( self ):
+
+        self.assertEqual( self.GetBirthYear( 'I001' ), '1457' )
+
+        self.ftXML.SetBirthYear( 'I001', '1456' )
+
+        self.assertEqual( self.GetBirthYear( 'I001' ), '1456' )
+
+        self.ftXML.Undo()
+
+        self.assertEqual( self.GetBirthYear( 'I001' ), '1457' )
+
+
+    # --------------------------------------------------------------------
+    #  testBatchRollback
+    # --------------------------------------------------------------------
+
+    def testBatchRollback( self ):
+
+        self.assertEqual( self.GetLabel( 'I001' ), 'Tudor, Henry I001' )
+        self.assertEqual( self.GetBirthYear( 'I001' ), '1457' )
+
+        with self.assertRaises( ValueError ):
+
+            with self.ftXML.Batch():
+
+                self.ftXML.SetFirstName( 'I001', 'Harry' )
+                self.ftXML.SetBirthYear( 'I001', '1456' )
+
+                # The changes are seen while the batch is being made
+
+                self.assertEqual( self.GetLabel( 'I001' ), 'Tudor, Harry I001' )
+                self.assertEqual( self.GetBirthYear( 'I001' ), '1456' )
+
+                raise ValueError( 'Part way through the batch' )
+
+        self.assertEqual( self.GetLabel( 'I001' ), 'Tudor, Henry I001' )
+        self.assertEqual( self.GetBirthYear( 'I001' ), '1457' )
+
+
+
+# ========================================================================
+# Checks that individuals are found by names that sound like theirs or
+# are spelt nearly the same
+# ========================================================================
+
+class TestFamilyTreeNameSearch( unittest.TestCase ):
+
+
+    # --------------------------------------------------------------------
+    #  setUp
+    # --------------------------------------------------------------------
+
+    def setUp( self ):
+
+        self.ftXML = FTX.FamilyTreeXML( ET.parse( FILE_EXAMPLE ).getroot() )
+
+
+    # --------------------------------------------------------------------
+    #  testSoundsLike
+    # --------------------------------------------------------------------
+
+    def testSoundsLike( self ):
+
+        self.assertEqual( self.ftXML.GetPhoneticKey( 'tewdwr' ), self.ftXML.GetPhoneticKey( 'tudor' ) )
+
+        self.assertEqual( sorted( self.ftXML.GetIDsSoundingLike( 'Tewdwr' ) ),
+                          [ 'I001', 'I003', 'I005', 'I006', 'I007', 'I008', 'I010', 'I012', 'I033' ] )
+
+        # Howard, Parr and Swynford, each spelt 'Katherine' or 'Catherine'
+
+        self.assertTrue( set( [ 'I014', 'I015', 'I040' ] ) <=
+                         self.ftXML.GetIDsSoundingLike( 'Catherine' ) )
+
+
+    # --------------------------------------------------------------------
+    #  testMisspelt
+    # --------------------------------------------------------------------
+
+    def testMisspelt( self ):
+
+        self.assertEqual( self.ftXML.GetIDsSoundingLike( 'Seymor' ), set( [ 'I011', 'I032' ] ) )
+        self.assertEqual( self.ftXML.GetIDsSoundingLike( 'Bolein' ), set( [ 'I009' ] ) )
+
+
+    # --------------------------------------------------------------------
+    #  testNoMatch
+    # --------------------------------------------------------------------
+
+    def testNoMatch( self ):
+
+        self.assertEqual( self.ftXML.GetIDsSoundingLike( 'Xavier' ), set() )
+        self.assertEqual( self.ftXML.GetIDsSoundingLike( '' ), set() )
+
+
+    # --------------------------------------------------------------------
+    #  testRename
+    # --------------------------------------------------------------------
+
+    def testRename( self ):
+
+        self.assertTrue( 'I009' in self.ftXML.GetIDsSoundingLike( 'Anne' ) )
+
+        self.ftXML.SetFirstName( 'I009', 'Xavier' )
+
+        self.assertFalse( 'I009' in self.ftXML.GetIDsSoundingLike( 'Anne' ) )
+        self.assertEqual( self.ftXML.GetIDsSoundingLike( 'Xaviar' ), set( [ 'I009' ] ) )
+        self.assertEqual( self.ftXML.GetIDsSoundingLike( 'Bolein' ), set( [ 'I009' ] ) )
+
+        self.ftXML.Undo()
+
+        self.assertTrue( 'I009' in self.ftXML.GetIDsSoundingLike( 'Anne' ) )
+        self.assertEqual( self.ftXML.GetIDsSoundingLike( 'Xavier' ), set() )
+
+
+if ( __name__ == '__main__' ):
+    unittest.main()